@@ -1 +0,0 @@
-from .fusion_utils import *
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+'''Saving and memory-mapped loading of sets of numpy arrays in a single .npz file'''
+
+import os
+import struct
+import zipfile
+import numpy
+
+
+def save_arrays(filename, **arrays):
+  """Saves the given arrays into an uncompressed .npz file. The file is first written under a temporary name and then renamed, so that readers never see a partially written file. Arrays with dtype object are not supported, as they can not be memory-mapped"""
+
+  for name, value in arrays.items():
+    if numpy.asarray(value).dtype.hasobject:
+      raise ValueError("Array '%s' has dtype object and can not be saved" % name)
+  dirname = os.path.dirname(filename)
+  if dirname and not os.path.exists(dirname): os.makedirs(dirname)
+  tmpname = filename + '.tmp'
+  with open(tmpname, 'wb') as f:
+    numpy.savez(f, **arrays)
+  os.rename(tmpname, filename)
+
+
+def _member_offset(f, info):
+  """Returns the offset of the data of the zip member info in the open file f"""
+
+  f.seek(info.header_offset)
+  header = f.read(30)
+  if header[:4] != b'PK\x03\x04':
+    raise IOError("Corrupted zip member %s" % info.filename)
+  name_length, extra_length = struct.unpack('<HH', header[26:30])
+  return info.header_offset + 30 + name_length + extra_length
+
+
+def load_arrays(filename, mmap=True):
+  """Loads the arrays stored with save_arrays() into a dictionary. If mmap is True, the arrays are memory-mapped directly from the .npz file instead of being read into memory
+
+  @param filename The .npz file
+  @param mmap If True, the arrays will be memory-mapped (read-only)
+  """
+
+  if not mmap:
+    with numpy.load(filename) as data:
+      return dict((name, data[name]) for name in data.files)
+
+  arrays = {}
+  with zipfile.ZipFile(filename) as zf:
+    with open(filename, 'rb') as f:
+      for info in zf.infolist():
+        name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+        if info.compress_type != zipfile.ZIP_STORED:
+          arrays[name] = numpy.load(zf.open(info))
+          continue
+        f.seek(_member_offset(f, info))
+        version = numpy.lib.format.read_magic(f)
+        if version == (1, 0):
+          shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+          shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(f)
+        else: # format not supported for memory-mapping
+          arrays[name] = numpy.load(zf.open(info))
+          continue
+        if numpy.prod(shape) == 0: # empty arrays can not be memory-mapped
+          arrays[name] = numpy.ndarray(shape, dtype=dtype)
+        else:
+          arrays[name] = numpy.memmap(filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape, order='F' if fortran_order else 'C')
+  return arrays
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+'''Polinomial augmentation of the scores of several systems: the scores are extended with the products of their columns up to a given degree, computed with one broadcast multiply for each degree'''
+
+import itertools
+import numpy
+
+
+class PolinomialAugmentation:
+  """The feature map of the polinomial augmentation of num_dim columns of scores. The augmented columns are the original columns, followed by the products of degree 2, then of degree 3..., each in lexicographic order of the multiplied columns (eg. x0, x1, x0*x0, x0*x1, x1*x1 for 2 columns and degree 2). Each product of degree p is the product of degree p-1 of its first columns, multiplied by its last column, so that all the products of a degree are computed at once from the already computed columns. The same object can be applied to the training scores and at inference time, so that both use the identical feature map
+
+  @param num_dim The number of columns of the scores
+  @param degree The highest degree of the products
+  @param interaction_only If True, only the products of distinct columns are added (eg. x0*x1, but not x0*x0)
+  """
+
+  def __init__(self, num_dim, degree=2, interaction_only=False):
+    if num_dim < 1 or degree < 1:
+      raise ValueError("Can not augment %d columns up to degree %d" % (num_dim, degree))
+    self.num_dim = int(num_dim)
+    self.degree = int(degree)
+    self.interaction_only = interaction_only
+
+    # the multiplied columns of each augmented column, and for each degree, the range of its augmented columns and the (augmented column, original column) pairs multiplied for them
+    self.terms = [(c,) for c in range(self.num_dim)]
+    self.blocks = []
+    position = dict((term, i) for i, term in enumerate(self.terms))
+    combinations = itertools.combinations if interaction_only else itertools.combinations_with_replacement
+    for p in range(2, self.degree + 1):
+      terms = list(combinations(range(self.num_dim), p))
+      if not terms: break
+      start = len(self.terms)
+      parents = numpy.array([position[term[:-1]] for term in terms], 'int64')
+      bases = numpy.array([term[-1] for term in terms], 'int64')
+      for term in terms:
+        position[term] = len(self.terms)
+        self.terms.append(term)
+      self.blocks.append((start, len(self.terms), parents, bases))
+
+  def num_features(self):
+    """Returns the number of columns of the augmented scores"""
+
+    return len(self.terms)
+
+  def __call__(self, scores, out=None):
+    """Returns the augmented scores
+
+    @param scores numpy.ndarray with the scores (one row per sample, one column per system)
+    @param out numpy.ndarray of float64 with one row per sample and num_features() columns, into which the augmented scores are written instead of allocating a new matrix. The scores may already be in its first columns
+    """
+
+    scores = numpy.asarray(scores, 'float64')
+    if scores.ndim != 2 or scores.shape[1] != self.num_dim:
+      raise ValueError("The polinomial augmentation is defined for %d columns, not for scores of shape %s" % (self.num_dim, scores.shape))
+    if out is None:
+      out = numpy.ndarray((scores.shape[0], self.num_features()), 'float64')
+    elif out.shape != (scores.shape[0], self.num_features()) or out.dtype != numpy.float64:
+      raise ValueError("The augmented scores of shape %s can not be written into an array of shape %s and type %s" % ((scores.shape[0], self.num_features()), out.shape, out.dtype))
+
+    out[:,:self.num_dim] = scores
+    for start, stop, parents, bases in self.blocks:
+      numpy.multiply(out[:,parents], out[:,bases], out=out[:,start:stop])
+    return out
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+'''Gathered scores whose anti-spoofing columns are shared by the blocks of rows of all the clients, instead of being copied into each of them'''
+
+import numpy
+
+
+class BroadcastScores:
+  """The gathered scores of face verification and anti-spoofing algorithm(s), organized in groups of rows. In the LICIT protocol, the same real access videos are verified against the model of each client: the face verification scores of a group are a numpy.ndarray of shape (num_blocks, num_samples, num_fv) with one block per client, while the anti-spoofing scores of the samples, of shape (num_samples, num_as), are stored once and shared by all the blocks. In the SPOOF protocol, each group has a single block.
+
+  The rows of the gathered scores are the (block, sample) pairs which are valid (not nan) in all the columns, in the order of the groups, then of the blocks, then of the samples. This is the same order as the rows returned by gather_fvas_scores(). The scores can be consumed block by block (blocks(), apply()) or column by column (column()), so that the full score matrix does not need to be created.
+  """
+
+  def __init__(self):
+    self.groups = []
+
+  def add_group(self, blocks, shared, labels):
+    """Adds a group of rows
+
+    @param blocks numpy.ndarray of shape (num_blocks, num_samples, num_fv) with the face verification scores of each block, nan for the samples which are not valid in the block
+    @param shared numpy.ndarray of shape (num_samples, num_as) with the anti-spoofing scores of the samples, shared by all the blocks
+    @param labels numpy.ndarray of shape (num_blocks, num_samples) with the label of each sample in each block
+    """
+
+    blocks = numpy.asarray(blocks, 'float64')
+    shared = numpy.asarray(shared, 'float64')
+    if blocks.shape[:2] != numpy.shape(labels) or blocks.shape[1] != shared.shape[0]:
+      raise ValueError("Blocks of shape %s, shared scores of shape %s and labels of shape %s do not match" % (blocks.shape, shared.shape, numpy.shape(labels)))
+    if self.groups and (blocks.shape[2], shared.shape[1]) != (self.groups[0][0].shape[2], self.groups[0][1].shape[1]):
+      raise ValueError("All the groups need to have the same number of columns")
+    valid = ~numpy.isnan(blocks).any(axis=2) & ~numpy.isnan(shared).any(axis=1)
+    self.groups.append((blocks, shared, numpy.asarray(labels), valid))
+
+  def num_columns(self):
+    """Returns the number of columns of the gathered scores (face verification first, then anti-spoofing)"""
+
+    if not self.groups: return 0
+    return self.groups[0][0].shape[2] + self.groups[0][1].shape[1]
+
+  def __len__(self):
+    return int(sum(valid.sum() for _, _, _, valid in self.groups))
+
+  def blocks(self):
+    """Yields the scores and the labels of the valid rows of each block, one block at a time. Only the scores of the current block are joined with the shared columns"""
+
+    for blocks, shared, labels, valid in self.groups:
+      for i in range(blocks.shape[0]):
+        rows = valid[i]
+        yield numpy.hstack((blocks[i][rows], shared[rows])), labels[i][rows]
+
+  def labels(self):
+    """Returns the labels of all the rows"""
+
+    return numpy.concatenate([labels[valid] for _, _, labels, valid in self.groups] or [numpy.ndarray((0,), 'int')])
+
+  def column(self, j, label=None):
+    """Returns the scores of all the rows (or of the rows with a given label) in the j-th column. The shared scores are indexed, not copied per block, until the result is created
+
+    @param j The index of the column (face verification columns come first)
+    @param label If given, only the rows with this label are returned
+    """
+
+    values = []
+    for blocks, shared, labels, valid in self.groups:
+      rows = valid if label is None else valid & (labels == label)
+      if j < blocks.shape[2]:
+        values.append(blocks[:,:,j][rows])
+      else:
+        values.append(numpy.broadcast_to(shared[:,j-blocks.shape[2]], rows.shape)[rows])
+    return numpy.concatenate(values or [numpy.ndarray((0,), 'float64')])
+
+  def materialize(self):
+    """Returns the scores of all the rows as one numpy.ndarray, and their labels, as gather_fvas_scores() does"""
+
+    all_scores = numpy.ndarray((len(self), self.num_columns()), 'float64')
+    all_labels = numpy.ndarray((len(self),), 'int')
+    size = 0
+    for scores, labels in self.blocks():
+      all_scores[size:size+len(scores)] = scores
+      all_labels[size:size+len(scores)] = labels
+      size += len(scores)
+    return all_scores, all_labels
+
+  def apply(self, function):
+    """Applies a function working on score matrices (like a score fusion machine) to the scores of each block, and returns the concatenated results for all the rows
+
+    @param function Function taking a numpy.ndarray with one row per sample and one column per algorithm, and returning one value per row
+    """
+
+    results = [numpy.asarray(function(scores)).ravel() for scores, _ in self.blocks() if len(scores)]
+    return numpy.concatenate(results or [numpy.ndarray((0,), 'float64')])
+
+  def normalize(self, score_norm):
+    """Applies the z-normalization of the columns with the parameters of score_norm. The shared scores are normalized once, regardless of the number of blocks using them
+
+    @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
+    """
+
+    num_fv = self.groups[0][0].shape[2] if self.groups else 0
+    avg = numpy.asarray(score_norm.avg, 'float64'); std = numpy.asarray(score_norm.std, 'float64')
+    originals = [shared for _, shared, _, _ in self.groups] # keeps the ids of the shared arrays valid while replacing them
+    normalized = {} # the same shared array can be used by several groups
+    for g, (blocks, shared, labels, valid) in enumerate(self.groups):
+      blocks -= avg[:num_fv]
+      blocks /= std[:num_fv]
+      if id(shared) not in normalized:
+        normalized[id(shared)] = (shared - avg[num_fv:]) / std[num_fv:]
+      self.groups[g] = (blocks, normalized[id(shared)], labels, valid)
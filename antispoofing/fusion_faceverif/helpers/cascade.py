@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+'''Simulation of the cascaded operation of face verification and anti-spoofing systems: the systems are run one after the other, and the cascade stops as soon as the fused decision can not change any more (eg. at the first reject for the AND rule), or optionally after a clear accept or reject, which saves the cost of the remaining systems'''
+
+import itertools
+import numpy
+
+from .decision_fusion import required_votes, fused_decision_rates
+
+
+def cascade_decisions(scores, thresholds, order, rule='AND', margins=None):
+  """Returns the number of systems run on each sample by a cascade which runs the systems in the given order, and its decisions, as two boolean numpy.array: the samples accepted and the samples rejected (a sample with nan scores may be neither). The cascade stops as soon as the fused decision is known: when k systems accepted the sample (eg. at the first accept for the OR rule) or when more than n-k systems rejected it (eg. at the first reject for the AND rule). Such an exit is lossless: the decisions are the ones of the fused decision of all the systems, whatever the order. With margins, the cascade also stops after a system whose score is at least its margin away from its threshold, and decides as if the systems not run yet voted as this one (eg. at the first clear accept for the AND rule). This exit saves more runs, but its decisions, and so its error rates, depend on the order
+
+  @param scores numpy.ndarray with the scores of the samples (one row per sample, one column per system)
+  @param thresholds The threshold of each system
+  @param order The indices of the systems (columns), in the order in which they are run
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  @param margins The margin of each system (or one margin for all of them), in units of its scores, or None for the lossless exit only
+  """
+
+  scores = numpy.asarray(scores, 'float64')
+  if scores.ndim == 1: scores = scores[:,None]
+  num_systems = scores.shape[1]
+  k = required_votes(rule, num_systems)
+  order = list(order)
+  if sorted(order) != list(range(num_systems)):
+    raise ValueError("The order %s is not an ordering of the %d systems" % (order, num_systems))
+  thresholds = numpy.asarray(thresholds, 'float64')[order].reshape(1, -1)
+  scores = scores[:,order]
+
+  # a system with a nan score neither accepts nor rejects the sample, and the cascade goes on
+  votes_for = scores > thresholds
+  votes_against = scores < thresholds
+  accepts = numpy.cumsum(votes_for, axis=1)
+  rejects = numpy.cumsum(votes_against, axis=1)
+  accepted = accepts >= k
+  rejected = rejects > num_systems - k
+  stop = accepted | rejected
+  if margins is not None:
+    margins = numpy.broadcast_to(numpy.asarray(margins, 'float64'), (num_systems,))[order].reshape(1, -1)
+    if (margins < 0).any():
+      raise ValueError("The margins can not be negative: %s" % margins.ravel())
+    # the systems not run yet are counted as votes for (or against) the sample, after a clear accept (or reject)
+    remaining = num_systems - numpy.arange(1, num_systems + 1).reshape(1, -1)
+    clear_for = votes_for & (scores - thresholds >= margins) & (accepts + remaining >= k)
+    clear_against = votes_against & (thresholds - scores >= margins) & (rejects + remaining > num_systems - k)
+    accepted = accepted | clear_for
+    rejected = rejected | clear_against
+    stop = accepted | rejected
+
+  # the samples which are never decided run all the systems
+  stopped = stop.any(axis=1)
+  invocations = numpy.where(stopped, stop.argmax(axis=1) + 1, num_systems)
+  samples = numpy.arange(len(scores))
+  return invocations, accepted[samples, invocations - 1], rejected[samples, invocations - 1]
+
+
+def cascade_invocations(scores, thresholds, order, rule='AND', margins=None):
+  """Returns the number of systems run on each sample by the cascade in the given order (see cascade_decisions())
+
+  @param scores numpy.ndarray with the scores of the samples (one row per sample, one column per system)
+  @param thresholds The threshold of each system
+  @param order The indices of the systems (columns), in the order in which they are run
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  @param margins The margin of each system for the early exit, or None for the lossless exit only
+  """
+
+  return cascade_decisions(scores, thresholds, order, rule, margins)[0]
+
+
+def cascade_cost(scores, thresholds, order, rule='AND', costs=None, margins=None):
+  """Returns the expected number of systems run on a sample by the cascade (see cascade_invocations()) and its expected cost, where each system costs its cost weight (defaults to 1 for all the systems)
+
+  @param scores numpy.ndarray with the scores of the samples (one row per sample, one column per system)
+  @param thresholds The threshold of each system
+  @param order The indices of the systems, in the order in which they are run
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  @param costs The cost weight of each system
+  @param margins The margin of each system for the early exit, or None for the lossless exit only
+  """
+
+  scores = numpy.asarray(scores, 'float64')
+  if scores.ndim == 1: scores = scores[:,None]
+  if len(scores) == 0: return numpy.nan, numpy.nan
+  if costs is None: costs = numpy.ones((scores.shape[1],), 'float64')
+  invocations = cascade_invocations(scores, thresholds, order, rule, margins)
+  # the cost of running the first i systems of the order
+  order_costs = numpy.cumsum(numpy.asarray(costs, 'float64')[list(order)])
+  return invocations.mean(), order_costs[invocations - 1].mean()
+
+
+class CascadeSimulator:
+  """Cascades of a set of systems in all the orders (or in given orders), for the real accesses of the genuine users, the impostors and the spoofing attacks. Without margins, the error rates of a cascade do not depend on the order, but its expected number of system runs and its expected cost do. With margins, the cascade also stops after a clear accept or reject (see cascade_decisions()), and its error rates depend on the order too
+
+  @param valid numpy.ndarray with the scores of the real accesses of the genuine users (one column per system)
+  @param impostors numpy.ndarray with the scores of the impostors
+  @param attacks numpy.ndarray with the scores of the spoofing attacks
+  @param thresholds The threshold of each system
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  @param costs The cost weight of each system (defaults to 1 for all the systems)
+  @param margins The margin of each system (or one margin for all of them) for the early exit after a clear accept or reject, or None for the lossless exit only
+  """
+
+  def __init__(self, valid, impostors, attacks, thresholds, rule='AND', costs=None, margins=None):
+    self.sets = [numpy.asarray(s, 'float64') for s in (valid, impostors, attacks)]
+    self.thresholds = numpy.asarray(thresholds, 'float64')
+    self.rule = rule
+    num_systems = len(self.thresholds)
+    required_votes(rule, num_systems) # checks the rule
+    self.costs = numpy.ones((num_systems,), 'float64') if costs is None else numpy.asarray(costs, 'float64')
+    if len(self.costs) != num_systems:
+      raise ValueError("The %d cost weights do not match the %d systems" % (len(self.costs), num_systems))
+    self.margins = None if margins is None else numpy.asarray(margins, 'float64').ravel()
+    if self.margins is not None and len(self.margins) not in (1, num_systems):
+      raise ValueError("The %d margins do not match the %d systems" % (len(self.margins), num_systems))
+
+  def orders(self):
+    """Returns all the orders of the systems"""
+
+    return list(itertools.permutations(range(len(self.thresholds))))
+
+  def error_rates(self, order=None):
+    """Returns the FAR, the FRR and the SFAR of the cascade in the given order. Without margins, they are the ones of the fused decision of all the systems, whatever the order
+
+    @param order The indices of the systems, in the order in which they are run (only needed with margins)
+    """
+
+    if self.margins is None:
+      return fused_decision_rates(self.sets[0], self.sets[1], self.sets[2], self.thresholds, self.rule)
+    if order is None:
+      raise ValueError("The error rates of a cascade with margins depend on the order of the systems")
+
+    def rate(scores, accept):
+      if len(scores) == 0: return numpy.nan
+      invocations, accepted, rejected = cascade_decisions(scores, self.thresholds, order, self.rule, self.margins)
+      return (accepted if accept else rejected).mean()
+
+    return rate(self.sets[1], True), rate(self.sets[0], False), rate(self.sets[2], True)
+
+  def evaluate(self, order):
+    """Returns the expected number of systems run and the expected cost for a sample of each set (real accesses, impostors, spoofing attacks) and for a sample of all the sets together, for the cascade in the given order"""
+
+    per_set = [cascade_cost(s, self.thresholds, order, self.rule, self.costs, self.margins) for s in self.sets]
+    sizes = numpy.array([len(s) for s in self.sets], 'float64')
+    nonempty = sizes > 0
+    invocations = numpy.array([p[0] for p in per_set]); cost = numpy.array([p[1] for p in per_set])
+    if nonempty.any():
+      total = ((invocations[nonempty] * sizes[nonempty]).sum() / sizes.sum(), (cost[nonempty] * sizes[nonempty]).sum() / sizes.sum())
+    else:
+      total = (numpy.nan, numpy.nan)
+    return per_set + [total]
+
+  def ranking(self, orders=None):
+    """Returns the (order, evaluation) pairs of the given orders (defaults to all the orders), sorted by the expected cost of a sample of all the sets, from the cheapest. See evaluate()"""
+
+    if orders is None: orders = self.orders()
+    results = [(tuple(order), self.evaluate(order)) for order in orders]
+    return sorted(results, key=lambda r: r[1][-1][1])
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+'''Snapshot of the file lists of a database in a compact local manifest, served from memory by a stand-in of the database'''
+
+import os, sys
+import types
+import argparse
+import hashlib
+import numpy
+
+from .array_io import save_arrays, load_arrays
+
+SUBSETS = ('train', 'devel', 'test')
+
+
+class ManifestFile:
+  """Stand-in of a database File object (eg. bob.db.replay.File), keeping only its path, client id and whether it is a real access
+
+  @param path The path of the file, relative to the database root and without extension (as returned by File.make_path())
+  @param client_id The integer id of the client
+  @param real True for a real access, False for an attack
+  """
+
+  def __init__(self, path, client_id, real):
+    self.path = str(path)
+    self.client_id = int(client_id)
+    self.real = bool(real)
+
+  def __repr__(self):
+    return "ManifestFile('%s')" % self.path
+
+  def make_path(self, directory=None, extension=None):
+    """Returns the path of the file in the given directory, with the given extension"""
+
+    return str(os.path.join(directory or '', self.path + (extension or '')))
+
+  def get_client_id(self):
+    return self.client_id
+
+  def is_real(self):
+    return self.real
+
+  def videofile(self, directory=None):
+    """Returns the path of the video of the file, with the extension of the Replay-Attack videos"""
+
+    return self.make_path(directory, '.mov')
+
+  def save(self, data, directory=None, extension='.hdf5'):
+    """Saves data (eg. the scores of the file) into the file path in directory"""
+
+    import bob.io.base
+    path = self.make_path(directory, extension)
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.exists(dirname): os.makedirs(dirname)
+    bob.io.base.save(data, path)
+
+
+class ManifestDatabase:
+  """Stand-in of a database (see antispoofing.utils.db.Database) serving the real accesses and the attacks of each subset from memory. The file lists are either read from a manifest file written by save(), or queried from a source database the first time each subset is asked for, so that the source database is queried at most once per subset
+
+  @param subsets Dictionary with the (real, attack) lists of files of each subset ('train', 'devel' and 'test')
+  @param source The database queried for the subsets which are not in subsets
+  @param key String identifying the database and its configuration, as stored in the manifest
+  """
+
+  def __init__(self, subsets=None, source=None, key=''):
+    self.subsets = dict(subsets or {})
+    self.source = source
+    self.key = key
+
+  def _get(self, subset):
+    if subset not in self.subsets:
+      if self.source is None:
+        raise KeyError("The subset '%s' is not in the database manifest" % subset)
+      if subset == 'train':
+        real, attack = self.source.get_train_data()
+      elif subset == 'devel':
+        real, attack = self.source.get_devel_data()
+      else:
+        real, attack = self.source.get_test_data()
+      self.subsets[subset] = (list(real), list(attack))
+    real, attack = self.subsets[subset]
+    return list(real), list(attack) # copies, so that the callers can not modify the kept lists
+
+  def get_train_data(self):
+    return self._get('train')
+
+  def get_devel_data(self):
+    return self._get('devel')
+
+  def get_test_data(self):
+    return self._get('test')
+
+  def get_all_data(self):
+    """Returns the real accesses and the attacks of all the subsets"""
+
+    real = []; attack = []
+    for subset in SUBSETS:
+      r, a = self._get(subset)
+      real += r; attack += a
+    return real, attack
+
+  def save(self, filename, key=''):
+    """Saves the paths, the client ids and the real access flags of the files of all the subsets into a manifest file (.npz)
+
+    @param filename The manifest file
+    @param key String identifying the database and its configuration (eg. the protocol), stored in the manifest
+    """
+
+    paths = []; client_ids = []; real = []; subsets = []
+    for s, subset in enumerate(SUBSETS):
+      for f in sum(self._get(subset), []):
+        paths.append(str(f.make_path()))
+        client_ids.append(f.get_client_id())
+        real.append(f.is_real())
+        subsets.append(s)
+    save_arrays(filename,
+      key = numpy.array(key, 'U'),
+      paths = numpy.array(paths, 'U'),
+      client_ids = numpy.array(client_ids, 'int32'),
+      real = numpy.array(real, 'bool'),
+      subsets = numpy.array(subsets, 'int8'),
+    )
+
+  @classmethod
+  def load(cls, filename):
+    """Creates the database from a manifest file written by save(), with the key stored in it. The files are ManifestFile objects"""
+
+    arrays = load_arrays(filename, mmap=False)
+    files = [ManifestFile(p, c, r) for p, c, r in zip(arrays['paths'], arrays['client_ids'], arrays['real'])]
+    subsets = {}
+    for s, subset in enumerate(SUBSETS):
+      selected = [f for f, fs in zip(files, arrays['subsets']) if fs == s]
+      subsets[subset] = ([f for f in selected if f.is_real()], [f for f in selected if not f.is_real()])
+    return cls(subsets, key=str(arrays['key']))
+
+
+def _package_version(module):
+  """Returns the name and the version of the installed distribution providing a module, or the modification time of its file if it is not part of any distribution"""
+
+  import pkg_resources
+  parts = module.__name__.split('.')
+  for i in range(len(parts), 0, -1):
+    try:
+      return '%s==%s' % ('.'.join(parts[:i]), pkg_resources.get_distribution('.'.join(parts[:i])).version)
+    except (pkg_resources.DistributionNotFound, ValueError):
+      pass
+  filename = getattr(module, '__file__', None)
+  if filename and os.path.exists(filename):
+    return '%s@%d' % (module.__name__, int(os.path.getmtime(filename)))
+  return module.__name__
+
+
+def database_version(cls):
+  """Returns a string with the versions of the packages of a database class: the package of the class and the database packages it uses (the modules it imports which define a Database, eg. bob.db.replay), so that a manifest is rebuilt when any of them changes
+
+  @param cls The class of the database, as selected by Database.create_parser()
+  """
+
+  module = sys.modules.get(getattr(cls, '__module__', None))
+  if module is None: return ''
+  modules = [module] + [m for m in vars(module).values() if isinstance(m, types.ModuleType) and m is not module and hasattr(m, 'Database')]
+  return ' '.join(sorted(set(_package_version(m) for m in modules)))
+
+
+def database_key(args, script_parser, argv=None):
+  """Returns a string identifying the database selected on the command line, its configuration (eg. the protocol) and the versions of its packages: the class of the database, the values of the options which are not options of the script itself and database_version()
+
+  @param args The parsed arguments
+  @param script_parser argparse.ArgumentParser with the options of the script only, as returned by add_database_arguments()
+  @param argv The command line arguments parsed into args (defaults to sys.argv[1:])
+  """
+
+  if argv is None: argv = sys.argv[1:]
+  script_options = set(vars(script_parser.parse_known_args(argv)[0]))
+  options = sorted((k, v) for k, v in vars(args).items() if k not in script_options and k != 'cls')
+  return '%s.%s %r %s' % (getattr(args.cls, '__module__', ''), getattr(args.cls, '__name__', ''), options, database_version(args.cls))
+
+
+def manifest_filename(manifest_dir, key):
+  """Returns the name of the manifest file of the database configuration identified by key in manifest_dir"""
+
+  return os.path.join(manifest_dir, 'db-%s.npz' % hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+
+def add_database_arguments(parser, implements_any_of='video'):
+  """Adds the option --db-manifest and the options of the databases (with antispoofing.utils.db.Database.create_parser()) to the parser of a script, which has to be called once all the options of the script are added. Returns the argparse.ArgumentParser with the options of the script only, to be given to open_database()
+
+  @param parser The argparse.ArgumentParser of the script
+  @param implements_any_of The type of data the databases have to provide (see Database.create_parser())
+  """
+
+  from antispoofing.utils.db import Database
+  parser.add_argument('--db-manifest', metavar='DIR', type=str, dest='db_manifest', default=None, help='Directory of the manifests of the file lists of the database. If set, the file lists are read from the manifest of the selected database and protocol, which is created the first time, instead of querying the database')
+  # the options of the script, before the ones of the database are added
+  script_parser = argparse.ArgumentParser(add_help=False, parents=[parser])
+  Database.create_parser(parser, implements_any_of=implements_any_of)
+  return script_parser
+
+
+def open_database(args, script_parser):
+  """Returns the database selected on the command line, as a ManifestDatabase. If args.db_manifest is set to a directory, the file lists are loaded from the manifest of the selected database configuration in this directory, without creating the database itself. If the manifest does not exist yet, or if it was written for another configuration or for other versions of the database packages (see database_key()), the database is created and queried once, and the manifest is saved
+
+  @param args The parsed arguments
+  @param script_parser argparse.ArgumentParser with the options of the script only, as returned by add_database_arguments()
+  """
+
+  manifest_dir = getattr(args, 'db_manifest', None)
+  if manifest_dir is None:
+    return ManifestDatabase(source=args.cls(args))
+
+  key = database_key(args, script_parser)
+  filename = manifest_filename(manifest_dir, key)
+  if os.path.exists(filename):
+    database = ManifestDatabase.load(filename)
+    if database.key == key: return database
+  database = ManifestDatabase(source=args.cls(args), key=key)
+  database.save(filename, key)
+  return database
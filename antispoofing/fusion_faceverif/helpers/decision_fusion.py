@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+'''Vectorized decision-level fusion of face verification and anti-spoofing systems (AND, OR, majority or k-of-n rules), for one or for a batch of sets of thresholds'''
+
+import numpy
+
+RULES = ('AND', 'OR', 'MAJORITY')
+
+# the maximum number of (set of thresholds, sample, system) decisions evaluated at once
+CHUNK_SIZE = 2**22
+
+
+def required_votes(rule, num_systems):
+  """Returns the number of systems which need to accept a sample for the fused decision to accept it: all of them for 'AND', one for 'OR', more than half of them for 'MAJORITY' and k for a k-of-n rule, given as an integer k (or as a string like '2')
+
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k
+  @param num_systems The number of fused systems
+  """
+
+  if str(rule).isdigit():
+    k = int(rule)
+  elif str(rule).upper() == 'AND':
+    k = num_systems
+  elif str(rule).upper() == 'OR':
+    k = 1
+  elif str(rule).upper() == 'MAJORITY':
+    k = num_systems // 2 + 1
+  else:
+    raise ValueError("Unknown decision fusion rule '%s', use one of %s or the number of systems which need to accept a sample" % (rule, ', '.join(RULES)))
+  if k < 1 or k > num_systems:
+    raise ValueError("A sample can not be accepted by %d out of %d systems" % (k, num_systems))
+  return k
+
+
+def rule_name(rule, num_systems):
+  """Returns the name of the rule to be reported: 'AND', 'OR', 'MAJORITY' or 'k-of-n'"""
+
+  if str(rule).isdigit(): return '%d-of-%d' % (int(rule), num_systems)
+  return str(rule).upper()
+
+
+def _fused_rate(scores, thresholds, rule, accept, inclusive):
+  """Returns the rate of the samples accepted (or rejected) by the fused decision for each set of thresholds"""
+
+  scores = numpy.asarray(scores, 'float64')
+  if scores.ndim == 1: scores = scores[:,None]
+  num_systems = scores.shape[1]
+  k = required_votes(rule, num_systems)
+  thresholds = numpy.asarray(thresholds, 'float64')
+  if thresholds.shape[-1:] != (num_systems,):
+    raise ValueError("The thresholds of shape %s do not match the %d systems" % (thresholds.shape, num_systems))
+  shape = thresholds.shape[:-1]
+  thresholds = thresholds.reshape(-1, num_systems)
+
+  rates = numpy.ndarray((len(thresholds),), 'float64')
+  if len(scores) == 0:
+    rates[:] = numpy.nan
+  else:
+    chunk = max(1, CHUNK_SIZE // scores.size)
+    for i in range(0, len(thresholds), chunk):
+      thr = thresholds[i:i+chunk,None,:]
+      if accept: # accepted by at least k systems
+        votes = (scores[None,:,:] >= thr) if inclusive else (scores[None,:,:] > thr)
+        decision = votes.sum(axis=2) >= k
+      else: # rejected by more than n-k systems, so that less than k systems can accept it
+        decision = (scores[None,:,:] < thr).sum(axis=2) > num_systems - k
+      rates[i:i+chunk] = decision.sum(axis=1) / float(len(scores))
+
+  if len(shape) == 0: return float(rates[0])
+  return rates.reshape(shape)
+
+
+def fused_accept_rate(scores, thresholds, rule='AND', inclusive=False):
+  """Returns the rate of the samples accepted by the fused decision of several systems: the FAR for the impostors and the SFAR for the spoofing attacks. A system accepts a sample if its score is above its threshold (or equal to it, if inclusive is True), and rejects it if its score is below its threshold
+
+  @param scores numpy.ndarray with the scores of the samples (one row per sample, one column per system)
+  @param thresholds The threshold of each system (the last dimension), or a batch of sets of thresholds: an array of shape (..., n_systems) gives an array of rates of shape (...)
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample (see required_votes())
+  @param inclusive If True, a system accepts the scores equal to its threshold
+  """
+
+  return _fused_rate(scores, thresholds, rule, True, inclusive)
+
+
+def fused_reject_rate(scores, thresholds, rule='AND'):
+  """Returns the rate of the samples rejected by the fused decision of several systems: the FRR for the real accesses of the genuine users. A sample is rejected if so many systems reject it that it can not be accepted (eg. any of them for 'AND', all of them for 'OR'). The arguments are as in fused_accept_rate()"""
+
+  return _fused_rate(scores, thresholds, rule, False, False)
+
+
+def fused_decisions(scores, thresholds, rule='AND', inclusive=False):
+  """Returns the decisions of the fused system for each sample, as two boolean numpy.array: the samples accepted and the samples rejected (a sample with nan scores may be neither). The arguments are as in fused_accept_rate(), but with a single set of thresholds"""
+
+  scores = numpy.asarray(scores, 'float64')
+  if scores.ndim == 1: scores = scores[:,None]
+  num_systems = scores.shape[1]
+  k = required_votes(rule, num_systems)
+  thresholds = numpy.asarray(thresholds, 'float64').reshape(1, -1)
+  if thresholds.shape[1] != num_systems:
+    raise ValueError("The %d thresholds do not match the %d systems" % (thresholds.shape[1], num_systems))
+  votes = (scores >= thresholds) if inclusive else (scores > thresholds)
+  accepted = votes.sum(axis=1) >= k
+  rejected = (scores < thresholds).sum(axis=1) > num_systems - k
+  return accepted, rejected
+
+
+def fused_decision_rates(valid, impostors, attacks, thresholds, rule='AND', inclusive=False):
+  """Returns the FAR, the FRR and the SFAR of the fused decision of several systems, for one set or for a batch of sets of thresholds (see fused_accept_rate())
+
+  @param valid numpy.ndarray with the scores of the real accesses of the genuine users (one column per system)
+  @param impostors numpy.ndarray with the scores of the impostors
+  @param attacks numpy.ndarray with the scores of the spoofing attacks
+  @param thresholds The threshold of each system, or a batch of sets of thresholds
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  @param inclusive If True, a system accepts the scores equal to its threshold
+  """
+
+  far = fused_accept_rate(impostors, thresholds, rule, inclusive)
+  frr = fused_reject_rate(valid, thresholds, rule)
+  sfar = fused_accept_rate(attacks, thresholds, rule, inclusive)
+  return far, frr, sfar
+
+
+def _pair_thresholds(fv_thr, as_thr):
+  fv_thr, as_thr = numpy.broadcast_arrays(numpy.asarray(fv_thr, 'float64'), numpy.asarray(as_thr, 'float64'))
+  return numpy.concatenate((fv_thr[...,None], as_thr[...,None]), axis=-1)
+
+
+def _pair_scores(fv_scores, as_scores):
+  fv_scores = numpy.asarray(fv_scores, 'float64').ravel()
+  as_scores = numpy.asarray(as_scores, 'float64').ravel()
+  if fv_scores.shape != as_scores.shape:
+    raise ValueError("The face verification (%d) and anti-spoofing (%d) scores need to be given for the same samples" % (len(fv_scores), len(as_scores)))
+  return numpy.column_stack((fv_scores, as_scores))
+
+
+def accept_rate(fv_scores, as_scores, fv_thr, as_thr, rule='AND'):
+  """Returns the rate of the samples accepted by the fused decision of a face verification and an anti-spoofing system: the FAR for the impostors and the SFAR for the spoofing attacks. If the thresholds are arrays, they are broadcast against each other and the rate is returned for each pair of thresholds (eg. fv_thr[:,None] and as_thr[None,:] give a table of rates for all the combinations)
+
+  @param fv_scores The face verification scores of the samples
+  @param as_scores The anti-spoofing scores of the same samples
+  @param fv_thr The face verification threshold(s)
+  @param as_thr The anti-spoofing threshold(s)
+  @param rule 'AND' (accepted by both systems) or 'OR' (accepted by any of the systems)
+  """
+
+  return fused_accept_rate(_pair_scores(fv_scores, as_scores), _pair_thresholds(fv_thr, as_thr), rule)
+
+
+def reject_rate(fv_scores, as_scores, fv_thr, as_thr, rule='AND'):
+  """Returns the rate of the samples rejected by the fused decision of a face verification and an anti-spoofing system: the FRR for the real accesses of the genuine users. The thresholds are handled as in accept_rate()
+
+  @param fv_scores The face verification scores of the samples
+  @param as_scores The anti-spoofing scores of the same samples
+  @param fv_thr The face verification threshold(s)
+  @param as_thr The anti-spoofing threshold(s)
+  @param rule 'AND' (rejected by any of the systems) or 'OR' (rejected by both systems)
+  """
+
+  return fused_reject_rate(_pair_scores(fv_scores, as_scores), _pair_thresholds(fv_thr, as_thr), rule)
+
+
+def split_decision_scores(scores, fv_column=0, as_column=1):
+  """Returns the (face verification, anti-spoofing) pairs of scores of the real accesses of the genuine users, of the impostors and of the spoofing attacks, from scores gathered with ternary labels
+
+  @param scores BroadcastScores object, as returned by gather_fvas_scores_broadcast() with binary_labels=False
+  @param fv_column The column of the face verification scores
+  @param as_column The column of the anti-spoofing scores
+  """
+
+  return [(scores.column(fv_column, label=label), scores.column(as_column, label=label)) for label in (1, 0, -1)]
+
+
+def split_fused_scores(scores, labels=None, columns=None):
+  """Returns the matrices of scores (one row per sample, one column per system) of the real accesses of the genuine users, of the impostors and of the spoofing attacks, from scores gathered with ternary labels
+
+  @param scores BroadcastScores object, as returned by gather_fvas_scores_broadcast() with binary_labels=False, or numpy.ndarray with the scores of all the samples
+  @param labels The labels of the samples, if scores is a numpy.ndarray
+  @param columns The columns of the fused systems (defaults to all of them: the face verification systems first, then the anti-spoofing systems)
+  """
+
+  if labels is None:
+    if columns is None: columns = range(scores.num_columns())
+    return [numpy.column_stack([scores.column(j, label=label) for j in columns]) for label in (1, 0, -1)]
+  scores = numpy.asarray(scores)
+  if columns is None: columns = range(scores.shape[1])
+  return [scores[labels == label][:,list(columns)] for label in (1, 0, -1)]
+
+
+def decision_rates(valid, impostors, attacks, fv_thr, as_thr, rule='AND'):
+  """Returns the FAR, the FRR and the SFAR of the fused decision of a face verification and an anti-spoofing system, for one pair or for a batch of pairs of thresholds (see accept_rate())
+
+  @param valid The (face verification, anti-spoofing) scores of the real accesses of the genuine users
+  @param impostors The (face verification, anti-spoofing) scores of the impostors
+  @param attacks The (face verification, anti-spoofing) scores of the spoofing attacks
+  @param fv_thr The face verification threshold(s)
+  @param as_thr The anti-spoofing threshold(s)
+  @param rule 'AND' or 'OR'
+  """
+
+  far = accept_rate(impostors[0], impostors[1], fv_thr, as_thr, rule)
+  frr = reject_rate(valid[0], valid[1], fv_thr, as_thr, rule)
+  sfar = accept_rate(attacks[0], attacks[1], fv_thr, as_thr, rule)
+  return far, frr, sfar
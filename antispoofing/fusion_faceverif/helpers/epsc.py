@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+'''Batched evaluation of the error rates along the EPSC: the error rates of the face verification and anti-spoofing systems and of their AND decision fusion are computed for all the thresholds (one per omega and beta) at once'''
+
+import numpy
+
+from .error_rates import ErrorRateIndex
+from .decision_fusion import required_votes, fused_decision_rates
+
+# the maximum number of (threshold pair, sample) decisions evaluated at once
+CHUNK_SIZE = 2**22
+
+
+def _shaped(rates, shape):
+  if len(shape) == 0: return float(rates[0])
+  return rates.reshape(shape)
+
+
+class AndEPSC:
+  """Error rates of the AND decision fusion of a face verification and an anti-spoofing system for batches of pairs of thresholds, as along the EPSC. A sample is accepted if both its scores are greater than or equal to the thresholds. The scores of each system are sorted once, so that the error rates of a single system are found with a binary search for any number of thresholds, and the AND decision is only evaluated for the samples above the face verification thresholds
+
+  @param valid The (face verification, anti-spoofing) scores of the real accesses of the genuine users
+  @param impostors The (face verification, anti-spoofing) scores of the impostors
+  @param attacks The (face verification, anti-spoofing) scores of the spoofing attacks
+  """
+
+  def __init__(self, valid, impostors, attacks):
+    self.scores = []
+    for fv_scores, as_scores in (valid, impostors, attacks):
+      fv_scores = numpy.asarray(fv_scores, 'float64').ravel()
+      as_scores = numpy.asarray(as_scores, 'float64').ravel()
+      if fv_scores.shape != as_scores.shape:
+        raise ValueError("The face verification (%d) and anti-spoofing (%d) scores need to be given for the same samples" % (len(fv_scores), len(as_scores)))
+      # the samples are kept sorted by their face verification score (nan last)
+      order = numpy.argsort(fv_scores, kind='mergesort')
+      self.scores.append((fv_scores[order], as_scores[order]))
+    # the sorted scores of each system
+    self.systems = [ErrorRateIndex(impostors[c], valid[c], attacks[c]) for c in (0, 1)]
+
+  def system_rates(self, thresholds, column=0):
+    """Returns the FAR, the FRR and the SFAR of a single system for each of the thresholds
+
+    @param thresholds The threshold(s) of the system
+    @param column 0 for the face verification system, 1 for the anti-spoofing system
+    """
+
+    return self.systems[column].rates(thresholds)
+
+  def _counts(self, index, fv_thr, as_thr, accept):
+    """Returns the number of samples of the set index accepted (or rejected) by the AND decision for each pair of (flat) thresholds. The pairs are processed in chunks, sorted by face verification threshold: the samples whose face verification score is below all the face verification thresholds of a chunk are rejected for all of them, and only the remaining samples are compared to the thresholds"""
+
+    fv_scores, as_scores = self.scores[index]
+    counts = numpy.zeros((len(fv_thr),), 'int64')
+    if len(fv_scores) == 0: return counts
+    order = numpy.argsort(fv_thr, kind='mergesort')
+    system = self.systems[0]
+    sorted_fv = (system.positives, system.negatives, system.attacks)[index]
+    chunk = max(1, CHUNK_SIZE // len(fv_scores))
+    for i in range(0, len(order), chunk):
+      selected = order[i:i+chunk]
+      first = numpy.searchsorted(sorted_fv, fv_thr[selected[0]], 'left')
+      fv_above = fv_scores[None,first:]; as_above = as_scores[None,first:]
+      if accept: # accepted by both systems
+        decision = (fv_above >= fv_thr[selected,None]) & (as_above >= as_thr[selected,None])
+        counts[selected] = decision.sum(axis=1)
+      else: # rejected by any of the systems
+        decision = (fv_above < fv_thr[selected,None]) | (as_above < as_thr[selected,None])
+        counts[selected] = first + decision.sum(axis=1)
+    return counts
+
+  def _rate(self, index, fv_thr, as_thr, accept):
+    n = len(self.scores[index][0])
+    if n == 0: return numpy.nan * numpy.ones(fv_thr.shape, 'float64')
+    return self._counts(index, fv_thr, as_thr, accept) / float(n)
+
+  def rates(self, fv_thr, as_thr):
+    """Returns the FAR, the FRR and the SFAR of the AND decision fusion for each pair of thresholds. The thresholds are broadcast against each other: eg. the face verification and anti-spoofing thresholds for each omega give the error rates for each omega
+
+    @param fv_thr The face verification threshold(s)
+    @param as_thr The anti-spoofing threshold(s)
+    """
+
+    fv_thr, as_thr = numpy.broadcast_arrays(numpy.asarray(fv_thr, 'float64'), numpy.asarray(as_thr, 'float64'))
+    shape = fv_thr.shape
+    fv_thr = fv_thr.ravel(); as_thr = as_thr.ravel()
+
+    far = self._rate(1, fv_thr, as_thr, accept=True)
+    frr = self._rate(0, fv_thr, as_thr, accept=False)
+    sfar = self._rate(2, fv_thr, as_thr, accept=True)
+    return _shaped(far, shape), _shaped(frr, shape), _shaped(sfar, shape)
+
+
+def fused_epsc_rates(valid, impostors, attacks, thresholds, rule='AND'):
+  """Returns the FAR, the FRR and the SFAR of the fused decision of several systems for each set of thresholds (eg. one per omega), where a system accepts the scores greater than or equal to its threshold. The AND decision of two systems is evaluated with AndEPSC, any other rule with decision_fusion.fused_decision_rates()
+
+  @param valid numpy.ndarray with the scores of the real accesses of the genuine users (one column per system)
+  @param impostors numpy.ndarray with the scores of the impostors
+  @param attacks numpy.ndarray with the scores of the spoofing attacks
+  @param thresholds numpy.ndarray with the sets of thresholds (one row per set, one column per system)
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  """
+
+  thresholds = numpy.asarray(thresholds, 'float64')
+  num_systems = thresholds.shape[-1]
+  if num_systems == 2 and required_votes(rule, num_systems) == 2:
+    epsc = AndEPSC(*[(s[:,0], s[:,1]) for s in (valid, impostors, attacks)])
+    return epsc.rates(thresholds[...,0], thresholds[...,1])
+  return fused_decision_rates(valid, impostors, attacks, thresholds, rule, inclusive=True)
+
+
+def epsc_error_rates(far, frr, sfar, omega, beta=0.5):
+  """Returns the weighted FAR, FAR_w = (1-omega) * FAR + omega * SFAR, and the weighted error rate, WER_w = beta * FAR_w + (1-beta) * FRR (the HTER_w for beta=0.5), for each omega
+
+  @param far The FAR, scalar or for each omega
+  @param frr The FRR, scalar or for each omega
+  @param sfar The SFAR, scalar or for each omega
+  @param omega The weight(s) of the SFAR
+  @param beta The weight of the FAR_w
+  """
+
+  omega = numpy.asarray(omega, 'float64')
+  far_w = (1 - omega) * far + omega * sfar
+  if beta == 0.5:
+    return far_w, (far_w + frr) / 2
+  return far_w, beta * far_w + (1 - beta) * frr
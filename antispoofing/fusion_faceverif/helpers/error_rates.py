@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+'''Index of the sorted scores of the negatives, the positives and the spoofing attacks of a system, giving the error rates at any threshold with a binary search'''
+
+import numpy
+
+
+def _sorted(scores):
+  """Returns the sorted scores without the nan, and the total number of scores"""
+
+  if scores is None: return numpy.ndarray((0,), 'float64'), 0
+  scores = numpy.asarray(scores, 'float64').ravel()
+  return numpy.sort(scores[~numpy.isnan(scores)]), len(scores)
+
+
+def _shaped(rates, thresholds):
+  if numpy.ndim(thresholds) == 0: return float(rates)
+  return rates
+
+
+class ErrorRateIndex:
+  """The scores of each class of samples of a system, sorted once. The FAR (rate of the negatives with a score greater than or equal to the threshold), the FRR (rate of the positives with a score lower than the threshold) and the SFAR (rate of the spoofing attacks with a score greater than or equal to the threshold) are computed as in bob.measure.farfrr(), in O(log n) for each threshold. All the methods accept a single threshold or an array of thresholds. Scores which are nan are counted in the number of samples, but are never accepted nor rejected
+
+  @param negatives The scores of the negatives (eg. the impostors)
+  @param positives The scores of the positives (eg. the real accesses of the genuine users)
+  @param attacks The scores of the spoofing attacks
+  """
+
+  def __init__(self, negatives=None, positives=None, attacks=None):
+    self.negatives, self.num_negatives = _sorted(negatives)
+    self.positives, self.num_positives = _sorted(positives)
+    self.attacks, self.num_attacks = _sorted(attacks)
+
+  @staticmethod
+  def _above(scores, num_scores, thresholds):
+    if num_scores == 0: return numpy.nan * numpy.ones(numpy.shape(thresholds), 'float64')
+    return (len(scores) - numpy.searchsorted(scores, thresholds, 'left')) / float(num_scores)
+
+  @staticmethod
+  def _below(scores, num_scores, thresholds):
+    if num_scores == 0: return numpy.nan * numpy.ones(numpy.shape(thresholds), 'float64')
+    return numpy.searchsorted(scores, thresholds, 'left') / float(num_scores)
+
+  def far(self, thresholds):
+    return _shaped(self._above(self.negatives, self.num_negatives, thresholds), thresholds)
+
+  def frr(self, thresholds):
+    return _shaped(self._below(self.positives, self.num_positives, thresholds), thresholds)
+
+  def sfar(self, thresholds):
+    return _shaped(self._above(self.attacks, self.num_attacks, thresholds), thresholds)
+
+  def farfrr(self, thresholds):
+    """Returns the FAR and the FRR at the threshold(s)"""
+
+    return self.far(thresholds), self.frr(thresholds)
+
+  def rates(self, thresholds):
+    """Returns the FAR, the FRR and the SFAR at the threshold(s)"""
+
+    return self.far(thresholds), self.frr(thresholds), self.sfar(thresholds)
+
+  def thresholds(self):
+    """Returns the sorted candidate thresholds: all the scores of the negatives and the positives, and a threshold above all of them. As the error rates are constant between two consecutive scores, these thresholds give all the possible pairs of FAR and FRR"""
+
+    thresholds = numpy.union1d(self.negatives, self.positives)
+    if len(thresholds) == 0:
+      raise ValueError("There are no scores of negatives or positives to compute a threshold")
+    return numpy.append(thresholds, numpy.nextafter(thresholds[-1], numpy.inf))
+
+  def eer_threshold(self):
+    """Returns the threshold minimizing |FAR - FRR|. Among the thresholds with the same difference, the one with the lowest HTER is returned"""
+
+    thresholds = self.thresholds()
+    far, frr = self.farfrr(thresholds)
+    return float(thresholds[numpy.lexsort((far + frr, numpy.abs(far - frr)))[0]])
+
+  def min_hter_threshold(self):
+    """Returns the threshold minimizing the HTER, (FAR + FRR) / 2"""
+
+    thresholds = self.thresholds()
+    far, frr = self.farfrr(thresholds)
+    return float(thresholds[numpy.argmin(far + frr)])
+
+  def frr_threshold(self, frr):
+    """Returns the highest threshold (ie. the lowest FAR) whose FRR does not exceed the given FRR(s)"""
+
+    thresholds = self.thresholds()
+    frr_values = self.frr(thresholds) # the FRR grows with the threshold
+    index = numpy.searchsorted(frr_values, frr, 'right') - 1
+    return _shaped(thresholds[numpy.maximum(index, 0)], frr)
+
+  def far_at_frr(self, frr):
+    """Returns the FAR at the frr_threshold() of the given FRR(s)"""
+
+    return self.far(self.frr_threshold(frr))
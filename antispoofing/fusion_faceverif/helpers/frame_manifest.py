@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+'''Persistent manifest with the number of frames of each video of a database'''
+
+import os
+import json
+
+
+class FrameCountManifest:
+  """Keeps the number of frames of the videos in a database in a small JSON file, so that the videos need to be opened only once. The entries are stored per database root directory and are invalidated when the size or the modification time of the video file change. If a video file is not available, its cached number of frames is trusted, so the raw videos are not required once the manifest is built.
+
+  @param filename The JSON file where the manifest is stored
+  @param root The base directory containing the videos of the database
+  """
+
+  def __init__(self, filename, root):
+    self.filename = filename
+    self.root = os.path.realpath(root)
+    self.dirty = False
+    self.roots = {}
+    if os.path.exists(filename):
+      with open(filename) as f:
+        self.roots = json.load(f)
+    self.entries = self.roots.setdefault(self.root, {})
+
+  def __len__(self):
+    return len(self.entries)
+
+  def number_of_frames(self, obj):
+    """Returns the number of frames of the video corresponding to the database File object obj. The video is probed only if it is not in the manifest or if it has changed since it was last probed"""
+
+    key = str(obj.make_path())
+    entry = self.entries.get(key)
+    videofile = obj.videofile(self.root)
+
+    if not os.path.exists(videofile):
+      if entry is None:
+        raise IOError("Video file %s does not exist and its number of frames is not in the manifest %s" % (videofile, self.filename))
+      return entry['frames']
+
+    stat = os.stat(videofile)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+      return entry['frames']
+
+    import bob.io.video # the decoder is needed only when a video has to be probed
+    frames = bob.io.video.reader(videofile).number_of_frames
+    self.entries[key] = {'size':stat.st_size, 'mtime':stat.st_mtime, 'frames':frames}
+    self.dirty = True
+    return frames
+
+  def save(self):
+    """Writes the manifest to its file, if any of the entries has been updated"""
+
+    if not self.dirty: return
+    dirname = os.path.dirname(self.filename)
+    if dirname and not os.path.exists(dirname): os.makedirs(dirname)
+    tmpname = self.filename + '.tmp'
+    with open(tmpname, 'w') as f:
+      json.dump(self.roots, f, sort_keys=True)
+    os.rename(tmpname, self.filename) # atomic replacement, so that a concurrent conversion never sees a partial file
+    self.dirty = False
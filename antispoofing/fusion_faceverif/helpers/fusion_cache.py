@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+'''Cache of trained score fusion machines, keyed by a hash of the training scores and of the fusion options'''
+
+import os
+import hashlib
+import numpy
+import bob.io.base
+
+from antispoofing.utils.helpers import ensure_dir
+
+# the (module, class) of the trained machine of each fusion algorithm which can be cached: the linear machine of the logistic regression fusions and the SVM of the SVM fusion. The GMM fusion is not cached, as it does not give access to its trained GMMs
+MACHINE_TYPES = {
+  'LLR': ('bob.learn.linear', 'Machine'),
+  'LLR_P': ('bob.learn.linear', 'Machine'),
+  'SVM': ('bob.learn.libsvm', 'Machine'),
+}
+CACHEABLE_FUSIONS = tuple(sorted(MACHINE_TYPES))
+
+
+def fusion_cache_key(train_pos, train_neg, algorithm, **options):
+  """Returns a hexadecimal hash identifying a trained fusion machine: the same training scores, fusion algorithm and options give the same machine
+
+  @param train_pos numpy.ndarray with the positive training scores (one row per sample, one column per algorithm)
+  @param train_neg numpy.ndarray with the negative training scores
+  @param algorithm The name of the fusion algorithm (eg. 'LLR')
+  @param options Any other option which changes the trained machine (eg. client_specific=True)
+  """
+
+  h = hashlib.sha1()
+  h.update(str(algorithm).encode('utf-8'))
+  h.update(repr(sorted(options.items())).encode('utf-8'))
+  for scores in (train_pos, train_neg):
+    scores = numpy.ascontiguousarray(scores, 'float64')
+    h.update(repr(scores.shape).encode('utf-8'))
+    h.update(scores.data)
+  return h.hexdigest()
+
+
+def cached_machine_filename(cache_dir, key, algorithm):
+  return os.path.join(cache_dir, 'fusion-%s-%s.hdf5' % (str(algorithm).lower(), key))
+
+
+class CachedFusion:
+  """A linear score fusion loaded from the cache. It behaves like the trained fusion object it replaces: it can be called with a score matrix and returns its machine with get_machine()"""
+
+  def __init__(self, machine):
+    self.machine = machine
+
+  def __call__(self, scores):
+    return self.machine(numpy.asarray(scores, 'float64')).ravel()
+
+  def get_machine(self):
+    return self.machine
+
+
+def load_cached_fusion(cache_dir, key, algorithm='LLR', fusion=None):
+  """Returns the cached fusion with the given key, or None if it is not in the cache. The machine is loaded with the machine type of the fusion algorithm (see MACHINE_TYPES). A linear machine is returned as a CachedFusion object, which applies it directly to the scores. Any other machine is restored into the given untrained fusion object (eg. SVMFusion()), as its trained machine, and the fusion object is returned
+
+  @param cache_dir The directory of the cache
+  @param key The key of the trained machine (see fusion_cache_key())
+  @param algorithm The name of the fusion algorithm (eg. 'SVM')
+  @param fusion The untrained fusion object of the algorithm, needed for the machines which are not linear
+  """
+
+  if algorithm not in MACHINE_TYPES:
+    raise ValueError("The machines of the %s fusion can not be cached, only the ones of %s" % (algorithm, ', '.join(CACHEABLE_FUSIONS)))
+  filename = cached_machine_filename(cache_dir, key, algorithm)
+  if not os.path.exists(filename): return None
+  module, name = MACHINE_TYPES[algorithm]
+  machine = getattr(__import__(module, fromlist=[name]), name)(bob.io.base.HDF5File(filename))
+  if module == 'bob.learn.linear':
+    return CachedFusion(machine)
+  if fusion is None:
+    raise ValueError("The %s machine can only be restored into a fusion object" % algorithm)
+  fusion.machine = machine
+  return fusion
+
+
+def save_cached_fusion(machine, cache_dir, key, algorithm='LLR'):
+  """Saves a trained fusion machine into the cache, under the given key and fusion algorithm. The machine is first written under a temporary name and then renamed, so that a concurrent run never loads a partially written machine"""
+
+  if algorithm not in MACHINE_TYPES:
+    raise ValueError("The machines of the %s fusion can not be cached, only the ones of %s" % (algorithm, ', '.join(CACHEABLE_FUSIONS)))
+  ensure_dir(cache_dir)
+  filename = cached_machine_filename(cache_dir, key, algorithm)
+  tmpname = filename + '.tmp'
+  outfile = bob.io.base.HDF5File(tmpname, 'w')
+  machine.save(outfile)
+  del outfile # closes the file
+  os.rename(tmpname, filename)
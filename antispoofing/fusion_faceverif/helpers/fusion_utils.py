@@ -6,46 +6,72 @@ import os, sys
 import argparse
 import bob.io.base
 import numpy
+from multiprocessing.pool import ThreadPool
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion.readers import *
+from antispoofing.utils.helpers import ensure_dir
 
-def polinomial_augmentation(scores):
-  num_dim = scores.shape[1] * (scores.shape[1] + 1) / 2  + scores.shape[1]# number of dimensions in the augmented feature space
-  augscores = numpy.ndarray([scores.shape[0], num_dim], 'float64')
+from .score_store import find_packed
+from .sparse_scores import SparseScores
+from .broadcast_scores import BroadcastScores
+from .array_io import save_arrays
+from .score_parser import score_arrays
+from .video_scores import segment_reduce
+from .augmentation import PolinomialAugmentation
+from .licit_tensor import LicitScoreTensor
 
-  augscores[:,range(scores.shape[1])] = scores
-  ind = scores.shape[1]
-  for i in range(scores.shape[1]):
-    for j in range(i, scores.shape[1]):
-      augscores[:,ind] = scores[:,i] * scores[:,j]
-      ind += 1
+def polinomial_augmentation(scores, out=None):
+  """Returns the scores augmented with the products of all the pairs of their columns (the quadratic terms), after the original columns. See PolinomialAugmentation
+
+  @param scores numpy.ndarray with the scores (one row per sample, one column per system)
+  @param out numpy.ndarray into which the augmented scores are written, instead of allocating a new matrix
+  """
+
+  scores = numpy.asarray(scores, 'float64')
+  return PolinomialAugmentation(scores.shape[1])(scores, out)
 
-  return augscores
 
+def save_fused_scores(all_scores, all_labels, dirname, protocol, subset, identities=None, binary=False, chunk_size=100000):
+  """Saves the fused scores in a 4 column format. If the identities of the rows are not given, since the exact identity of the user is not known, as well as the filename of the used file, we will put dummy identities and dummy filename in the first three columns. The nan scores are removed. The rows are formatted in bulk and written chunk by chunk
 
-def save_fused_scores(all_scores, all_labels, dirname, protocol, subset):
-  """Saves the fused scores in a 4 column format. Since the exact identity of the user is not known, as well as the filename of the used file, we will put dummy identities and dummy filename in the first three columns"""
+  @param all_scores numpy.array with the fused score of each row
+  @param all_labels numpy.array with the label of each row (1 for the positives)
+  @param dirname The base output directory
+  @param protocol The face verification protocol ('licit', 'spoof' or 'both')
+  @param subset The alias of the subset in the name of the score file ('dev' or 'eval')
+  @param identities The claimed identities, the real identities and the test labels of the rows, as returned by ScoreQuery.identities(), or None
+  @param binary If True, the scores are also saved in a binary .npz file (scores-<subset>.npz), with the columns of score_parser.score_arrays(), which can be loaded with score_parser.load_score_file() without parsing
+  @param chunk_size The number of rows formatted and written at once
+  """
+
+  all_scores = numpy.asarray(all_scores, 'float64').ravel()
+  all_labels = numpy.asarray(all_labels).ravel()
+  valid = ~numpy.isnan(all_scores) # remove nan scores
+  scores = all_scores[valid]
+  if identities is None: # negative rows (imposter or spoof, depending on the protocol) have different dummy identities than the positive ones (real access)
+    positive = all_labels[valid] == 1
+    claimed = numpy.repeat(numpy.array(['x']), len(scores))
+    real = numpy.where(positive, 'x', 'y')
+    tests = numpy.repeat(numpy.array(['foo']), len(scores))
+  else:
+    claimed, real, tests = [numpy.asarray(column)[valid] for column in identities]
 
-  # remove nan scores
   #outdir = os.path.join(dirname, "10_" + protocol, "scores")
   outdir = os.path.join(dirname, protocol, "scores")
   filename = "scores-" + subset
   ensure_dir(outdir)
   f = open(os.path.join(outdir, filename), 'w')
-  for i in range(0, len(all_scores)):
-    if numpy.isnan(all_scores[i]):
-      continue
-    if all_labels[i] != 1: # negative (imposter or spoof, depending on the protocol)
-      f.write("x y foo %f\n" % all_scores[i])
-    else: # positive sample, real access
-      f.write("x x foo %f\n" % all_scores[i])
+  for i in range(0, len(scores), chunk_size):
+    rows = slice(i, i+chunk_size)
+    prefix = numpy.char.add(numpy.char.add(numpy.char.add(numpy.char.add(claimed[rows].astype('U'), ' '), real[rows].astype('U')), ' '), tests[rows].astype('U'))
+    lines = numpy.char.add(numpy.char.add(prefix, ' '), numpy.char.mod('%f', scores[rows]))
+    f.write('\n'.join(lines) + '\n')
   f.close()
 
+  if binary:
+    save_arrays(os.path.join(outdir, filename + '.npz'), **score_arrays(claimed, real, tests, scores))
+
 def save_fusion_machine(machine, dirname, protocol, subset):
   """ Saves a trained fusion machine in an .hdf5 file for future use
   """
@@ -72,6 +98,88 @@ def save_norm_params(norm_params, dirname, protocol, subset):
   norm_params_array = numpy.append(norm_params_array, std, axis=0) 
   bob.io.base.save(norm_params_array, outfile)
 
+def read_score_file(filename):
+  """Reads the scores saved in an .hdf5 score file as a flat numpy.array of float64, regardless of whether they were saved as a row or as a column"""
+
+  return numpy.asarray(bob.io.base.load(filename), 'float64').ravel()
+
+
+def file_labels(files, protocol, client_id=None, binary_labels=True):
+  """
+  Return a numpy.array with one label per bob.db.replay.File, computed only from the file metadata
+
+  @param files The files that need to be labeled
+  @param protocol The protocol: "licit" or "spoof"
+  @param client_id The id of the client (in the format 'clientXXX') if the protocol is "licit", otherwise can be left to None
+  @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
+  """
+
+  is_real = numpy.array([f.is_real() for f in files], 'bool')
+  labels = numpy.where(is_real, 1, 0 if binary_labels else -1)
+  if protocol == 'licit': # the samples of the other clients are zero-effort impostors
+    client_ids = numpy.array(["client%03d" % f.get_client_id() for f in files])
+    labels = numpy.where(client_ids == client_id, labels, 0)
+  return labels.astype('int')
+
+
+def load_scores(dirs, files, subset=None):
+  """
+  Reads the scores of the given files from each of the directories in dirs, reading every score file exactly once. Returns a numpy.ndarray with one column per directory and the number of scores in each file
+
+  @param dirs List of directories containing the score files (one column of the output per directory)
+  @param files The bob.db.replay.File objects whose scores are read
+  @param subset 'train', 'devel' or 'test'. If given and a packed score file of this subset exists for a directory (see pack_scores()), the scores are read from the packed file instead of the per-file .hdf5 files
+  """
+
+  lengths = None
+  for col, d in enumerate(dirs):
+    packed, model = find_packed(d, subset)
+    if packed is not None:
+      column, file_lengths = packed.get(files, model)
+    else:
+      blocks = [read_score_file(str(f.make_path(d, extension='.hdf5'))) for f in files]
+      file_lengths = numpy.array([len(b) for b in blocks], 'int')
+      column = numpy.concatenate(blocks) if blocks else numpy.ndarray((0,), 'float64')
+    if lengths is None:
+      lengths = file_lengths
+      scores = numpy.ndarray((lengths.sum(), len(dirs)), 'float64')
+    mismatch = numpy.flatnonzero(file_lengths != lengths)
+    if len(mismatch):
+      i = mismatch[0]
+      raise ValueError("The score file of %s in %s has %d scores, but %d were expected" % (files[i].make_path(), d, file_lengths[i], lengths[i]))
+    scores[:, col] = column
+
+  if lengths is None: # no directories given
+    lengths = numpy.zeros((len(files),), 'int')
+    scores = numpy.ndarray((0, 0), 'float64')
+  return scores, lengths
+
+
+def load_scores_and_labels(indirs, files, protocol, client_id=None, onlyValidScores=False, binary_labels=True, subset=None):
+  """
+  Return a numpy.ndarray with the scores and a numpy.array with the labels of all bob.db.replay.File, reading every score file only once. The labels are computed from the file metadata and broadcast to all the scores of each file
+
+  @param indirs List of input directories where the score files are stored (one column of the scores per directory). For the 'licit' protocol, the client_id subdirectory is added automatically
+  @param files The files that need to be loaded
+  @param protocol The protocol: "licit" or "spoof"
+  @param client_id The id of the client if the protocol is "licit", otherwise can be left to None
+  @param onlyValidScores if True will return only the scores (and labels) which are not nan
+  @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
+  @param subset 'train', 'devel' or 'test'. If given, the packed score files of this subset are used when they exist
+  """
+
+  if protocol == 'licit':
+    indirs = [os.path.join(d, client_id) for d in indirs]
+  scores, lengths = load_scores(indirs, files, subset)
+  labels = numpy.repeat(file_labels(files, protocol, client_id, binary_labels), lengths)
+
+  if onlyValidScores:
+    valid = ~numpy.isnan(scores).any(axis=1)
+    scores = scores[valid]
+    labels = labels[valid]
+  return scores, labels
+
+
 def get_labels(indir, files, protocol, client_id=None, onlyValidScores=True, binary_labels=True):
   """
   Return a numpy.array with the labels of all bob.db.replay.File
@@ -84,78 +192,458 @@ def get_labels(indir, files, protocol, client_id=None, onlyValidScores=True, bin
   @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
   """
 
-  def reshape(scores):
-    numrows=1
-    if len(scores.shape) == 1:
-      numcols = scores.shape[0]
-    elif (scores.shape[1] == 1):
-      numcols = scores.shape[0]
+  return load_scores_and_labels([indir], files, protocol, client_id, onlyValidScores, binary_labels)[1]
+
+
+def load_sparse_scores(dirs, files, subset=None):
+  """
+  Reads the valid scores of the given files from each of the directories in dirs, as a SparseScores object with one column per directory. Only the frames which have a valid score in all the directories are kept. If a packed score file exists for a directory, only its valid scores are read
+
+  @param dirs List of directories containing the score files (one column of the output per directory)
+  @param files The bob.db.replay.File objects whose scores are read
+  @param subset 'train', 'devel' or 'test'. If given, the packed score files of this subset are used when they exist
+  """
+
+  result = None
+  for d in dirs:
+    packed, model = find_packed(d, subset)
+    if packed is not None:
+      column = packed.get_sparse(files, model)
     else:
-      numcols = scores.shape[1]
-    scores = numpy.reshape(scores,(numrows,numcols))
-    return scores
-  '''
-  def reshape(scores):
-    if(scores.shape[1]==1):
-      scores = numpy.reshape(scores,(scores.shape[1],scores.shape[0]))
-    return scores  
-  '''
-  
-  #Finding the number of elements (total number of scores in all the files)
-  totalScores = 0
-  for f in files:
-    if protocol == 'licit':
-      fileName = str(f.make_path(os.path.join(indir, client_id), extension='.hdf5'))
-    else: #'spoof' protocol
-      fileName = str(f.make_path(indir,extension='.hdf5'))
-    scores = bob.io.base.load(fileName)
-    scores = reshape(scores)
-    totalScores =totalScores + scores.shape[1]
-    
-  # calculating the labels
-  allLabels = numpy.ndarray((totalScores), 'int')
-  allScores = numpy.zeros(shape=(totalScores))
-  offset = 0
-  for f in files:
-    if protocol == 'licit':
-      fileName = str(f.make_path(os.path.join(indir, client_id),extension='.hdf5'))
-    else: #'spoof' protocol
-      fileName = str(f.make_path(indir,extension='.hdf5'))
-    scores = bob.io.base.load(fileName)
-    scores = reshape(scores)
-    labels = numpy.ndarray(scores.shape, 'int')
-    if protocol == 'licit':
-      if client_id == "client%03d" % f.get_client_id():
-        if f.is_real():
-          labels[0,:] = 1
-        else:
-          if binary_labels == True: 
-            labels[0,:] = 0 
-          else: 
-            labels[0,:] = -1
-      else:
-        labels[0,:] = 0
-    else: # 'spoof' protocol
-      if f.is_real():
-        labels[0,:] = 1
+      column = SparseScores.from_dense(*load_scores([d], files))
+    result = column if result is None else result.join(column)
+  return result
+
+
+def load_licit_scores(dirs, files, client, subset=None, tensor=None):
+  """Reads the valid scores of the given files for the model of a client in the LICIT protocol, as a SparseScores object with one column per directory. If a LicitScoreTensor is given, the scores are sliced from it instead of being read from the score files
+
+  @param dirs List of the LICIT protocol dirs of the systems (eg. <scoresdir>/licit)
+  @param files The bob.db.replay.File objects whose scores are read
+  @param client The client id of the model, in the format 'clientXXX'
+  @param subset 'train', 'devel' or 'test'. If given, the packed score files of this subset are used when they exist
+  @param tensor A LicitScoreTensor containing the scores of the LICIT protocol of these dirs, or None
+  """
+
+  if tensor is not None:
+    return tensor.sparse(client, files, dirs)
+  return load_sparse_scores([os.path.join(d, client) for d in dirs], files, subset)
+
+
+def imap_clients(function, clients, workers=1):
+  """Calls function(client) for each of the clients and yields the results in the order of the clients. If workers is greater than 1, the calls are done concurrently on a pool of at most workers threads, so that the scores of several clients are read at the same time. The results are still yielded in the order of the clients, so the gathered scores do not depend on the number of workers
+
+  @param function Function taking the client id (in the format 'clientXXX') as its only argument
+  @param clients List of client ids
+  @param workers The maximum number of threads reading concurrently
+  """
+
+  if workers is None or workers <= 1 or len(clients) <= 1:
+    for cl in clients:
+      yield function(cl)
+    return
+
+  pool = ThreadPool(min(workers, len(clients)))
+  try:
+    for result in pool.imap(function, clients):
+      yield result
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+def add_jobs_argument(parser):
+  """Adds the option -j/--jobs, the number of threads reading the scores of different clients concurrently (see imap_clients()), to the argparse.ArgumentParser of a script"""
+
+  parser.add_argument('-j', '--jobs', type=int, dest='jobs', default=1, help='The number of threads reading the scores of different clients concurrently (defaults to %(default)s)')
+
+
+class ScoreMatrixBuilder:
+  """Builds the gathered score matrix and its labels in preallocated arrays. Each added block is written directly into its slice of the output, dropping the rows with nan values on the way, so the accumulated matrix is never copied"""
+
+  def __init__(self, num_rows, num_cols):
+    """
+    @param num_rows The maximum number of rows that will be added (valid or not)
+    @param num_cols The number of columns (algorithms) of the score matrix
+    """
+    self.scores = numpy.ndarray((num_rows, num_cols), 'float64')
+    self.labels = numpy.ndarray((num_rows,), 'int')
+    self.size = 0
+
+  def add(self, labels, *blocks):
+    """Adds the rows of the given score blocks, joined column-wise in the given order (eg. face verification scores, then anti-spoofing scores), together with their labels. The rows with a nan value in any of the blocks are dropped"""
+
+    valid = numpy.ones((len(labels),), 'bool')
+    for block in blocks:
+      valid &= ~numpy.isnan(block).any(axis=1)
+    num_valid = numpy.count_nonzero(valid)
+    if self.size + num_valid > self.scores.shape[0]:
+      raise ValueError("The score matrix was preallocated for %d rows, but %d valid rows were added" % (self.scores.shape[0], self.size + num_valid))
+
+    col = 0
+    for block in blocks:
+      self.scores[self.size:self.size+num_valid, col:col+block.shape[1]] = block[valid]
+      col += block.shape[1]
+    self.labels[self.size:self.size+num_valid] = labels[valid]
+    self.size += num_valid
+
+  def add_sparse(self, labels, *blocks):
+    """Adds the rows of the given SparseScores blocks of the same files, joined column-wise in the given order. Only the frames valid in all the blocks are added.
+
+    @param labels The label of each file (see file_labels()), broadcast to all its valid frames
+    """
+
+    joined = blocks[0]
+    for block in blocks[1:]:
+      joined = joined.join(block)
+    self.add(numpy.repeat(labels, joined.lengths()), joined.scores)
+
+  def result(self):
+    """Returns the score matrix and the labels of the valid rows. The preallocated arrays are shrunk in place, so the rows which were not filled are released"""
+
+    self.scores.resize((self.size, self.scores.shape[1]), refcheck=False)
+    self.labels.resize((self.size,), refcheck=False)
+    return self.scores, self.labels
+
+
+class ScoreQuery:
+  """Lazy query engine over the scores of the face verification and anti-spoofing algorithms of a database. The file lists of each subset and the valid scores of each score directory are read the first time a query needs them, and are then kept in memory. Any number of queries (subsets, protocols, clients, combinations of algorithms, label modes, normalization and augmentation) reads each score file only once: the scores of each directory are kept separately in sparse form and only joined for the query. The scores of the LICIT protocol of all the models of a subset are read into a LicitScoreTensor the first time the LICIT protocol is asked for, and the scores of each client are sliced from it.
+
+  The gather_* functions of this module create a ScoreQuery for a single query. Scripts asking for several subsets or label modes should create one ScoreQuery and use it for all of them.
+  """
+
+  def __init__(self, database, workers=1, tensors=None):
+    """
+    @param database The database (replay)
+    @param workers The number of threads reading the scores of different clients concurrently
+    @param tensors Dictionary of LicitScoreTensor objects indexed by the subset, already loaded. The scores of the LICIT protocol dirs contained in a tensor are sliced from it, instead of being read from the score files
+    """
+
+    self.database = database
+    self.workers = workers
+    self.given_tensors = dict(tensors or {})
+    self.tensors = dict(self.given_tensors)
+    self.file_lists = {}
+    self.columns = {}
+
+  def clear(self):
+    """Releases the scores kept in memory"""
+
+    self.columns = {}
+    self.tensors = dict(self.given_tensors)
+
+  def files(self, subset):
+    """Returns the real accesses and the attacks of a subset ('train', 'devel' or 'test')"""
+
+    if subset not in self.file_lists:
+      if subset == 'devel':
+        self.file_lists[subset] = self.database.get_devel_data()
+      elif subset == 'test':
+        self.file_lists[subset] = self.database.get_test_data()
       else:
-        if binary_labels == True: 
-          labels[0,:] = 0
-        else: 
-          labels[0,:] = -1
-    
-    allScores[offset:offset+scores.shape[1]] = numpy.reshape(scores,(scores.shape[1]))
-    allLabels[offset:offset+labels.shape[1]] = numpy.reshape(labels,(labels.shape[1]))
-    offset = offset + labels.shape[1]
+        self.file_lists[subset] = self.database.get_train_data()
+    return self.file_lists[subset]
+
+  def clients(self, subset):
+    """Returns the client ids (in the format 'clientXXX') of the real accesses of a subset"""
+
+    real, _ = self.files(subset)
+    return list(set(["client%03d" % x.get_client_id() for x in real]))
+
+  def column(self, directory, subset, kind, client=None):
+    """Returns the valid scores of one score directory as a SparseScores object. The scores are read only the first time they are asked for
+
+    @param directory The score directory. For the LICIT protocol, the protocol dir (eg. <scoresdir>/licit), without the client dir
+    @param subset 'train', 'devel' or 'test'
+    @param kind 'real' for the real accesses of the subset, 'attack' for the attacks
+    @param client For the LICIT protocol, the client id of the model, in the format 'clientXXX'
+    """
+
+    key = (os.path.normpath(directory), client, subset, kind)
+    if key not in self.columns:
+      real, attack = self.files(subset)
+      files = real if kind == 'real' else attack
+      if client is None:
+        self.columns[key] = load_sparse_scores([directory], files, subset)
+      else: # sliced from the tensor, which is not copied in the columns
+        return self.licit_tensor(subset, [directory]).sparse(client, files, [directory])
+    return self.columns[key]
+
+  def scores(self, dirs, subset, kind, client=None):
+    """Returns the valid scores in all the directories in dirs, joined column-wise, as a SparseScores object (see column())"""
+
+    if client is not None and kind == 'real' and dirs:
+      return self.licit_tensor(subset, dirs).sparse(client, self.files(subset)[0], dirs)
+    result = None
+    for d in dirs:
+      column = self.column(d, subset, kind, client)
+      result = column if result is None else result.join(column)
+    return result
+
+  def licit_tensor(self, subset, dirs):
+    """Returns the LicitScoreTensor with the scores of the LICIT protocol dirs of all the models of a subset. The scores of the models are read once, concurrently by the workers, the first time the dirs are asked for. The dirs which are not in the tensor of the subset yet are read and added to it, the scores of the other dirs are taken from the tensor
+
+    @param subset 'train', 'devel' or 'test'
+    @param dirs The LICIT protocol dirs (eg. <scoresdir>/licit), without the client dirs
+    """
+
+    tensor = self.tensors.get(subset)
+    if tensor is not None and tensor.has_systems(dirs):
+      return tensor
+
+    real, _ = self.files(subset)
+    clients = sorted(self.clients(subset)) if tensor is None else tensor.models
+    known = tensor.dirs if tensor is not None else []
+    missing = []
+    for d in dirs:
+      if os.path.normpath(d) not in known and os.path.normpath(d) not in missing: missing.append(os.path.normpath(d))
+
+    def read_client(cl):
+      kept = [tensor.sparse(cl, real, [d]) for d in known]
+      return kept + [load_sparse_scores([os.path.join(d, cl)], real, subset) for d in missing]
+
+    self.tensors[subset] = LicitScoreTensor.from_sparse(list(imap_clients(read_client, clients, self.workers)), known + missing, clients, real)
+    return self.tensors[subset]
+
+  def licit(self, dirs, subset, clients):
+    """Returns the pairs of the client id and the valid scores of the real accesses for the model of the client in the LICIT protocol dirs, in the order of the clients. The scores are sliced from the LicitScoreTensor of the subset (see licit_tensor())"""
+
+    tensor = self.licit_tensor(subset, dirs)
+    real, _ = self.files(subset)
+    return [(cl, tensor.sparse(cl, real, dirs)) for cl in clients]
+
+  def _protocol_dirs(self, fv_dirs, as_dirs, client_specific):
+    """Returns the lists of the LICIT and the SPOOF protocol dirs and the list of the directories shared by both protocols"""
+
+    if client_specific: # the anti-spoofing scores are organized as the face verification ones
+      all_dirs = list(fv_dirs) + list(as_dirs or [])
+      return [os.path.join(sd, 'licit') for sd in all_dirs], [os.path.join(sd, 'spoof') for sd in all_dirs], []
+    return [os.path.join(sd, 'licit') for sd in fv_dirs], [os.path.join(sd, 'spoof') for sd in fv_dirs], list(as_dirs or [])
+
+  def _normalize(self, subset, all_scores, normalize, score_norm):
+    """Normalizes the scores with score_norm if normalize is True. The training data are normalized by themselves if no normalization parameters are given"""
+
+    if normalize == True:
+      if score_norm == None:
+        if subset == 'train':
+          from antispoofing.utils.ml import ScoreNormalization # loaded only when the normalization parameters are computed here
+          score_norm = ScoreNormalization(all_scores) # training data are normalized by themselves
+        else:
+          sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')
+          sys.exit(1)
+      all_scores = score_norm.calculateZNorm(all_scores)
+    return all_scores, score_norm
+
+  def _blocks(self, subset, fv_dirs, as_dirs, binary_labels, fv_protocol, client_specific, verbose=True):
+    """Returns the blocks of rows gathered by fvas(), in their order, as tuples of the label of each file, the valid scores of the files (SparseScores), the files and the client id of the model (None for the SPOOF protocol)"""
+
+    real, attack = self.files(subset)
+    clients = self.clients(subset)
+    licit_dirs, spoof_dirs, shared_dirs = self._protocol_dirs(fv_dirs, as_dirs, client_specific)
+
+    def with_shared(scores, kind): # joining the scores of the protocol with the (non client-specific) anti-spoofing scores
+      return scores.join(self.scores(shared_dirs, subset, kind)) if shared_dirs else scores
+
+    blocks = []
+    if fv_protocol == 'licit' or fv_protocol == 'both':
+      if verbose: sys.stdout.write('Processing face verif scores: LICIT protocol\n')
+      for cl, scores in self.licit(licit_dirs, subset, clients):
+        if verbose: sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
+        # the samples in the 'licit' protocol are real accesses => their label depends only on the identities
+        blocks.append((file_labels(real, 'licit', cl, binary_labels), with_shared(scores, 'real'), real, cl))
+
+    if fv_protocol == 'spoof' or fv_protocol == 'both':
+      if verbose: sys.stdout.write('Processing face verif scores: SPOOF protocol\n')
+      # the labels depend not on the identity, but on whether it is a real access or spoofing attack. For the client-specific anti-spoofing, the real accesses of the 'both' protocol have already been added above
+      if fv_protocol == 'spoof' or not client_specific:
+        blocks.append((file_labels(real, 'spoof', binary_labels=binary_labels), with_shared(self.scores(spoof_dirs, subset, 'real'), 'real'), real, None))
+      blocks.append((file_labels(attack, 'spoof', binary_labels=binary_labels), with_shared(self.scores(spoof_dirs, subset, 'attack'), 'attack'), attack, None))
+    return blocks
+
+  def identities(self, subset, fv_dirs, as_dirs=None, fv_protocol='both', client_specific=False):
+    """Returns the claimed identity, the real identity and the test label ("frame_index/file_stem") of each row of the scores gathered by fvas() or broadcast() with the same arguments, as numpy.arrays of strings. The claimed identity is the model of the LICIT protocol, or the client of the file in the SPOOF protocol. The real identity is the client of the file, or 'attack' for the spoofing attacks. Together, they can be used to save the rows in 4-column format (see save_fused_scores())"""
+
+    claimed = []; real = []; tests = []
+    for _, scores, files, cl in self._blocks(subset, fv_dirs, as_dirs, True, fv_protocol, client_specific, verbose=False):
+      videos = scores.video_indices()
+      client_ids = numpy.array(["client%03d" % f.get_client_id() for f in files] or [''])
+      real_ids = numpy.where(numpy.array([f.is_real() for f in files] or [True]), client_ids, 'attack')
+      stems = numpy.array([str(f.make_path()) for f in files] or [''])
+      claimed.append(client_ids[videos] if cl is None else numpy.repeat(numpy.array([cl]), len(videos)))
+      real.append(real_ids[videos])
+      tests.append(numpy.char.add(numpy.char.add(scores.frames.astype('U'), '/'), stems[videos]))
+
+    if not claimed:
+      return numpy.array([], 'U1'), numpy.array([], 'U1'), numpy.array([], 'U1')
+    return numpy.concatenate(claimed), numpy.concatenate(real), numpy.concatenate(tests)
+
+  def fvas(self, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, pol_augment=False, client_specific=False):
+    """Returns a numpy.ndarray with the scores of face verification and anti-spoofing algorithm(s), a numpy.array with their corresponding labels and the normalization parameters. Each column of the arrays correspond to a face verification / anti-spoofing algorithm (with face verification algorithms coming first). See gather_fvas_scores() and gather_fvas_clsp_scores()
+
+    @param subset 'devel', 'test' or 'train'
+    @param fv_dirs List of directories of the scores of face verification algorithms
+    @param as_dirs List of directories of the scores of anti-spoofing algorithms
+    @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
+    @param fv_protocol Specifies the face verification protocol for the returned scores. Can be 'licit', 'spoof' or 'both'
+    @param normalize If True, the returned data will be normalized with regards to the training set
+    @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data. If None, the training set is normalized by itself
+    @param pol_augment If True, the data will be polinomially augmented (columns with quadratic values will be added to the data. It can also be a PolinomialAugmentation object, to use its feature map
+    @param client_specific If True, the anti-spoofing algorithms are client-specific and their scores have the same organization as the face verification scores
+    """
+
+    sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
+    blocks = self._blocks(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, client_specific)
+
+    num_cols = len(fv_dirs) + len(as_dirs or [])
+    augmentation = None
+    if isinstance(pol_augment, PolinomialAugmentation):
+      augmentation = pol_augment
+    elif pol_augment == True:
+      augmentation = PolinomialAugmentation(num_cols)
+
+    # all the rows of the blocks are valid, so the score matrix is allocated with its exact size (and with the columns of the polinomial augmentation)
+    builder = ScoreMatrixBuilder(sum(len(scores) for _, scores, _, _ in blocks), augmentation.num_features() if augmentation != None else num_cols)
+    for labels, scores, _, _ in blocks:
+      builder.add_sparse(labels, scores)
+    all_scores, all_labels = builder.result()
+
+    # do polinomial augmentation, in place after the scores
+    if augmentation != None:
+      augmentation(all_scores[:,:num_cols], out=all_scores)
 
-  if(onlyValidScores):
-    allLabels = allLabels[(numpy.where(numpy.isnan(allScores)==False))[0]]
+    # standard normalization of the data if it is required
+    all_scores, score_norm = self._normalize(subset, all_scores, normalize, score_norm)
+
+    sys.stdout.write('---------------------------------------------------------\n')
+    return all_scores, all_labels, score_norm
+
+  def broadcast(self, subset, fv_dirs, as_dirs, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None):
+    """Returns the same scores as fvas() for non client-specific anti-spoofing algorithms, as a BroadcastScores object. See gather_fvas_scores_broadcast()"""
+
+    if not as_dirs:
+      raise ValueError("The anti-spoofing scores are needed to gather the scores in broadcast form")
+
+    real, attack = self.files(subset)
+    clients = self.clients(subset)
+    licit_dirs, spoof_dirs, shared_dirs = self._protocol_dirs(fv_dirs, as_dirs, False)
+
+    sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
 
-  return allLabels
+    result = BroadcastScores()
 
-def gather_train_fvas_scores(database, fv_dirs, as_dirs, binary_labels=True, fv_protocol='both', normalize=True, pol_augment=False):
+    # the samples of each group of rows are the valid anti-spoofing scores
+    real_as = self.scores(shared_dirs, subset, 'real')
+    attack_as = self.scores(shared_dirs, subset, 'attack')
+
+    # the face verification scores are aligned to the samples of the anti-spoofing scores (nan for the samples without a valid face verification score)
+    if fv_protocol == 'licit' or fv_protocol == 'both':
+      sys.stdout.write('Processing face verif scores: LICIT protocol\n')
+      real_fv = numpy.ndarray((len(clients), len(real_as), len(fv_dirs)), 'float64')
+      labels = numpy.ndarray((len(clients), len(real_as)), 'int8')
+      for i, (cl, scores) in enumerate(self.licit(licit_dirs, subset, clients)):
+        sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
+        real_fv[i] = real_as.align(scores)
+        labels[i] = numpy.repeat(file_labels(real, 'licit', cl, binary_labels), real_as.lengths())
+      result.add_group(real_fv, real_as.scores, labels)
+
+    if fv_protocol == 'spoof' or fv_protocol == 'both':
+      sys.stdout.write('Processing face verif scores: SPOOF protocol\n')
+      for kind, files, files_as in (('real', real, real_as), ('attack', attack, attack_as)):
+        aligned = files_as.align(self.scores(spoof_dirs, subset, kind))
+        labels = numpy.repeat(file_labels(files, 'spoof', binary_labels=binary_labels), files_as.lengths())
+        result.add_group(aligned.reshape((1,) + aligned.shape), files_as.scores, labels.reshape(1, len(labels)))
+
+    # standard normalization of the data if it is required
+    if normalize == True:
+      if score_norm == None:
+        sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')
+        sys.exit(1)
+      result.normalize(score_norm)
+
+    sys.stdout.write('---------------------------------------------------------\n')
+    return result
+
+  def streams(self, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, client_specific=False):
+    """Returns the scores of the valid frames of the videos of the rows gathered by fvas() (for each model, in the LICIT protocol), as a SparseScores object with one video after the other and one column per algorithm, and a numpy.array with the labels of the videos. See gather_fvas_frame_streams()"""
+
+    if normalize == True and score_norm == None:
+      sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')
+      sys.exit(1)
+
+    all_offsets = [numpy.array([0], 'int64')]; all_frames = []; all_scores = []; all_labels = []
+    num_rows = 0
+    for labels, scores, _, _ in self._blocks(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, client_specific):
+      all_offsets.append(scores.offsets[1:] + num_rows)
+      all_frames.append(scores.frames)
+      all_scores.append(score_norm.calculateZNorm(scores.scores) if normalize == True else scores.scores)
+      all_labels.append(numpy.asarray(labels))
+      num_rows += len(scores)
+
+    num_cols = len(fv_dirs) + len(as_dirs or [])
+    if not all_labels:
+      return SparseScores(all_offsets[0], numpy.ndarray((0,), 'int32'), numpy.ndarray((0, num_cols), 'float64')), numpy.ndarray((0,), 'int')
+    return SparseScores(numpy.concatenate(all_offsets), numpy.concatenate(all_frames), numpy.vstack(all_scores)), numpy.concatenate(all_labels)
+
+  def videos(self, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, reduction='mean', trim=0.1, thresholds=None, client_specific=False):
+    """Returns the video-level scores of the rows gathered by fvas(): the scores of the valid frames of each video (for each model, in the LICIT protocol) are reduced into one score per algorithm with segment_reduce(). Returns a numpy.ndarray with one row per video and one column per algorithm, and a numpy.array with the labels of the videos. The videos without any valid frame are left out. See gather_fvas_video_scores()"""
+
+    sys.stdout.write('Organizing faceverif and antispoofing scores per video: %s set\n' % (subset))
+    # the frames are normalized before the reduction, so that the thresholds of the votes apply to them
+    scores, labels = self.streams(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, score_norm, client_specific)
+    valid = scores.lengths() > 0
+    sys.stdout.write('---------------------------------------------------------\n')
+    return segment_reduce(scores.scores, scores.offsets, reduction, trim, thresholds)[valid], labels[valid]
+
+  def perclient(self, subset, fv_dirs, as_dirs=None, binary_labels=True, normalize=True, score_norm=None, clients=None, client_specific=False):
+    """Returns a dictionary with the scores of the real accesses of each client for the model of the client, and the normalization parameters. See gather_fvas_scores_perclient() and gather_fvas_clsp_scores_perclient()"""
+
+    real, _ = self.files(subset)
+    if clients == None:
+      clients = self.clients(subset)
+    licit_dirs, _, shared_dirs = self._protocol_dirs(fv_dirs, as_dirs, client_specific)
+
+    sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
+    sys.stdout.write('Processing face verif scores: LICIT protocol\n')
+
+    tensor = self.licit_tensor(subset, licit_dirs)
+    videos = tensor.videos(real)
+    client_scores_dict = {}
+    for cl in clients:
+      sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
+      # take just the real scores of the client for the model of the client. Only these videos are sliced from the tensor and joined with the anti-spoofing scores, instead of all of them
+      genuine = numpy.flatnonzero(tensor.genuine_mask()[tensor.model(cl), videos])
+      scores = tensor.sparse(cl, [real[i] for i in genuine], licit_dirs)
+      if shared_dirs:
+        scores = scores.join(self.scores(shared_dirs, subset, 'real').select(genuine))
+      real_scores = scores.scores
+
+      # standard normalization of the data if it is required
+      if normalize == True:
+        if score_norm == None:
+          sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')
+          sys.exit(1)
+        real_scores = score_norm.calculateZNorm(real_scores)
+
+      client_scores_dict[cl] = real_scores
+    sys.stdout.write('---------------------------------------------------------\n')
+    return client_scores_dict, score_norm
+
+  def llr_training(self, fv_dirs, as_dirs, normalize=True, pol_augment=False, client_specific=False):
+    """Returns the positive and the negative training scores (binary labels, 'both' protocol) for training a fusion machine, and the normalization parameters computed on the training set"""
+
+    all_scores, all_labels, score_norm = self.fvas('train', fv_dirs, as_dirs, binary_labels=True, normalize=normalize, pol_augment=pol_augment, client_specific=client_specific)
+    return all_scores[all_labels == 1,:], all_scores[all_labels == 0,:], score_norm
+
+
+def _query(database, subset, workers, tensor):
+  """Returns a ScoreQuery for a single call of the gather_* functions"""
+
+  return ScoreQuery(database, workers, {subset: tensor} if tensor is not None else None)
+
+
+def gather_train_fvas_scores(database, fv_dirs, as_dirs, binary_labels=True, fv_protocol='both', normalize=True, pol_augment=False, workers=1, tensor=None):
   """Populates a numpy.ndarray with the nor normalized training scores of face verification and anti-spoofing algorithm(s) and a numpy.array with their corresponding labels. Each column of the arrays correspond to a face verification / anti-spoofing algorithm (with face verification algorithms coming first). The returning result canbe used for normalization purposes
-  
+
   @param database The database (replay)
   @param fv_dirs List of directories of the scores of face verification algorithms
   @param as_dirs List of directories of the scores of anti-spoofing algorithms
@@ -163,80 +651,17 @@ def gather_train_fvas_scores(database, fv_dirs, as_dirs, binary_labels=True, fv_
   @param fv_protocol Specifies the face verification protocol for the returned scores. Can be 'licit', 'spoof' or 'both'
   @param normalize if True, the returned data will be normalized with regards to the training set
   @param pol_augment If True, the data will be polinomially augmented (columns with quadratic values will be added to the data
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
   """
 
-  real, attack = database.get_train_data()
-
-  clients = list(set(["client%03d" % x.get_client_id() for x in real]))
-  
-  sys.stdout.write('Organizing faceverif and antispoofing scores\n')
-  
-  all_scores = numpy.ndarray((0, len(fv_dirs) + len(as_dirs)), 'float');
-  all_labels = numpy.array([], 'int');
-  
-  # reading the anti-spoofing data
-  real_scorereader_as = ScoreFusionReader(real, as_dirs)
-  attack_scorereader_as = ScoreFusionReader(attack, as_dirs)
-
-  real_as = real_scorereader_as.getConcatenetedScores(onlyValidScores=False)
-  attack_as = attack_scorereader_as.getConcatenetedScores(onlyValidScores=False)
-
-  # reading the face verification data
-  if fv_protocol == 'licit' or fv_protocol == 'both':
-    sys.stdout.write('Processing face verif scores: LICIT protocol\n')
-    #dir_precise = os.path.join('10_licit', 'nonorm')
-    dir_precise = os.path.join('licit')
-    for cl in clients:
-      sys.stdout.write("Processing [%s/%d] in training set\n" % (cl, len(clients)))
-      # creating the scores readers from different face verification algorithms
-      # joining the scores for face verfication with the anti-spoofing scores. The face verifications scores dirs need to have the client labels
-      real_scorereader_fv = ScoreFusionReader(real, [os.path.join(sd, dir_precise, cl) for sd in fv_dirs])
-      real_fv = real_scorereader_fv.getConcatenetedScores(onlyValidScores=False) # raw scores as numpy.array (the scores should be already normalized in the input files)
-      labels = get_labels(os.path.join(fv_dirs[0], dir_precise), real, protocol='licit', client_id=cl, onlyValidScores=False, binary_labels=binary_labels) # labels for the face verification queries. The samples in the 'licit' protocol are real accesses => their label depends only on the identities
-      scores = numpy.append(real_fv, real_as, axis=1)
-      all_labels = numpy.append(all_labels, labels)
-      all_scores = numpy.append(all_scores, scores, axis=0)
-  
-  if fv_protocol == 'spoof' or fv_protocol == 'both':
-    sys.stdout.write('Processing face verif scores: SPOOF protocol\n')
-    #dir_precise = os.path.join('10_spoof', 'nonorm')
-    dir_precise = os.path.join('spoof')
-    real_scorereader_fv = ScoreFusionReader(real, [os.path.join(sd, dir_precise) for sd in fv_dirs])
-    attack_scorereader_fv = ScoreFusionReader(attack, [os.path.join(sd, dir_precise) for sd in fv_dirs])  
-
-    # get raw scores as numpy.array (the scores should be already normalized in the input files)
-    real_fv = real_scorereader_fv.getConcatenetedScores(onlyValidScores=False)
-    attack_fv = attack_scorereader_fv.getConcatenetedScores(onlyValidScores=False) 
-    #labels for the queries. Depends not on the identity, but on whether it is a real access or spoofing attack
-    real_labels = get_labels(os.path.join(fv_dirs[0], dir_precise), real, protocol='spoof', onlyValidScores=False, binary_labels=binary_labels)
-    attack_labels = get_labels(os.path.join(fv_dirs[0], dir_precise), attack, protocol='spoof', onlyValidScores=False, binary_labels=binary_labels)
-    real_scores = numpy.append(real_fv, real_as, axis=1)
-    all_labels = numpy.append(all_labels, real_labels)
-    all_scores = numpy.append(all_scores, real_scores, axis=0)
-    attack_scores = numpy.append(attack_fv, attack_as, axis=1)
-    all_labels = numpy.append(all_labels, attack_labels)
-    all_scores = numpy.append(all_scores, attack_scores, axis=0)
-  
-  # remove rows with scores with nan values
-  all_labels = all_labels[~numpy.isnan(all_scores).any(axis=1)]
-  all_scores = all_scores[~numpy.isnan(all_scores).any(axis=1)]
-
-  # do polinomial augmentation
-  if pol_augment == True:
-    all_scores = polinomial_augmentation(all_scores)
-
-  # standard normalization of the data if it is required
-  if normalize == True:
-    score_norm = ScoreNormalization(all_scores) # training data are normalized by themselves
-    all_scores = score_norm.calculateZNorm(all_scores)
-
-  sys.stdout.write('---------------------------------------------------------\n')
+  all_scores, all_labels, _ = _query(database, 'train', workers, tensor).fvas('train', fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, None, pol_augment)
   return all_scores, all_labels
 
 
-def gather_fvas_scores(database, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, pol_augment=False):
+def gather_fvas_scores(database, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, pol_augment=False, workers=1, tensor=None):
   """Populates a numpy.ndarray with the scores of face verification and anti-spoofing algorithm(s) and a numpy.array with their corresponding labels. Each column of the arrays correspond to a face verification / anti-spoofing algorithm (with face verification algorithms coming first).
-  
+
   @param database The database (replay)
   @param subset 'devel', 'test' or 'train'
   @param fv_dirs List of directories of the scores of face verification algorithms
@@ -246,105 +671,68 @@ def gather_fvas_scores(database, subset, fv_dirs, as_dirs=None, binary_labels=Tr
   @param normalize If True, the returned data will be normalized with regards to the training set
   @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
   @param pol_augment If True, the data will be polinomially augmented (columns with quadratic values will be added to the data
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
 """
 
-  if subset == 'devel':
-    real, attack = database.get_devel_data()
-  elif subset == 'test':
-    real, attack   = database.get_test_data()
-  else:
-    real, attack   = database.get_train_data()
-
-  clients = list(set(["client%03d" % x.get_client_id() for x in real]))
-  
-  sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
-  
-  if as_dirs == None:
-    all_scores = numpy.ndarray((0, len(fv_dirs)), 'float');
-  else:
-    all_scores = numpy.ndarray((0, len(fv_dirs) + len(as_dirs)), 'float');  
-  all_labels = numpy.array([], 'int');
-  
-  # reading the anti-spoofing data
-  if as_dirs != None:
-    real_scorereader_as = ScoreFusionReader(real, as_dirs)
-    attack_scorereader_as = ScoreFusionReader(attack, as_dirs)
-    real_as = real_scorereader_as.getConcatenetedScores(onlyValidScores=False)
-    attack_as = attack_scorereader_as.getConcatenetedScores(onlyValidScores=False)
-
-  # reading the face verification data
-  if fv_protocol == 'licit' or fv_protocol == 'both':
-    sys.stdout.write('Processing face verif scores: LICIT protocol\n')
-    #dir_precise = os.path.join('10_licit', 'nonorm')
-    dir_precise = os.path.join('licit')
-    for cl in clients:
-      sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
-      # creating the scores readers from different face verification algorithms
-      # joining the scores for face verfication with the anti-spoofing scores. The face verifications scores dirs need to have the client labels
-      real_scorereader_fv = ScoreFusionReader(real, [os.path.join(sd, dir_precise, cl) for sd in fv_dirs])
-      real_fv = real_scorereader_fv.getConcatenetedScores(onlyValidScores=False) # raw scores as numpy.array (the scores should be already normalized in the input files)
-      labels = get_labels(os.path.join(fv_dirs[0], dir_precise), real, protocol='licit', client_id=cl, onlyValidScores=False, binary_labels=binary_labels) # labels for the face verification queries. The samples in the 'licit' protocol are real accesses => their label depends only on the identities
-      if as_dirs != None:
-        scores = numpy.append(real_fv, real_as, axis=1)
-      else:
-        scores = real_fv  
-      all_labels = numpy.append(all_labels, labels)
-      all_scores = numpy.append(all_scores, scores, axis=0)
-  
-  if fv_protocol == 'spoof' or fv_protocol == 'both':
-    sys.stdout.write('Processing face verif scores: SPOOF protocol\n')
-    #dir_precise = os.path.join('10_spoof', 'nonorm')
-    dir_precise = os.path.join('spoof')
-    real_scorereader_fv = ScoreFusionReader(real, [os.path.join(sd, dir_precise) for sd in fv_dirs])
-    attack_scorereader_fv = ScoreFusionReader(attack, [os.path.join(sd, dir_precise) for sd in fv_dirs])  
-
-    # get raw scores as numpy.array (the scores should be already normalized in the input files)
-    real_fv = real_scorereader_fv.getConcatenetedScores(onlyValidScores=False)
-    attack_fv = attack_scorereader_fv.getConcatenetedScores(onlyValidScores=False) 
-    #labels for the queries. Depends not on the identity, but on whether it is a real access or spoofing attack
-    real_labels = get_labels(os.path.join(fv_dirs[0], dir_precise), real, protocol='spoof', onlyValidScores=False, binary_labels=binary_labels)
-    attack_labels = get_labels(os.path.join(fv_dirs[0], dir_precise), attack, protocol='spoof', onlyValidScores=False, binary_labels=binary_labels)
-    if as_dirs != None:
-      real_scores = numpy.append(real_fv, real_as, axis=1)
-      attack_scores = numpy.append(attack_fv, attack_as, axis=1)
-    else:
-      real_scores = real_fv
-      attack_scores = attack_fv
-      
-    all_labels = numpy.append(all_labels, real_labels)
-    all_scores = numpy.append(all_scores, real_scores, axis=0)
-    all_labels = numpy.append(all_labels, attack_labels)
-    all_scores = numpy.append(all_scores, attack_scores, axis=0)
-    
-  # remove rows with scores with nan values
-  all_labels = all_labels[~numpy.isnan(all_scores).any(axis=1)]
-  all_scores = all_scores[~numpy.isnan(all_scores).any(axis=1)]
-
-  # do polinomial augmentation
-  if pol_augment == True:
-    all_scores = polinomial_augmentation(all_scores)
-
-  # standard normalization of the data if it is required
-  if normalize == True:
-    if score_norm == None:
-      sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')    
-      sys.exit(1)
-    all_scores = score_norm.calculateZNorm(all_scores)
-    
-  sys.stdout.write('---------------------------------------------------------\n')
+  all_scores, all_labels, _ = _query(database, subset, workers, tensor).fvas(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, score_norm, pol_augment)
   return all_scores, all_labels
-  
-  
-def organize_llrtraining_scores(database, fv_dirs, as_dirs, normalize=True, pol_augment=False):
-  all_scores, all_labels = gather_train_fvas_scores(database, fv_dirs, as_dirs, binary_labels=True, normalize=normalize, pol_augment=pol_augment)
-  all_pos = all_scores[all_labels == 1,:]
-  all_neg = all_scores[all_labels == 0,:]
+
+
+def gather_fvas_scores_broadcast(database, subset, fv_dirs, as_dirs, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, workers=1, tensor=None):
+  """Gathers the same scores as gather_fvas_scores(), but returns them as a BroadcastScores object: the anti-spoofing scores of the real accesses are stored once and shared by the blocks of all the clients in the LICIT protocol, instead of being copied into the rows of each client. The fusion and the evaluation can use the scores in this form directly (see BroadcastScores.apply() and BroadcastScores.column()), and BroadcastScores.materialize() gives the result of gather_fvas_scores(). Polinomial augmentation is not supported, as it mixes the face verification and the anti-spoofing columns
+
+  @param database The database (replay)
+  @param subset 'devel', 'test' or 'train'
+  @param fv_dirs List of directories of the scores of face verification algorithms
+  @param as_dirs List of directories of the scores of anti-spoofing algorithms
+  @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
+  @param fv_protocol Specifies the face verification protocol for the returned scores. Can be 'licit', 'spoof' or 'both'
+  @param normalize If True, the returned data will be normalized with regards to the training set
+  @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
+"""
+
+  return _query(database, subset, workers, tensor).broadcast(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, score_norm)
+
+
+def gather_fvas_video_scores(database, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, reduction='mean', trim=0.1, thresholds=None, client_specific=False, workers=1, tensor=None):
+  """Gathers the scores of the same videos as gather_fvas_scores(), but with one row per video (for each model, in the LICIT protocol) instead of one row per frame: the scores of the valid frames of each video are reduced into one score per algorithm
+
+  @param database The database (replay)
+  @param subset 'devel', 'test' or 'train'
+  @param fv_dirs List of directories of the scores of face verification algorithms
+  @param as_dirs List of directories of the scores of anti-spoofing algorithms
+  @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
+  @param fv_protocol Specifies the face verification protocol for the returned scores. Can be 'licit', 'spoof' or 'both'
+  @param normalize If True, the scores of the frames will be normalized with score_norm before the reduction
+  @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
+  @param reduction The reduction of the scores of the frames of each video: 'mean', 'median', 'max', 'trimmed' (trimmed mean) or 'vote' (fraction of the frames above the threshold of the algorithm)
+  @param trim The fraction of the scores cut off at each end of each video for the trimmed mean
+  @param thresholds The threshold of each algorithm, for the vote fraction
+  @param client_specific If True, the anti-spoofing algorithms are client-specific and their scores have the same organization as the face verification scores
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
+"""
+
+  return _query(database, subset, workers, tensor).videos(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, score_norm, reduction, trim, thresholds, client_specific)
+
+
+def gather_fvas_frame_streams(database, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, client_specific=False, workers=1, tensor=None):
+  """Gathers the scores of the same videos as gather_fvas_scores(), keeping the valid frames of each video (for each model, in the LICIT protocol) together and in order, to replay the videos frame by frame. Returns a SparseScores object with one column per algorithm and a numpy.array with the labels of the videos. The arguments are as in gather_fvas_video_scores()"""
+
+  return _query(database, subset, workers, tensor).streams(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, score_norm, client_specific)
+
+
+def organize_llrtraining_scores(database, fv_dirs, as_dirs, normalize=True, pol_augment=False, workers=1):
+  all_pos, all_neg, _ = _query(database, 'train', workers, None).llr_training(fv_dirs, as_dirs, normalize, pol_augment)
   return all_pos, all_neg
 
 
-def gather_fvas_clsp_scores(database, subset, fv_dirs=[], as_dirs=[], binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, pol_augment=False):
+def gather_fvas_clsp_scores(database, subset, fv_dirs=[], as_dirs=[], binary_labels=True, fv_protocol='both', normalize=True, score_norm=None, pol_augment=False, workers=1, tensor=None):
   """Populates a numpy.ndarray with the scores of face verification and anti-spoofing algorithm(s) and a numpy.array with their corresponding labels. Each column of the arrays correspond to a face verification / anti-spoofing algorithm (with face verification algorithms coming first). CLSP stands to client-specific - the antispoofing system is client-specific and hence the input scores have the same organization as for the face verification
-  
+
   @param database The database (replay)
   @param subset 'devel', 'test' or 'train'
   @param fv_dirs List of directories of the scores of face verification algorithms
@@ -354,96 +742,20 @@ def gather_fvas_clsp_scores(database, subset, fv_dirs=[], as_dirs=[], binary_lab
   @param normalize If True, the returned data will be normalized with regards to the training set
   @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
   @param pol_augment If True, the data will be polinomially augmented (columns with quadratic values will be added to the data
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
 """
 
-  if subset == 'devel':
-    real, attack = database.get_devel_data()
-  elif subset == 'test':
-    real, attack   = database.get_test_data()
-  else:
-    real, attack   = database.get_train_data()
-
-  clients = list(set(["client%03d" % x.get_client_id() for x in real])) # if None, then work with all clients  
-  
-  sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
-  
-  all_dirs = list(fv_dirs) + list(as_dirs)
-  all_scores = numpy.ndarray((0, len(all_dirs)), 'float');    
-
-  all_labels = numpy.array([], 'int');
-  
-  # reading the face verification and anti-spoofing data
-  if fv_protocol == 'licit' or fv_protocol == 'both':
-    sys.stdout.write('Processing face verif scores: LICIT protocol\n')
-    #dir_precise = os.path.join('10_licit', 'nonorm')
-    dir_precise = os.path.join('licit')
-    for cl in clients:
-      sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
-      # creating the scores readers from different face verification algorithms
-      # joining the scores for face verfication with the anti-spoofing scores. The face verifications scores dirs need to have the client labels
-      real_scorereader_dirs = ScoreFusionReader(real, [os.path.join(sd, dir_precise, cl) for sd in all_dirs])
-      real_scores = real_scorereader_dirs.getConcatenetedScores(onlyValidScores=False) # raw scores as numpy.array (the scores should be already normalized in the input files)
-      labels = get_labels(os.path.join(all_dirs[0], dir_precise), real, protocol='licit', client_id=cl, onlyValidScores=False, binary_labels=binary_labels) # labels for the face verification queries. The samples in the 'licit' protocol are real accesses => their label depends only on the identities
-      
-      scores = real_scores
-      
-      all_labels = numpy.append(all_labels, labels)
-      all_scores = numpy.append(all_scores, scores, axis=0)
-  
-  if fv_protocol == 'spoof' or fv_protocol == 'both':
-    sys.stdout.write('Processing face verif scores: SPOOF protocol\n')
-    #dir_precise = os.path.join('10_spoof', 'nonorm')
-    dir_precise = os.path.join('spoof')
-    real_scorereader_dirs = ScoreFusionReader(real, [os.path.join(sd, dir_precise) for sd in all_dirs])
-    attack_scorereader_dirs = ScoreFusionReader(attack, [os.path.join(sd, dir_precise) for sd in all_dirs])  
-    # get raw scores as numpy.array (the scores should be already normalized in the input files)
-    real_scores = real_scorereader_dirs.getConcatenetedScores(onlyValidScores=False)
-    attack_scores = attack_scorereader_dirs.getConcatenetedScores(onlyValidScores=False) 
-    #labels for the queries. Depends not on the identity, but on whether it is a real access or spoofing attack
-    real_labels = get_labels(os.path.join(all_dirs[0], dir_precise), real, protocol='spoof', onlyValidScores=False, binary_labels=binary_labels)
-    attack_labels = get_labels(os.path.join(all_dirs[0], dir_precise), attack, protocol='spoof', onlyValidScores=False, binary_labels=binary_labels)
-      
-    if fv_protocol == 'spoof': # if protocol is spoof, add the real access scores as well. If protocol is both, they have been already added above, so no need to add them again
-      all_labels = numpy.append(all_labels, real_labels)
-      all_scores = numpy.append(all_scores, real_scores, axis=0)
-    all_labels = numpy.append(all_labels, attack_labels)
-    all_scores = numpy.append(all_scores, attack_scores, axis=0)
-    
-  # remove rows with scores with nan values
-  all_labels = all_labels[~numpy.isnan(all_scores).any(axis=1)]
-  all_scores = all_scores[~numpy.isnan(all_scores).any(axis=1)]
-
-  # do polinomial augmentation
-  if pol_augment == True:
-    all_scores = polinomial_augmentation(all_scores)
-
-  # standard normalization of the data if it is required
-
-  if normalize == True:
-    if score_norm == None:
-      if subset == 'train':
-        score_norm = ScoreNormalization(all_scores) # training data are normalized by themselves
-        all_scores = score_norm.calculateZNorm(all_scores)
-      else:
-        sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')    
-        sys.exit(1)
-    else:    
-      all_scores = score_norm.calculateZNorm(all_scores)
-    
-  sys.stdout.write('---------------------------------------------------------\n')
-  return all_scores, all_labels, score_norm  
+  return _query(database, subset, workers, tensor).fvas(subset, fv_dirs, as_dirs, binary_labels, fv_protocol, normalize, score_norm, pol_augment, client_specific=True)
 
 
-def organize_llrtraining_clsp_scores(database, fv_dirs, as_dirs, normalize=True, pol_augment=False):
-  all_scores, all_labels, score_norm = gather_fvas_clsp_scores(database, 'train', fv_dirs, as_dirs, binary_labels=True, normalize=normalize, pol_augment=pol_augment)
-  all_pos = all_scores[all_labels == 1,:]
-  all_neg = all_scores[all_labels == 0,:]
-  return all_pos, all_neg, score_norm
+def organize_llrtraining_clsp_scores(database, fv_dirs, as_dirs, normalize=True, pol_augment=False, workers=1):
+  return _query(database, 'train', workers, None).llr_training(fv_dirs, as_dirs, normalize, pol_augment, client_specific=True)
 
 
-def gather_fvas_clsp_scores_perclient(database, subset, fv_dirs, as_dirs, binary_labels=True, normalize=True, score_norm=None, clients=None):
+def gather_fvas_clsp_scores_perclient(database, subset, fv_dirs, as_dirs, binary_labels=True, normalize=True, score_norm=None, clients=None, workers=1, tensor=None):
   """Populates a numpy.ndarray with the scores of face verification and anti-spoofing algorithm(s) and a numpy.array with their corresponding labels. Each column of the arrays correspond to a face verification / anti-spoofing algorithm (with face verification algorithms coming first). CLSP stands to client-specific - the antispoofing system is client-specific and hence the input scores have the same organization as for the face verification. This function gives the scores for a list of predefined clients, and only the real accesses
-  
+
   @param database The database (replay)
   @param subset 'devel', 'test' or 'train'
   @param fv_dirs List of directories of the scores of face verification algorithms
@@ -452,59 +764,18 @@ def gather_fvas_clsp_scores_perclient(database, subset, fv_dirs, as_dirs, binary
   @param normalize If True, the returned data will be normalized with regards to the training set
   @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
   @param pol_augment If True, the data will be polinomially augmented (columns with quadratic values will be added to the data
-  @param the ids of the clients whose scores need to be retrieved  
+  @param the ids of the clients whose scores need to be retrieved
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
 """
 
-  if subset == 'devel':
-    real, attack = database.get_devel_data()
-  elif subset == 'test':
-    real, attack   = database.get_test_data()
-  else:
-    real, attack   = database.get_train_data()
-
-  if clients == None:  
-    clients = list(set(["client%03d" % x.get_client_id() for x in real])) # if None, then work with all clients  
-  
-  sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
-  
-  client_scores_dict = {}
-  
-  # reading the face verification and anti-spoofing data
-  sys.stdout.write('Processing face verif scores: LICIT protocol\n')
-  #dir_precise = os.path.join('10_licit', 'nonorm')
-  dir_precise = os.path.join('licit')
-  for cl in clients:
-
-    sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
-    # creating the scores readers from different face verification algorithms
-    # joining the scores for face verfication with the anti-spoofing scores. The face verifications scores dirs need to have the client labels
-    real_scorereader_fv = ScoreFusionReader(real, [os.path.join(sd, dir_precise, cl) for sd in fv_dirs])
-    real_scorereader_as = ScoreFusionReader(real, [os.path.join(sd, dir_precise, cl) for sd in as_dirs])
-    real_fv = real_scorereader_fv.getConcatenetedScores(onlyValidScores=False) # raw scores as numpy.array (the scores should be already normalized in the input files)
-    real_as = real_scorereader_as.getConcatenetedScores(onlyValidScores=False) # raw scores as numpy.array (the scores should be already normalized in the input files)
-    labels = get_labels(os.path.join(fv_dirs[0], dir_precise), real, protocol='licit', client_id=cl, onlyValidScores=False, binary_labels=binary_labels) # labels for the face verification queries. The samples in the 'licit' protocol are real accesses => their label depends only on the identities
-    scores = numpy.append(real_fv, real_as, axis=1)
-
-    real_scores = scores[labels == 1,:] # take just the real scores
-    real_scores = real_scores[~numpy.isnan(real_scores).any(axis=1)] # remove rows with scores with nan values
-
-    # standard normalization of the data if it is required
-    if normalize == True:
-      if score_norm == None:
-          sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')    
-          sys.exit(1)
-      else:    
-        real_scores = score_norm.calculateZNorm(real_scores)
-    
-    client_scores_dict[cl] = real_scores  
-  sys.stdout.write('---------------------------------------------------------\n')
-  return client_scores_dict, score_norm  
+  return _query(database, subset, workers, tensor).perclient(subset, fv_dirs, as_dirs, binary_labels, normalize, score_norm, clients, client_specific=True)
 
 
 
-def gather_fvas_scores_perclient(database, subset, fv_dirs, as_dirs=None, binary_labels=True, normalize=True, score_norm=None, clients=None):
+def gather_fvas_scores_perclient(database, subset, fv_dirs, as_dirs=None, binary_labels=True, normalize=True, score_norm=None, clients=None, workers=1, tensor=None):
   """Populates a numpy.ndarray with the scores of face verification and anti-spoofing algorithm(s) and a numpy.array with their corresponding labels. Each column of the arrays correspond to a face verification / anti-spoofing algorithm (with face verification algorithms coming first).  This function gives the scores for a list of predefined clients, and only the real accesses
-  
+
   @param database The database (replay)
   @param subset 'devel', 'test' or 'train'
   @param fv_dirs List of directories of the scores of face verification algorithms
@@ -512,53 +783,9 @@ def gather_fvas_scores_perclient(database, subset, fv_dirs, as_dirs=None, binary
   @param binary_labels If True, binary labels will be returned: both impostors and spoofing attacks will be labeled with 0, while real accesses with 1. If False, ternary labels will be returned: impostors: 0, real accesses: 1, spoofing attacks: -1
   @param normalize If True, the returned data will be normalized with regards to the training set
   @param score_norm Instance of the antispoofing.utils.ml.ScoreNormalization class, containing the normalization parameters computed over some training data
+  @param clients The ids of the clients whose scores need to be retrieved
+  @param workers The number of threads reading the scores of different clients concurrently
+  @param tensor If given, the LicitScoreTensor from which the scores of the LICIT protocol are sliced, instead of reading them from the score files
 """
 
-  if subset == 'devel':
-    real, attack = database.get_devel_data()
-  elif subset == 'test':
-    real, attack   = database.get_test_data()
-  else:
-    real, attack   = database.get_train_data()
-
-  if clients == None:  
-    clients = list(set(["client%03d" % x.get_client_id() for x in real]))
-  
-  sys.stdout.write('Organizing faceverif and antispoofing scores: %s set\n' % (subset))
-  
-  client_scores_dict = {}
-  
-  # reading the anti-spoofing data
-  if as_dirs != None:
-    real_scorereader_as = ScoreFusionReader(real, as_dirs)
-    attack_scorereader_as = ScoreFusionReader(attack, as_dirs)
-    real_as = real_scorereader_as.getConcatenetedScores(onlyValidScores=False)
-    attack_as = attack_scorereader_as.getConcatenetedScores(onlyValidScores=False)
-
-  # reading the face verification data
-  sys.stdout.write('Processing face verif scores: LICIT protocol\n')
-  #dir_precise = os.path.join('10_licit', 'nonorm')
-  dir_precise = os.path.join('licit')
-  for cl in clients:
-    sys.stdout.write("Processing [%s/%d] in  %s set\n" % (cl, len(clients), subset))
-    # creating the scores readers from different face verification algorithms
-    # joining the scores for face verfication with the anti-spoofing scores. The face verifications scores dirs need to have the client labels
-    real_scorereader_fv = ScoreFusionReader(real, [os.path.join(sd, dir_precise, cl) for sd in fv_dirs])
-    real_fv = real_scorereader_fv.getConcatenetedScores(onlyValidScores=False) # raw scores as numpy.array (the scores should be already normalized in the input files)
-    labels = get_labels(os.path.join(fv_dirs[0], dir_precise), real, protocol='licit', client_id=cl, onlyValidScores=False, binary_labels=binary_labels) # labels for the face verification queries. The samples in the 'licit' protocol are real accesses => their label depends only on the identities
-    scores = numpy.append(real_fv, real_as, axis=1)
-
-    real_scores = scores[labels == 1,:] # take just the real scores
-    real_scores = real_scores[~numpy.isnan(real_scores).any(axis=1)] # remove rows with scores with nan values
-  
-    # standard normalization of the data if it is required
-    if normalize == True:
-      if score_norm == None:
-          sys.stderr.write('Error: Normalization can not be done: no normalization parameters specified!\n')    
-          sys.exit(1)
-      else:    
-        real_scores = score_norm.calculateZNorm(real_scores)
-    
-    client_scores_dict[cl] = real_scores  
-  sys.stdout.write('---------------------------------------------------------\n')
-  return client_scores_dict, score_norm  
\ No newline at end of file
+  return _query(database, subset, workers, tensor).perclient(subset, fv_dirs, as_dirs, binary_labels, normalize, score_norm, clients)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+'''The scores of the LICIT protocol as a [model, (video, frame), system] tensor, built once for all the models and sliced by the gather functions'''
+
+import os
+import numpy
+
+from .sparse_scores import SparseScores
+
+
+class LicitScoreTensor:
+  """The scores of the LICIT protocol of one or more systems, for all the models and all the real access videos of a subset. The (video, frame) pairs which have a score for any model and any system are stored once, one video after the other as in SparseScores: offsets[i]:offsets[i+1] is the range of the pairs of the i-th video and frames are their frame indices. The scores are a numpy.ndarray of shape (num_models, num_pairs, num_systems), nan where a model or a system has no score for a pair. All the models score the same frames of the same videos, so the tensor keeps only the valid frames, as SparseScores, instead of padding all the frames of all the videos. The models are indexed by their client ids (in the format 'clientXXX') and the videos by their path (File.make_path()), so that the scores of any client and any list of videos can be sliced from the tensor without reading the score files again.
+
+  The LICIT protocol dirs of the systems (eg. <scoresdir>/licit) index the last dimension, so that the same tensor can be used for different combinations of systems.
+  """
+
+  def __init__(self, scores, offsets, frames, dirs, models, paths, client_ids):
+    """
+    @param scores numpy.ndarray of shape (num_models, num_pairs, num_systems)
+    @param offsets numpy.array with the num_videos+1 offsets of the pairs of each video
+    @param frames numpy.array with the frame index of each pair
+    @param dirs The LICIT protocol dir of each system
+    @param models The client id of each model, in the format 'clientXXX'
+    @param paths The path of each video, as returned by File.make_path()
+    @param client_ids The integer client id of each video
+    """
+
+    self.scores = scores
+    self.offsets = numpy.asarray(offsets, 'int64')
+    self.frames = numpy.asarray(frames, 'int32')
+    self.dirs = [os.path.normpath(d) for d in dirs]
+    self.models = list(models)
+    self.paths = [str(p) for p in paths]
+    self.client_ids = numpy.asarray(client_ids, 'int64')
+    self.model_ids = numpy.array([int(m[len('client'):]) for m in self.models], 'int64')
+    self.model_index = dict((m, i) for i, m in enumerate(self.models))
+    self.video_index = dict((p, i) for i, p in enumerate(self.paths))
+    self.system_index = dict((d, i) for i, d in enumerate(self.dirs))
+
+  @classmethod
+  def from_sparse(cls, columns, dirs, models, files):
+    """Builds the tensor from the valid scores of each model and each system
+
+    @param columns List with, for each model, the list of the SparseScores objects (one column each) of the systems, for the given files
+    @param dirs The LICIT protocol dir of each system
+    @param models The client id of each model, in the format 'clientXXX'
+    @param files The bob.db.replay.File objects of the real accesses
+    """
+
+    # the pairs of all the columns, as (video, frame) keys
+    scale = numpy.int64(max([int(c.frames.max()) + 1 for model_columns in columns for c in model_columns if len(c)] or [1]))
+    keys = [[c.video_indices().astype('int64') * scale + c.frames for c in model_columns] for model_columns in columns]
+    pairs = numpy.unique(numpy.concatenate([k for model_keys in keys for k in model_keys] or [numpy.ndarray((0,), 'int64')]))
+    counts = numpy.bincount(pairs // scale, minlength=len(files)) if len(pairs) else numpy.zeros((len(files),), 'int64')
+
+    scores = numpy.ndarray((len(models), len(pairs), len(dirs)), 'float64')
+    scores[:] = numpy.nan
+    for m, model_columns in enumerate(columns):
+      for s, column in enumerate(model_columns):
+        scores[m, numpy.searchsorted(pairs, keys[m][s]), s] = column.scores[:,0]
+
+    return cls(scores, numpy.concatenate(([0], numpy.cumsum(counts))), pairs % scale, dirs, models, [f.make_path() for f in files], [f.get_client_id() for f in files])
+
+  def model(self, client):
+    """Returns the index of the model of a client, given in the format 'clientXXX'"""
+
+    try:
+      return self.model_index[client]
+    except KeyError:
+      raise KeyError("There is no model for %s in the score tensor" % client)
+
+  def videos(self, files):
+    """Returns the indices of the videos of the given files"""
+
+    try:
+      return numpy.array([self.video_index[str(f.make_path())] for f in files], 'int64')
+    except KeyError as e:
+      raise KeyError("File %s is not in the score tensor" % e.args[0])
+
+  def systems(self, dirs=None):
+    """Returns the indices of the systems with the given LICIT protocol dirs (all the systems if dirs is None)"""
+
+    if dirs is None: return numpy.arange(len(self.dirs))
+    try:
+      return numpy.array([self.system_index[os.path.normpath(d)] for d in dirs], 'int64')
+    except KeyError as e:
+      raise KeyError("The scores of %s are not in the score tensor" % e.args[0])
+
+  def has_systems(self, dirs):
+    """Returns True if the scores of all the given LICIT protocol dirs are in the tensor"""
+
+    return all(os.path.normpath(d) in self.system_index for d in dirs)
+
+  def genuine_mask(self):
+    """Returns a boolean numpy.ndarray of shape (num_models, num_videos), True where the client of the video is the client of the model"""
+
+    return self.model_ids[:,None] == self.client_ids[None,:]
+
+  def sparse(self, client, files, dirs=None):
+    """Returns the valid scores of the model of a client for the given files, as a SparseScores object with one column per system. The result is the same as reading the score files of the model with fusion_utils.load_sparse_scores()
+
+    @param client The client id of the model, in the format 'clientXXX'
+    @param files The bob.db.replay.File objects
+    @param dirs The LICIT protocol dirs of the systems, in the order of the columns (all the systems if None)
+    """
+
+    videos = self.videos(files)
+    lengths = numpy.diff(self.offsets)[videos]
+    # the pairs of the selected videos, in their order
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype('int64') if len(videos) else numpy.ndarray((0,), 'int64')
+    rows = numpy.arange(lengths.sum()) + numpy.repeat(self.offsets[videos] - starts, lengths)
+    block = self.scores[self.model(client)][rows][:,self.systems(dirs)]
+    valid = ~numpy.isnan(block).any(axis=1)
+    counts = numpy.bincount(numpy.repeat(numpy.arange(len(videos)), lengths)[valid], minlength=len(videos))
+    return SparseScores(numpy.concatenate(([0], numpy.cumsum(counts))), self.frames[rows][valid], block[valid])
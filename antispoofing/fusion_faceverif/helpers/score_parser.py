@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+'''Bulk parser for score files in 4-column or 5-column format, with a binary cache of the parsed columns'''
+
+import os
+import hashlib
+import numpy
+
+from .array_io import save_arrays, load_arrays
+
+
+class ParsedScores:
+  """The typed columns of a score file in 4-column or 5-column format. The claimed and the real identities are categorical codes indexing into the common table of identities ids, so that comparing them is comparing integers. The test label column is split into the frame index (-1 if the label has no frame prefix) and the file stem, which is also categorical.
+
+  For the 4-column format, the columns are: claimed_id real_id test_label score
+  For the 5-column format, the columns are: claimed_id model_label real_id test_label score
+  """
+
+  def __init__(self, arrays):
+    self.columns = int(arrays['columns'])
+    self.ids = arrays['ids']
+    self.claimed = arrays['claimed']
+    self.real = arrays['real']
+    self.models = arrays['models'] # table of the model labels (5-column format only)
+    self.model = arrays['model']
+    self.stems = arrays['stems']
+    self.stem = arrays['stem']
+    self.frames = arrays['frames']
+    self.scores = arrays['scores']
+
+  def __len__(self):
+    return len(self.scores)
+
+  def positives_mask(self):
+    """Returns a boolean mask of the rows where the claimed identity is the real identity"""
+
+    return self.claimed == self.real
+
+  def split(self):
+    """Returns the negative and the positive scores, as bob.measure.load.split_four_column() does"""
+
+    mask = self.positives_mask()
+    return self.scores[~mask], self.scores[mask]
+
+  def claimed_ids(self):
+    """Returns the claimed identities of all the rows as strings"""
+
+    return self.ids[self.claimed]
+
+  def real_ids(self):
+    """Returns the real identities of all the rows as strings"""
+
+    return self.ids[self.real]
+
+  def file_stems(self):
+    """Returns the file stems of all the rows as strings"""
+
+    return self.stems[self.stem]
+
+
+def _parse(data):
+  """Parses the contents of a score file into a dictionary of typed columns"""
+
+  first_line = data.split(b'\n', 1)[0].split()
+  columns = len(first_line)
+  if columns not in (4, 5):
+    raise ValueError("Score files need to be in 4-column or 5-column format, but the first line has %d columns" % columns)
+
+  tokens = numpy.array(data.split())
+  if tokens.size % columns != 0:
+    raise ValueError("The number of fields in the score file (%d) is not a multiple of the number of columns (%d)" % (tokens.size, columns))
+  table = tokens.reshape(-1, columns)
+
+  if columns == 4:
+    claimed, real, label = table[:,0], table[:,1], table[:,2]
+    models, model = numpy.array([], 'U1'), numpy.array([], 'int32')
+  else:
+    claimed, real, label = table[:,0], table[:,2], table[:,3]
+    models, model = numpy.unique(table[:,1], return_inverse=True)
+
+  arrays = score_arrays(claimed, real, label, table[:,-1].astype('float64'))
+  arrays['columns'] = numpy.array(columns)
+  arrays['models'] = models.astype('U')
+  arrays['model'] = model.astype('int32')
+  return arrays
+
+
+def score_arrays(claimed, real, label, scores):
+  """Returns the dictionary of typed columns of a score file in 4-column format (see ParsedScores), given its columns. The result can be saved with save_arrays() and loaded back with load_score_file()
+
+  @param claimed The claimed identity of each row
+  @param real The real identity of each row
+  @param label The test label of each row ("file_stem" or "frame_index/file_stem")
+  @param scores The score of each row
+  """
+
+  claimed = numpy.asarray(claimed); real = numpy.asarray(real); label = numpy.asarray(label)
+  ids, codes = numpy.unique(numpy.concatenate((claimed.astype('U'), real.astype('U'))), return_inverse=True)
+  codes = codes.astype('int32')
+
+  # the test labels of per-frame scores are "frame_index/file_stem"
+  parts = numpy.char.partition(label.astype('U'), '/')
+  has_frame = (parts[:,1] == '/') & numpy.char.isdigit(parts[:,0])
+  frames = numpy.full(len(label), -1, dtype='int32')
+  frames[has_frame] = parts[has_frame,0].astype('int32')
+  stem_column = numpy.where(has_frame, parts[:,2], label.astype('U'))
+  stems, stem = numpy.unique(stem_column, return_inverse=True)
+
+  return {
+    'columns': numpy.array(4),
+    'ids': ids.astype('U'),
+    'claimed': codes[:len(claimed)],
+    'real': codes[len(claimed):],
+    'models': numpy.array([], 'U1'),
+    'model': numpy.array([], 'int32'),
+    'stems': stems.astype('U'),
+    'stem': stem.astype('int32'),
+    'frames': frames,
+    'scores': numpy.asarray(scores, 'float64'),
+  }
+
+
+def _sidecar_prefix(filename, cache_dir=None):
+  """Returns the directory and the prefix of the names of the binary caches of the score file filename. In a shared cache_dir, the prefix also holds a hash of the absolute path of the score file, so that the files with the same name in different directories (eg. scores-dev of the LICIT and the SPOOF protocol) have different caches"""
+
+  if cache_dir is None:
+    return os.path.dirname(filename), '.%s.' % os.path.basename(filename)
+  source = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+  return cache_dir, '.%s.%s.' % (os.path.basename(filename), source)
+
+
+def sidecar_filename(filename, digest, cache_dir=None):
+  """Returns the name of the binary cache of the score file filename with the contents hash digest"""
+
+  dirname, prefix = _sidecar_prefix(filename, cache_dir)
+  return os.path.join(dirname, '%s%s.npz' % (prefix, digest[:16]))
+
+
+def _stale_sidecars(filename, sidecar, cache_dir=None):
+  """Returns the binary caches of previous versions of the score file filename, other than sidecar"""
+
+  dirname, prefix = _sidecar_prefix(filename, cache_dir)
+  if not os.path.isdir(dirname or '.'): return []
+  # the digest is the only part of the name after the prefix, so that the caches of other files are not matched
+  names = [n for n in os.listdir(dirname or '.') if n.startswith(prefix) and n.endswith('.npz') and '.' not in n[len(prefix):-len('.npz')]]
+  return [os.path.join(dirname, n) for n in names if os.path.join(dirname, n) != sidecar]
+
+
+def load_score_file(filename, cache=True, cache_dir=None, mmap=True):
+  """Parses a score file in 4-column or 5-column format into a ParsedScores object. Binary score files (.npz) written with the columns of score_arrays() are loaded directly. If cache is True, the parsed columns are saved in a binary .npz sidecar keyed by the hash of the file contents, so that the next loads of the same file just memory-map the sidecar
+
+  @param filename The score file
+  @param cache If True, the binary sidecar will be used and created if needed
+  @param cache_dir Directory of the sidecar. Defaults to the directory of the score file
+  @param mmap If True, the columns will be memory-mapped from the sidecar
+  """
+
+  if filename.endswith('.npz'): # binary score file, already parsed (see fusion_utils.save_fused_scores())
+    return ParsedScores(load_arrays(filename, mmap=mmap))
+
+  with open(filename, 'rb') as f:
+    data = f.read()
+
+  if not cache:
+    return ParsedScores(_parse(data))
+
+  digest = hashlib.sha1(data).hexdigest()
+  sidecar = sidecar_filename(filename, digest, cache_dir)
+  if os.path.exists(sidecar):
+    return ParsedScores(load_arrays(sidecar, mmap=mmap))
+
+  arrays = _parse(data)
+  # remove the sidecars of previous versions of the same file
+  for stale in _stale_sidecars(filename, sidecar, cache_dir):
+    os.remove(stale)
+  try:
+    save_arrays(sidecar, **arrays)
+  except (IOError, OSError): # read-only location: keep working without the cache
+    pass
+  return ParsedScores(arrays)
+
+
+def split_four_column(filename, **kwargs):
+  """Drop-in replacement for bob.measure.load.split_four_column() using the bulk parser and its binary cache. Returns the negative and the positive scores"""
+
+  return load_score_file(filename, **kwargs).split()
+
+
+def split_five_column(filename, **kwargs):
+  """Drop-in replacement for bob.measure.load.split_five_column() using the bulk parser and its binary cache. Returns the negative and the positive scores"""
+
+  return load_score_file(filename, **kwargs).split()
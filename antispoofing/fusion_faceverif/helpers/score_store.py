@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+'''Consolidation of the per-video .hdf5 score files of a system into a single indexed columnar file per protocol and subset'''
+
+import os
+import re
+import threading
+import numpy
+import bob.io.base
+
+from .array_io import save_arrays, load_arrays
+from .sparse_scores import SparseScores
+
+
+def packed_filename(system_dir, protocol, subset):
+  """Returns the name of the packed score file of a system
+
+  @param system_dir The base directory of the scores of the system
+  @param protocol 'licit' or 'spoof' for face verification systems, None for anti-spoofing systems (which have no protocol dir)
+  @param subset 'train', 'devel' or 'test'
+  """
+
+  if protocol is None:
+    return os.path.join(system_dir, '%s.pack.npz' % subset)
+  return os.path.join(system_dir, protocol, '%s.pack.npz' % subset)
+
+
+def pack_scores(system_dir, files, subset, protocol=None, clients=None):
+  """Reads the .hdf5 score files of the given files and saves them into one packed score file. Returns the name of the packed file.
+
+  Only the valid (not nan) scores are packed, in sparse form (see SparseScores): the packed file contains a flat float64 array with the valid scores of all the entries one after the other, their frame indices, the offsets of each entry in these arrays, and the total number of frames, path (File.make_path()), client id and model id of each entry. For the 'licit' protocol there is one entry per (model, file) pair, for the other protocols the model id is -1.
+
+  @param system_dir The base directory of the scores of the system
+  @param files The bob.db.replay.File objects whose scores are packed
+  @param subset 'train', 'devel' or 'test'
+  @param protocol 'licit' or 'spoof' for face verification systems, None for anti-spoofing systems
+  @param clients For the 'licit' protocol, the list of client ids (in the format 'clientXXX') whose models are packed
+  """
+
+  if protocol == 'licit':
+    dirs = [(int(cl[len('client'):]), os.path.join(system_dir, protocol, cl)) for cl in sorted(clients)]
+  elif protocol is None:
+    dirs = [(-1, system_dir)]
+  else:
+    dirs = [(-1, os.path.join(system_dir, protocol))]
+
+  blocks = []; paths = []; client_ids = []; model_ids = []
+  for model, d in dirs:
+    for f in files:
+      blocks.append(numpy.asarray(bob.io.base.load(str(f.make_path(d, extension='.hdf5'))), 'float64').ravel())
+      paths.append(str(f.make_path()))
+      client_ids.append(f.get_client_id())
+      model_ids.append(model)
+
+  lengths = numpy.array([len(b) for b in blocks], 'int64')
+  sparse = SparseScores.from_dense(numpy.concatenate(blocks) if blocks else numpy.ndarray((0,), 'float64'), lengths)
+  filename = packed_filename(system_dir, protocol, subset)
+  save_arrays(filename,
+    scores = sparse.scores[:,0],
+    frames = sparse.frames,
+    offsets = sparse.offsets,
+    num_frames = lengths,
+    paths = numpy.array(paths, 'U'),
+    client_ids = numpy.array(client_ids, 'int32'),
+    model_ids = numpy.array(model_ids, 'int32'),
+  )
+  return filename
+
+
+class PackedScores:
+  """Reader of a packed score file, as written by pack_scores(). The scores of a list of files are returned with a single slice of the (optionally memory-mapped) score arrays when the files are stored contiguously, which is the case when they are requested in the order they were packed"""
+
+  def __init__(self, filename, mmap=True):
+    arrays = load_arrays(filename, mmap=mmap)
+    self.filename = filename
+    self.scores = arrays['scores']
+    self.frames = arrays['frames']
+    self.offsets = arrays['offsets']
+    self.num_frames = arrays['num_frames']
+    self.paths = arrays['paths']
+    self.client_ids = arrays['client_ids']
+    self.model_ids = arrays['model_ids']
+    self.index = dict(((int(m), str(p)), i) for i, (m, p) in enumerate(zip(self.model_ids, self.paths)))
+
+  def __len__(self):
+    return len(self.paths)
+
+  def entries(self, files, model=-1):
+    """Returns the indices of the entries of the given files (and model, for the 'licit' protocol)"""
+
+    try:
+      return numpy.array([self.index[(model, str(f.make_path()))] for f in files], 'int64')
+    except KeyError as e:
+      raise KeyError("File %s (model %d) is not in the packed score file %s" % (e.args[0][1], model, self.filename))
+
+  def get_sparse(self, files, model=-1):
+    """Returns the valid scores of the given files as a SparseScores object
+
+    @param files The bob.db.replay.File objects
+    @param model For the 'licit' protocol, the integer id of the model. Leave to -1 for the other protocols
+    """
+
+    entries = self.entries(files, model)
+    lengths = self.offsets[entries+1] - self.offsets[entries]
+    offsets = numpy.concatenate(([0], numpy.cumsum(lengths)))
+    if len(entries) == 0:
+      return SparseScores(offsets, [], numpy.ndarray((0,), 'float64'))
+    if numpy.all(numpy.diff(entries) == 1): # contiguous entries: a single read
+      rows = slice(self.offsets[entries[0]], self.offsets[entries[-1]+1])
+      return SparseScores(offsets, self.frames[rows], self.scores[rows])
+    rows = numpy.concatenate([numpy.arange(self.offsets[e], self.offsets[e+1]) for e in entries])
+    return SparseScores(offsets, self.frames[rows], self.scores[rows])
+
+  def get(self, files, model=-1):
+    """Returns the scores of all the frames of the given files (nan for the frames without a valid score) concatenated in a flat numpy.array, together with the number of frames of each file
+
+    @param files The bob.db.replay.File objects
+    @param model For the 'licit' protocol, the integer id of the model. Leave to -1 for the other protocols
+    """
+
+    lengths = self.num_frames[self.entries(files, model)]
+    return self.get_sparse(files, model).to_dense(lengths)[:,0], lengths
+
+
+_open_packs = {}
+_open_packs_lock = threading.Lock() # the scores of several clients can be read by concurrent threads
+
+def find_packed(directory, subset):
+  """Returns the PackedScores object and the model id to use for reading the scores in directory, if a packed score file of the given subset exists for it, otherwise (None, None). The directory can be the base directory of an anti-spoofing system, the protocol dir of a face verification system or, for the 'licit' protocol, the clientXXX dir of a model. The opened packed files are kept open for the next calls, until their modification time changes"""
+
+  if subset is None: return None, None
+
+  candidates = [(os.path.join(directory, '%s.pack.npz' % subset), -1)]
+  match = re.match(r'^client(\d+)$', os.path.basename(os.path.normpath(directory)))
+  if match:
+    candidates.append((os.path.join(os.path.dirname(os.path.normpath(directory)), '%s.pack.npz' % subset), int(match.group(1))))
+
+  for filename, model in candidates:
+    if not os.path.exists(filename): continue
+    mtime = os.path.getmtime(filename)
+    with _open_packs_lock:
+      if filename not in _open_packs or _open_packs[filename][0] != mtime:
+        _open_packs[filename] = (mtime, PackedScores(filename))
+      return _open_packs[filename][1], model
+  return None, None
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+'''Sparse representation of per-frame scores, keeping only the valid (not nan) frames of each video'''
+
+import numpy
+
+
+class SparseScores:
+  """The valid scores of a list of videos, as (frame_index, score) pairs. Since the scores are usually computed only for some of the frames of each video (eg. every 10th frame), most of the per-frame scores are nan, and keeping only the valid ones saves an order of magnitude of memory.
+
+  The pairs of all the videos are stored one video after the other: offsets[i]:offsets[i+1] is the range of the pairs of the i-th video, frames are the frame indices (starting from 0) and scores is a numpy.ndarray with one row per pair and one column per system. A frame is kept only if it is valid for all the systems.
+  """
+
+  def __init__(self, offsets, frames, scores):
+    self.offsets = numpy.asarray(offsets, 'int64')
+    self.frames = numpy.asarray(frames, 'int32')
+    self.scores = numpy.asarray(scores, 'float64')
+    if self.scores.ndim == 1:
+      self.scores = self.scores.reshape(len(self.scores), 1)
+
+  @classmethod
+  def from_dense(cls, scores, lengths):
+    """Creates the sparse representation of dense per-frame scores
+
+    @param scores numpy.ndarray with the scores of all the frames of all the videos one after the other, with one column per system (or a flat numpy.array for a single system)
+    @param lengths The number of frames of each video
+    """
+
+    scores = numpy.asarray(scores, 'float64')
+    if scores.ndim == 1:
+      scores = scores.reshape(len(scores), 1)
+    lengths = numpy.asarray(lengths, 'int64')
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype('int64')
+    videos = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    valid = ~numpy.isnan(scores).any(axis=1)
+    frames = numpy.arange(len(scores)) - starts[videos]
+    counts = numpy.bincount(videos[valid], minlength=len(lengths))
+    return cls(numpy.concatenate(([0], numpy.cumsum(counts))), frames[valid], scores[valid])
+
+  def __len__(self):
+    return len(self.frames)
+
+  def num_videos(self):
+    return len(self.offsets) - 1
+
+  def num_systems(self):
+    return self.scores.shape[1]
+
+  def lengths(self):
+    """Returns the number of valid frames of each video"""
+
+    return numpy.diff(self.offsets)
+
+  def video_indices(self):
+    """Returns the index of the video of each (frame_index, score) pair"""
+
+    return numpy.repeat(numpy.arange(self.num_videos()), self.lengths())
+
+  def video(self, i):
+    """Returns the frame indices and the scores of the i-th video"""
+
+    return self.frames[self.offsets[i]:self.offsets[i+1]], self.scores[self.offsets[i]:self.offsets[i+1]]
+
+  def _match(self, other):
+    """Returns, for each (frame_index, score) pair of self, the position of the pair of the same video and frame in other, and a boolean mask of the pairs of self which have such a pair in other"""
+
+    if self.num_videos() != other.num_videos():
+      raise ValueError("Can not match the scores of %d and %d videos" % (self.num_videos(), other.num_videos()))
+    if len(self) == 0 or len(other) == 0:
+      return numpy.zeros((len(self),), 'int64'), numpy.zeros((len(self),), 'bool')
+
+    scale = numpy.int64(max(self.frames.max(), other.frames.max())) + 1
+    keys = self.video_indices().astype('int64') * scale + self.frames
+    other_keys = other.video_indices().astype('int64') * scale + other.frames
+    pos = numpy.searchsorted(other_keys, keys)
+    pos[pos == len(other_keys)] = 0
+    return pos, other_keys[pos] == keys
+
+  def join(self, other):
+    """Joins the columns of two sparse representations of the same videos, keeping only the frames which are valid in both"""
+
+    pos, match = self._match(other)
+    counts = numpy.bincount(self.video_indices()[match], minlength=self.num_videos())
+    return SparseScores(numpy.concatenate(([0], numpy.cumsum(counts))), self.frames[match], numpy.hstack((self.scores[match], other.scores[pos[match]])))
+
+  def align(self, other):
+    """Returns the scores of other at the (frame_index, score) pairs of self, as a numpy.ndarray with one row per pair of self and one column per system of other. The rows of the pairs which are not valid in other are nan"""
+
+    pos, match = self._match(other)
+    aligned = numpy.ndarray((len(self), other.num_systems()), 'float64')
+    aligned[:] = numpy.nan
+    aligned[match] = other.scores[pos[match]]
+    return aligned
+
+  def select(self, videos):
+    """Returns the sparse representation of a subset of the videos, given by their indices"""
+
+    videos = numpy.asarray(videos, 'int64')
+    lengths = self.lengths()[videos]
+    rows = numpy.concatenate([numpy.arange(self.offsets[v], self.offsets[v+1]) for v in videos]) if len(videos) else numpy.ndarray((0,), 'int64')
+    return SparseScores(numpy.concatenate(([0], numpy.cumsum(lengths))), self.frames[rows], self.scores[rows])
+
+  def to_dense(self, lengths):
+    """Returns the dense per-frame scores, with nan for the frames which are not valid
+
+    @param lengths The number of frames of each video
+    """
+
+    lengths = numpy.asarray(lengths, 'int64')
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype('int64')
+    dense = numpy.ndarray((lengths.sum(), self.num_systems()), 'float64')
+    dense[:] = numpy.nan
+    dense[starts[self.video_indices()] + self.frames] = self.scores
+    return dense
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+'''Time-to-decision evaluation of the fused decision of face verification and anti-spoofing systems on streams of frames: all the videos are replayed frame by frame at once, through a cumulative (or windowed) average of their per-frame scores'''
+
+import numpy
+
+from .decision_fusion import fused_decisions
+
+# the maximum number of padded (video, frame, system) scores processed at once
+CHUNK_SIZE = 2**22
+
+
+def running_scores(scores, offsets, window=None):
+  """Returns, for each frame of each video, the average of the scores of the frames of the video seen so far: all of them (cumulative) or the last window ones. The scores of all the videos are packed one video after the other, as in SparseScores: offsets[i]:offsets[i+1] is the range of the frames of the i-th video
+
+  @param scores numpy.ndarray with the scores of the frames (one row per frame, one column per system)
+  @param offsets numpy.array with the len(videos)+1 offsets of the frames of each video in scores
+  @param window The number of frames averaged, or None for all the frames seen so far
+  """
+
+  scores = numpy.asarray(scores, 'float64')
+  if scores.ndim == 1: scores = scores.reshape(len(scores), 1)
+  offsets = numpy.asarray(offsets, 'int64')
+  if window != None and window < 1:
+    raise ValueError("The window needs to contain at least one frame, not %s" % window)
+
+  lengths = numpy.diff(offsets)
+  videos = numpy.repeat(numpy.arange(len(lengths)), lengths)
+  ranks = numpy.arange(len(scores)) - offsets[videos] # the position of each frame in its video
+  if len(scores) == 0: return numpy.ndarray(scores.shape, 'float64')
+
+  if window != None:
+    # the scores of the last window frames of each video are added with one shift of all the frames at a time
+    sums = scores.copy()
+    for shift in range(1, min(window, int(lengths.max()))):
+      shifted = ranks >= shift
+      sums[shifted] += scores[numpy.where(shifted)[0] - shift]
+    return sums / numpy.minimum(ranks + 1, window).reshape(-1, 1)
+
+  # the scores of a chunk of videos are padded into a (video, position, system) array, so that the cumulative sums are computed for each video separately
+  result = numpy.ndarray(scores.shape, 'float64')
+  longest = int(lengths.max())
+  chunk = max(1, CHUNK_SIZE // (longest * scores.shape[1]))
+  for first in range(0, len(lengths), chunk):
+    rows = slice(offsets[first], offsets[min(first + chunk, len(lengths))])
+    chunk_videos = videos[rows] - first; chunk_ranks = ranks[rows]
+    padded = numpy.zeros((chunk_videos[-1] + 1 if len(chunk_videos) else 0, longest, scores.shape[1]), 'float64')
+    padded[chunk_videos, chunk_ranks] = scores[rows]
+    result[rows] = numpy.cumsum(padded, axis=1)[chunk_videos, chunk_ranks] / (chunk_ranks + 1).reshape(-1, 1)
+  return result
+
+
+class StreamingDecision:
+  """Decisions of the fused system on streams of frames. After each frame of a video, the fused decision is taken on the running average of the scores of the video (see running_scores()), so that the decision of all the frames of all the videos is obtained at once. The time is counted in frames seen: a video has been seen for t frames when its frames with an index lower than t have been seen. Before its first valid frame, a video is neither accepted nor rejected
+
+  @param scores SparseScores object with the scores of the valid frames of each video (one column per system)
+  @param labels The label of each video: 1 for the real accesses of the genuine users, 0 for the impostors and -1 for the spoofing attacks
+  @param thresholds The threshold of each system
+  @param rule 'AND', 'OR', 'MAJORITY' or the number of systems k which need to accept a sample
+  @param window The number of frames averaged, or None for all the frames seen so far
+  """
+
+  def __init__(self, scores, labels, thresholds, rule='AND', window=None):
+    self.offsets = scores.offsets
+    self.frames = scores.frames.astype('int64')
+    self.labels = numpy.asarray(labels)
+    if len(self.labels) != scores.num_videos():
+      raise ValueError("The %d labels do not match the %d videos" % (len(self.labels), scores.num_videos()))
+    self.accepted, self.rejected = fused_decisions(running_scores(scores.scores, self.offsets, window), thresholds, rule)
+
+  def num_frames(self):
+    """Returns the number of frames needed to see all the valid frames of all the videos"""
+
+    return int(self.frames.max()) + 1 if len(self.frames) else 0
+
+  def first_accept(self):
+    """Returns, for each video, the number of frames seen when it is accepted for the first time (inf if it is never accepted)"""
+
+    first = numpy.ndarray((len(self.offsets) - 1,), 'float64')
+    first[:] = numpy.inf
+    lengths = numpy.diff(self.offsets)
+    nonempty = lengths > 0
+    if nonempty.any():
+      seen = numpy.where(self.accepted, self.frames + 1., numpy.inf)
+      first[nonempty] = numpy.minimum.reduceat(seen, self.offsets[:-1][nonempty])
+    return first
+
+  def accepted_after(self, frames_seen):
+    """Returns a boolean numpy.ndarray with one row per video and one column per number of frames seen: the current decision of the fused system on each video, after seeing this number of frames"""
+
+    frames_seen = numpy.asarray(frames_seen, 'int64').ravel()
+    num_videos = len(self.offsets) - 1
+    if len(self.frames) == 0: return numpy.zeros((num_videos, len(frames_seen)), 'bool')
+    # the last valid frame of each video seen after each number of frames, found in the (video, frame) keys of all the frames
+    scale = max(self.num_frames(), int(frames_seen.max()) if len(frames_seen) else 0) + 1
+    keys = numpy.repeat(numpy.arange(num_videos), numpy.diff(self.offsets)) * scale + self.frames
+    last = numpy.searchsorted(keys, numpy.arange(num_videos)[:,None] * scale + frames_seen[None,:], 'left') - 1
+    seen = last >= self.offsets[:-1][:,None]
+    return seen & self.accepted[numpy.maximum(last, 0)]
+
+  def curves(self, frames_seen, early_accept=True):
+    """Returns the FAR, the FRR and the SFAR of the fused system as a function of the number of frames seen. If early_accept is True, a video is accepted as soon as the fused system accepts it (eg. an access is granted at the first accept), and the FRR after t frames is the rate of the real accesses which have not been accepted yet. Otherwise, the current decision after t frames is used
+
+    @param frames_seen The numbers of frames seen
+    @param early_accept If True, a video is accepted once it is accepted at any frame seen so far
+    """
+
+    frames_seen = numpy.asarray(frames_seen, 'int64').ravel()
+    if early_accept:
+      accepted = self.first_accept()[:,None] <= frames_seen[None,:]
+    else:
+      accepted = self.accepted_after(frames_seen)
+
+    def rate(label):
+      selected = accepted[self.labels == label]
+      if len(selected) == 0: return numpy.nan * numpy.ones((len(frames_seen),), 'float64')
+      return selected.mean(axis=0)
+
+    return rate(0), 1. - rate(1), rate(-1)
+
+  def latency(self, label=1):
+    """Returns the number of frames seen until the first accept of each video with the given label that is ever accepted (for the real accesses of the genuine users, the frames to the first correct accept), and the rate of these videos which are never accepted"""
+
+    first = self.first_accept()[self.labels == label]
+    if len(first) == 0: return first, numpy.nan
+    accepted = numpy.isfinite(first)
+    return first[accepted], 1. - accepted.mean()
+
+
+def checkpoints(num_frames):
+  """Returns the numbers of frames seen at which the error rates are reported: 1, 2, 5, 10, 20, 50... up to num_frames, and num_frames"""
+
+  points = [p * 10**e for e in range(len(str(max(num_frames, 1)))) for p in (1, 2, 5)]
+  return numpy.array(sorted(set([p for p in points if p < num_frames] + [max(num_frames, 1)])), 'int64')
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+'''Error rates of the AND decision fusion over the full grid of pairs of face verification and anti-spoofing thresholds, computed from 2-D cumulative histograms of the scores'''
+
+import numpy
+
+CRITERIA = ('eer', 'hter', 'wer')
+
+
+def candidate_thresholds(scores, points=None):
+  """Returns the sorted unique values of the scores, as candidate thresholds. If points is given and there are more unique values, only points of them, evenly spaced in rank, are returned
+
+  @param scores The scores of all the samples of a system (numpy.ndarray or list of numpy.ndarray)
+  @param points The maximum number of thresholds
+  """
+
+  if isinstance(scores, (list, tuple)):
+    scores = numpy.concatenate([numpy.asarray(s, 'float64').ravel() for s in scores])
+  thresholds = numpy.unique(numpy.asarray(scores, 'float64'))
+  thresholds = thresholds[~numpy.isnan(thresholds)]
+  if points is not None and len(thresholds) > points:
+    thresholds = thresholds[numpy.unique(numpy.round(numpy.linspace(0, len(thresholds) - 1, points)).astype('int64'))]
+  return thresholds
+
+
+def _upper_counts(fv_scores, as_scores, fv_thresholds, as_thresholds, strict):
+  """Returns the (len(fv_thresholds), len(as_thresholds)) array with the number of samples whose face verification score is above fv_thresholds[i] and whose anti-spoofing score is above as_thresholds[j] (or equal to them, if strict is False). The thresholds have to be sorted"""
+
+  side = 'left' if strict else 'right'
+  rows = len(fv_thresholds) + 1; cols = len(as_thresholds) + 1
+  # the number of thresholds below (or equal to) each score: a sample is above fv_thresholds[i] if i < fv_bins
+  fv_bins = numpy.searchsorted(fv_thresholds, fv_scores, side)
+  as_bins = numpy.searchsorted(as_thresholds, as_scores, side)
+  hist = numpy.bincount(fv_bins * cols + as_bins, minlength=rows * cols).reshape(rows, cols)
+  # counts[i,j] = number of samples with fv_bins > i and as_bins > j
+  counts = hist[::-1,::-1].cumsum(axis=0).cumsum(axis=1)[::-1,::-1]
+  return counts[1:,1:]
+
+
+def _and_rate(fv_scores, as_scores, fv_thresholds, as_thresholds, accept):
+  fv_scores = numpy.asarray(fv_scores, 'float64').ravel()
+  as_scores = numpy.asarray(as_scores, 'float64').ravel()
+  if fv_scores.shape != as_scores.shape:
+    raise ValueError("The face verification (%d) and anti-spoofing (%d) scores need to be given for the same samples" % (len(fv_scores), len(as_scores)))
+  n = len(fv_scores)
+  if n == 0:
+    return numpy.nan * numpy.ones((len(fv_thresholds), len(as_thresholds)), 'float64')
+
+  # comparisons with nan are always False: a nan score neither accepts nor rejects the sample
+  if accept: # accepted: above both thresholds, so that the samples with a nan score are never accepted
+    valid = ~(numpy.isnan(fv_scores) | numpy.isnan(as_scores))
+    counts = _upper_counts(fv_scores[valid], as_scores[valid], fv_thresholds, as_thresholds, strict=True)
+  else: # rejected: below any of the thresholds, ie. not above or equal to both of them, where a nan score is never below its threshold
+    fv_scores = numpy.where(numpy.isnan(fv_scores), numpy.inf, fv_scores)
+    as_scores = numpy.where(numpy.isnan(as_scores), numpy.inf, as_scores)
+    counts = n - _upper_counts(fv_scores, as_scores, fv_thresholds, as_thresholds, strict=False)
+  return counts / float(n)
+
+
+class ThresholdSurface:
+  """The FAR, FRR and SFAR of the AND decision fusion for each pair of face verification and anti-spoofing thresholds. The error rates are arrays of shape (len(fv_thresholds), len(as_thresholds)), computed with the same decisions as decision_fusion.decision_rates(): a sample is accepted if both of its scores are above the thresholds, and rejected if any of them is below its threshold
+
+  @param valid The (face verification, anti-spoofing) scores of the real accesses of the genuine users
+  @param impostors The (face verification, anti-spoofing) scores of the impostors
+  @param attacks The (face verification, anti-spoofing) scores of the spoofing attacks
+  @param fv_thresholds The face verification thresholds (see candidate_thresholds())
+  @param as_thresholds The anti-spoofing thresholds
+  """
+
+  def __init__(self, valid, impostors, attacks, fv_thresholds, as_thresholds):
+    self.fv_thresholds = numpy.unique(numpy.asarray(fv_thresholds, 'float64'))
+    self.as_thresholds = numpy.unique(numpy.asarray(as_thresholds, 'float64'))
+    self.far = _and_rate(impostors[0], impostors[1], self.fv_thresholds, self.as_thresholds, accept=True)
+    self.frr = _and_rate(valid[0], valid[1], self.fv_thresholds, self.as_thresholds, accept=False)
+    self.sfar = _and_rate(attacks[0], attacks[1], self.fv_thresholds, self.as_thresholds, accept=True)
+
+  def weighted_far(self, omega):
+    """Returns the weighted FAR between the impostors and the spoofing attacks, (1-omega) * FAR + omega * SFAR, as in the EPSC"""
+
+    if omega == 0: return self.far
+    if omega == 1: return self.sfar
+    return (1 - omega) * self.far + omega * self.sfar
+
+  def criterion(self, criterion='eer', omega=0., beta=0.5):
+    """Returns the value of the criterion for each pair of thresholds: |FAR_omega - FRR| for 'eer', (FAR_omega + FRR) / 2 for 'hter' and beta * FAR_omega + (1-beta) * FRR for 'wer', where FAR_omega is the weighted_far()"""
+
+    if criterion not in CRITERIA:
+      raise ValueError("Unknown criterion '%s', use one of %s" % (criterion, ', '.join(CRITERIA)))
+    far = self.weighted_far(omega)
+    if criterion == 'eer':
+      return numpy.abs(far - self.frr)
+    if criterion == 'hter':
+      return (far + self.frr) / 2.
+    return beta * far + (1 - beta) * self.frr
+
+  def select(self, criterion='eer', omega=0., beta=0.5):
+    """Returns the pair of thresholds (fv_thr, as_thr) minimizing the criterion (see criterion()). Among the pairs with the same value of the 'eer' criterion, the one with the lowest HTER is selected"""
+
+    values = self.criterion(criterion, omega, beta).ravel()
+    if numpy.all(numpy.isnan(values)):
+      raise ValueError("The criterion '%s' can not be evaluated: there are no scores" % criterion)
+    values = numpy.where(numpy.isnan(values), numpy.inf, values)
+    if criterion == 'eer':
+      index = numpy.lexsort((self.criterion('hter', omega).ravel(), values))[0]
+    else:
+      index = numpy.argmin(values)
+    i, j = numpy.unravel_index(index, self.far.shape)
+    return float(self.fv_thresholds[i]), float(self.as_thresholds[j])
+
+  def save(self, hdf5file, prefix='', thresholds=True):
+    """Saves the thresholds and the error rates into an open bob.io.base.HDF5File. The names of the error rates are prefixed with prefix (eg. 'devel_'), so that the surfaces of several sets computed on the same thresholds can be saved into the same file, with thresholds set to False for all of them but the first one"""
+
+    if thresholds:
+      hdf5file.set('fv_thresholds', self.fv_thresholds)
+      hdf5file.set('as_thresholds', self.as_thresholds)
+    hdf5file.set(prefix + 'far', self.far)
+    hdf5file.set(prefix + 'frr', self.frr)
+    hdf5file.set(prefix + 'sfar', self.sfar)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+'''Aggregation of the per-frame scores of each video into video-level scores, with vectorized reductions over the segments of packed per-frame scores'''
+
+import numpy
+
+REDUCTIONS = ('mean', 'median', 'max', 'trimmed', 'vote')
+
+
+def _sorted_segments(scores, segments):
+  """Returns the scores sorted within each segment, separately for each column"""
+
+  result = numpy.ndarray(scores.shape, 'float64')
+  for c in range(scores.shape[1]):
+    result[:,c] = scores[numpy.lexsort((scores[:,c], segments)), c]
+  return result
+
+
+def segment_reduce(scores, offsets, reduction='mean', trim=0.1, thresholds=None):
+  """Reduces the scores of the frames of each video into one score per system. The scores of all the videos are packed one video after the other, as in SparseScores: offsets[i]:offsets[i+1] is the range of the frames of the i-th video. The reductions are the mean, the median or the maximum of the scores of the frames, the trimmed mean (the mean without the trim fraction of the lowest and of the highest scores) and the vote fraction (the fraction of the frames whose score is above the threshold of the system)
+
+  @param scores numpy.ndarray with the scores of the frames (one row per frame, one column per system)
+  @param offsets numpy.array with the len(videos)+1 offsets of the frames of each video in scores
+  @param reduction One of REDUCTIONS
+  @param trim The fraction of the scores cut off at each end for the trimmed mean
+  @param thresholds The threshold of each system, for the vote fraction
+
+  Returns a numpy.ndarray with one row per video and one column per system. The rows of the videos without any frame are nan
+  """
+
+  if reduction not in REDUCTIONS:
+    raise ValueError("Unknown reduction '%s', use one of %s" % (reduction, ', '.join(REDUCTIONS)))
+  scores = numpy.asarray(scores, 'float64')
+  if scores.ndim == 1: scores = scores.reshape(len(scores), 1)
+  offsets = numpy.asarray(offsets, 'int64')
+  if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(scores):
+    raise ValueError("The offsets do not cover the %d scores" % len(scores))
+
+  lengths = numpy.diff(offsets)
+  result = numpy.ndarray((len(lengths), scores.shape[1]), 'float64')
+  result[:] = numpy.nan
+  nonempty = lengths > 0
+  if not nonempty.any(): return result
+  starts = offsets[:-1][nonempty]
+  counts = lengths[nonempty].reshape(-1, 1)
+
+  if reduction == 'vote':
+    if thresholds is None:
+      raise ValueError("The thresholds of the systems are needed for the vote fraction")
+    votes = (scores > numpy.asarray(thresholds, 'float64').reshape(1, -1)).astype('float64')
+    result[nonempty] = numpy.add.reduceat(votes, starts, axis=0) / counts
+  elif reduction == 'mean':
+    result[nonempty] = numpy.add.reduceat(scores, starts, axis=0) / counts
+  elif reduction == 'max':
+    result[nonempty] = numpy.maximum.reduceat(scores, starts, axis=0)
+  else:
+    # the rank of each frame in its video, once the scores of each video are sorted
+    segments = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    ranks = numpy.arange(len(scores)) - offsets[segments]
+    ordered = _sorted_segments(scores, segments)
+    if reduction == 'median':
+      low = starts + (counts[:,0] - 1) // 2; high = starts + counts[:,0] // 2
+      result[nonempty] = (ordered[low] + ordered[high]) / 2.
+    else:
+      if not 0 <= trim < 0.5:
+        raise ValueError("The trimmed fraction needs to be in [0, 0.5), not %s" % trim)
+      cut = (trim * lengths).astype('int64') # the number of scores cut off at each end of each video
+      kept = (ranks >= cut[segments]) & (ranks < (lengths - cut)[segments])
+      sums = numpy.add.reduceat(numpy.where(kept[:,None], ordered, 0.), starts, axis=0)
+      result[nonempty] = sums / (counts - 2 * cut[nonempty].reshape(-1, 1))
+  return result
+
+
+def video_thresholds(thresholds, reduction, vote_fraction=0.5):
+  """Returns the thresholds to apply to the video-level scores: the frame-level thresholds of the systems, or vote_fraction for the vote fraction (a system accepts a video if it accepts more than this fraction of its frames)"""
+
+  thresholds = numpy.asarray(thresholds, 'float64')
+  if reduction == 'vote':
+    return vote_fraction * numpy.ones(thresholds.shape, 'float64')
+  return thresholds
@@ -3,9 +3,7 @@
 #Tue Feb 11 10:54:37 CET 2014
 
 """
-This script performs AND decision level fusion of face verification and anti-spoofing system and plots the EPSC for the decision
-
-NOTE: While the script can receive more face verification and anti-spoofing systems as arguments (this is true also for the thresholds), the functionality to fuse more then one face verificaiton and one anti-spoofing system is not supported yet.
+This script performs decision level fusion of face verification and anti-spoofing systems and plots the EPSC for the decision. Several face verification and anti-spoofing systems can be fused, with one threshold given for each of them, with the AND (default), OR, MAJORITY or k-of-n rule.
 
 """
 
@@ -16,18 +14,11 @@ import numpy
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import *
-
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
-
-from matplotlib import rc
-rc('text',usetex=1)
-
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
+from antispoofing.fusion_faceverif.helpers.video_scores import REDUCTIONS, video_thresholds
+from antispoofing.fusion_faceverif.helpers.decision_fusion import required_votes, rule_name, split_fused_scores, fused_decision_rates
+from antispoofing.fusion_faceverif.helpers.epsc import epsc_error_rates
 
 
 def main():
@@ -42,73 +33,84 @@ def main():
 
   parser.add_argument('--at', '--as-threshold', type=float, dest='as_threshold', default=None, help='The anti-spoofing threshold', nargs='+') #nargs='+'
   
+  parser.add_argument('-r', '--rule', type=str, dest='rule', default='AND', help='The decision fusion rule: AND, OR, MAJORITY or the number k of systems which need to accept a sample (defaults to %(default)s)')
+
   parser.add_argument('--sp', '--save_params', action='store_true', dest='save_params', default=False, help='Save the decision thresholds in the outputdir for future use')
   
   parser.add_argument('--op', '--output', metavar='FILE', type=str, default='plots.pdf', dest='output', help='Set the name of the output plot file (defaults to "%(default)s")')
   parser.add_argument('--oh', '--outhdf', metavar='FILE', type=str, default='toplot_and.pdf', dest='outhdf', help='Set the name of the output hdf file (defaults to "%(default)s")')
 
+  parser.add_argument('--video', type=str, dest='video', default=None, choices=REDUCTIONS, help='Also report the error rates at the video level, where the scores of the frames of each video are reduced into one score per system: mean, median, max, trimmed (trimmed mean) or vote (fraction of the frames above the threshold of the system; a system accepts a video if it accepts more than half of its frames)')
+
+  parser.add_argument('--trim', type=float, dest='trim', default=0.1, help='The fraction of the scores cut off at each end of each video for the trimmed mean (defaults to %(default)s)')
+
   parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
  
+  add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
  
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
   
   if len(args.as_threshold) != len(args.as_scoresdir) or len(args.fv_threshold) != len(args.fv_scoresdir): 
     raise ValueError("Thresholds must be specified for all the input score sets\n")
-  else:
-    as_thr = args.as_threshold[0] # multiple thresholds are still not supported
-    fv_thr = args.fv_threshold[0]
+  # the thresholds of the face verification systems come first, as their scores
+  thresholds = numpy.array(args.fv_threshold + args.as_threshold, 'float64')
+  required_votes(args.rule, len(thresholds)) # checks the rule
+  rule = rule_name(args.rule, len(thresholds))
 
   # read faceverif and antispoofing scores for all samples
-  devel_scores, devel_labels = gather_fvas_scores(database, 'devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
-  test_scores, test_labels = gather_fvas_scores(database, 'test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
+  # the anti-spoofing scores of the real accesses are shared by all the clients, and not copied for each of them
+  # the scores are read once, for the frame-level and for the video-level scores
+  query = ScoreQuery(database, workers=args.jobs)
+  devel_scores = query.broadcast('devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
+  test_scores = query.broadcast('test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
   
   # separate the scores of valid users, impostors and spoofing attacks
-  valid_devel_fv_scores = devel_scores[devel_labels == 1,0];   valid_devel_as_scores = devel_scores[devel_labels == 1,1]
-  valid_test_fv_scores = test_scores[test_labels == 1,0];   valid_test_as_scores = test_scores[test_labels == 1,1]
-  
-  impostors_devel_fv_scores = devel_scores[devel_labels == 0,0];   impostors_devel_as_scores = devel_scores[devel_labels == 0,1]
-  impostors_test_fv_scores = test_scores[test_labels == 0,0];   impostors_test_as_scores = test_scores[test_labels == 0,1]
+  valid_devel, impostors_devel, spoof_devel = split_fused_scores(devel_scores)
+  valid_test, impostors_test, spoof_test = split_fused_scores(test_scores)
   
-  spoof_devel_fv_scores = devel_scores[devel_labels == -1,0];   spoof_devel_as_scores = devel_scores[devel_labels == -1,1]
-  spoof_test_fv_scores = test_scores[test_labels == -1,0];   spoof_test_as_scores = test_scores[test_labels == -1,1]
-  
-  # determine the wrongly classified samples by AND fusion system
-  devel_far_ind = [ind for ind in range(len(impostors_devel_fv_scores)) if impostors_devel_fv_scores[ind] > fv_thr and impostors_devel_as_scores[ind] > as_thr];
-  devel_frr_ind = [ind for ind in range(len(valid_devel_fv_scores)) if (valid_devel_fv_scores[ind] < fv_thr or valid_devel_as_scores[ind] < as_thr)];
-  devel_sfar_ind = [ind for ind in range(len(spoof_devel_fv_scores)) if spoof_devel_fv_scores[ind] > fv_thr and spoof_devel_as_scores[ind] > as_thr];
-    
-  test_far_ind = [ind for ind in range(len(impostors_test_fv_scores)) if impostors_test_fv_scores[ind] > fv_thr and impostors_test_as_scores[ind] > as_thr];
-  test_frr_ind = [ind for ind in range(len(valid_test_fv_scores)) if (valid_test_fv_scores[ind] < fv_thr or valid_test_as_scores[ind] < as_thr)];
-  test_sfar_ind = [ind for ind in range(len(spoof_test_fv_scores)) if spoof_test_fv_scores[ind] > fv_thr and spoof_test_as_scores[ind] > as_thr];  
-  
-  # calculate performance of AND fusion system
-  devel_far = len(devel_far_ind) / float(len(impostors_devel_fv_scores)); devel_frr = len(devel_frr_ind) / float(len(valid_devel_fv_scores)); devel_sfar = len(devel_sfar_ind) / float(len(spoof_devel_fv_scores)); 
-  test_far = len(test_far_ind) / float(len(impostors_test_fv_scores)); test_frr = len(test_frr_ind) / float(len(valid_test_fv_scores)); test_sfar = len(test_sfar_ind) / float(len(spoof_test_fv_scores)); 
+  # calculate performance of the fused system
+  devel_far, devel_frr, devel_sfar = fused_decision_rates(valid_devel, impostors_devel, spoof_devel, thresholds, args.rule)
+  test_far, test_frr, test_sfar = fused_decision_rates(valid_test, impostors_test, spoof_test, thresholds, args.rule)
+
+  if args.video != None:
+    # the scores of the frames of each video are reduced into one score per system
+    devel_video, devel_video_labels = query.videos('devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False, reduction=args.video, trim=args.trim, thresholds=thresholds)
+    test_video, test_video_labels = query.videos('test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False, reduction=args.video, trim=args.trim, thresholds=thresholds)
+    valid_devel_video, impostors_devel_video, spoof_devel_video = split_fused_scores(devel_video, devel_video_labels)
+    valid_test_video, impostors_test_video, spoof_test_video = split_fused_scores(test_video, test_video_labels)
+    video_thr = video_thresholds(thresholds, args.video)
+    video_rates = [fused_decision_rates(valid_video, impostors_video, spoof_video, video_thr, args.rule) for valid_video, impostors_video, spoof_video in ((valid_devel_video, impostors_devel_video, spoof_devel_video), (valid_test_video, impostors_test_video, spoof_test_video))]
 
   # plot EPSC for HTER_w
   points = 100
   step_size = 1 / float(points)
   omega = numpy.array([(i * step_size) for i in range(points+1)])
-  far_w = [(1-w) * test_far + w * test_sfar for w in omega]
-  hter = [(far + test_frr) / 2 for far in far_w]
+  far_w, hter = epsc_error_rates(test_far, test_frr, test_sfar, omega)
   
   from scipy import integrate
   aue = integrate.cumtrapz(hter, omega)
 
 
+  import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
+  from matplotlib.backends.backend_pdf import PdfPages
+  import matplotlib.pyplot as mpl
+  from matplotlib import rc
+  rc('text',usetex=1)
+
   pp = PdfPages(args.output)
   fig = mpl.figure()
   
-  mpl.plot(omega, 100. * numpy.array(hter), color='red', label = "AND", linewidth=4)
+  mpl.plot(omega, 100. * numpy.array(hter), color='red', label = rule, linewidth=4)
       
   mpl.xlabel("Weight $\omega$")
   mpl.ylabel(r"HTER$_{\omega}$ (\%)")
@@ -134,11 +136,15 @@ def main():
   
   
   # print results
-  sys.stdout.write("FV threshold: %f, AS threshold: %f\n" % (fv_thr, as_thr))
+  sys.stdout.write("FV threshold: %s, AS threshold: %s\n" % (', '.join('%f' % t for t in args.fv_threshold), ', '.join('%f' % t for t in args.as_threshold)))
   sys.stdout.write("----------------------------------------------------------\n")
-  sys.stdout.write("AND fused system results:\n")
+  sys.stdout.write("%s fused system results:\n" % rule)
   sys.stdout.write("Devel: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (devel_far*100, devel_frr*100, devel_far*50 + devel_frr*50, devel_sfar*100))
   sys.stdout.write("Test: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (test_far*100, test_frr*100, test_far*50 + test_frr*50, test_sfar*100))
+  if args.video != None:
+    sys.stdout.write("%s fused system results, video level (%s):\n" % (rule, args.video))
+    for name, (far, frr, sfar) in zip(('Devel', 'Test'), video_rates):
+      sys.stdout.write("%s: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (name, far*100, frr*100, far*50 + frr*50, sfar*100))
 
   sys.stdout.write("AUE = %.4f \n" % aue[-1]) # for indexing purposes, aue is cumulative integration
   
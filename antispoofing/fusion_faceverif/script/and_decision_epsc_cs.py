@@ -3,9 +3,7 @@
 #Mon 12 Oct 13:00:33 CEST 2015
 
 """
-This script performs AND decision level fusion of face verification and anti-spoofing system and plots the EPSC for the decision. The anti-spoofing systems should be client-specific
-
-NOTE: While the script can receive more face verification and anti-spoofing systems as arguments (this is true also for the thresholds), the functionality to fuse more then one face verificaiton and one anti-spoofing system is not supported yet.
+This script performs decision level fusion of face verification and anti-spoofing systems and plots the EPSC for the decision. The anti-spoofing systems should be client-specific. Several face verification and anti-spoofing systems can be fused, with the AND (default), OR, MAJORITY or k-of-n rule: the threshold of each system is determined separately for each value of omega.
 
 """
 
@@ -16,19 +14,12 @@ import numpy
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import *
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
+from antispoofing.fusion_faceverif.helpers.decision_fusion import required_votes, rule_name, split_fused_scores
+from antispoofing.fusion_faceverif.helpers.epsc import fused_epsc_rates, epsc_error_rates
 
 from antispoofing.evaluation.utils import error_utils
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
-
-from matplotlib import rc
-rc('text',usetex=1)
-
 
 
 def main():
@@ -39,6 +30,8 @@ def main():
 
   parser.add_argument('-a', '--as-scores-dir', type=str, dest='as_scoresdir', default='', help='Base directory containing the scores of one or more antispoofing algorithms', nargs='+') #nargs='+'
 
+  parser.add_argument('-r', '--rule', type=str, dest='rule', default='AND', help='The decision fusion rule: AND, OR, MAJORITY or the number k of systems which need to accept a sample (defaults to %(default)s)')
+
   parser.add_argument('--sp', '--save_params', action='store_true', dest='save_params', default=False, help='Save the decision thresholds in the outputdir for future use')
   
   parser.add_argument('--op', '--output', metavar='FILE', type=str, default='plots.pdf', dest='output', help='Set the name of the output plot file (defaults to "%(default)s")')
@@ -46,64 +39,62 @@ def main():
 
   parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
  
+  add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
  
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
   
   # read faceverif and antispoofing scores for all samples
-  devel_scores, devel_labels, _ = gather_fvas_clsp_scores(database, 'devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
-  test_scores, test_labels, _ = gather_fvas_clsp_scores(database, 'test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
+  # the client-specific scores of the LICIT protocol of all the models of each subset are read once, and sliced for each client
+  query = ScoreQuery(database, workers=args.jobs)
+  devel_scores, devel_labels, _ = query.fvas('devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False, client_specific=True)
+  test_scores, test_labels, _ = query.fvas('test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False, client_specific=True)
 
   # separate the scores of valid users, impostors and spoofing attacks
-  valid_devel_fv_scores = devel_scores[devel_labels == 1,0];  valid_devel_as_scores = devel_scores[devel_labels == 1,1]
-  valid_test_fv_scores = test_scores[test_labels == 1,0];   valid_test_as_scores = test_scores[test_labels == 1,1]
-  
-  impostors_devel_fv_scores = devel_scores[devel_labels == 0,0];   impostors_devel_as_scores = devel_scores[devel_labels == 0,1]
-  impostors_test_fv_scores = test_scores[test_labels == 0,0];   impostors_test_as_scores = test_scores[test_labels == 0,1]
-  
-  spoof_devel_fv_scores = devel_scores[devel_labels == -1,0];   spoof_devel_as_scores = devel_scores[devel_labels == -1,1]
-  spoof_test_fv_scores = test_scores[test_labels == -1,0];   spoof_test_as_scores = test_scores[test_labels == -1,1]
+  valid_devel, impostors_devel, spoof_devel = split_fused_scores(devel_scores, devel_labels)
+  valid_test, impostors_test, spoof_test = split_fused_scores(test_scores, test_labels)
+  required_votes(args.rule, valid_devel.shape[1]) # checks the rule
+  rule = rule_name(args.rule, valid_devel.shape[1])
   
   points = 100
   criteria = 'eer'
 
-  omega, beta, thrs_fv = error_utils.epsc_thresholds(impostors_devel_fv_scores, valid_devel_fv_scores, spoof_devel_fv_scores, valid_devel_fv_scores, points=points, criteria=criteria, beta=0.5)
-  omega, beta, thrs_as = error_utils.epsc_thresholds(impostors_devel_as_scores, valid_devel_as_scores, spoof_devel_as_scores, valid_devel_as_scores, points=points, criteria=criteria, beta=0.5) 
-
-  test_far = numpy.ndarray(omega.shape, dtype='float64')
-  test_sfar = numpy.ndarray(omega.shape, dtype='float64')
-  test_frr = numpy.ndarray(omega.shape, dtype='float64')
+  # the thresholds of each system for all the values of omega
+  thrs = []
+  for c in range(valid_devel.shape[1]):
+    omega, beta, thrs_c = error_utils.epsc_thresholds(impostors_devel[:,c], valid_devel[:,c], spoof_devel[:,c], valid_devel[:,c], points=points, criteria=criteria, beta=0.5)
+    thrs.append(numpy.asarray(thrs_c[0], 'float64'))
 
-  for i in range(len(omega)):
-    test_fa = numpy.logical_and(impostors_test_fv_scores >= thrs_fv[0][i], impostors_test_as_scores >= thrs_as[0][i])
-    test_sfa = numpy.logical_and(spoof_test_fv_scores >= thrs_fv[0][i], spoof_test_as_scores >= thrs_as[0][i])
-    test_fr = numpy.logical_or(valid_test_fv_scores < thrs_fv[0][i], valid_test_as_scores < thrs_as[0][i])
-
-    test_far[i] = sum(test_fa) / float(len(test_fa))
-    test_sfar[i] = sum(test_sfa) / float(len(test_sfa))
-    test_frr[i] = sum(test_fr) / float(len(test_fr))
+  # error rates of the fused system for the thresholds of all the values of omega at once
+  test_far, test_frr, test_sfar = fused_epsc_rates(valid_test, impostors_test, spoof_test, numpy.column_stack(thrs), args.rule)
 
   #import ipdb; ipdb.set_trace()
 
-  far_w = [(1-omega[i]) * test_far[i] + omega[i] * test_sfar[i] for i in range(len(omega))]
-  hter = [(far_w[i] + test_frr[i]) / 2 for i in range(len(omega))]
+  far_w, hter = epsc_error_rates(test_far, test_frr, test_sfar, omega)
   
   from scipy import integrate
   aue = integrate.cumtrapz(hter, omega)
 
+  import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
+  from matplotlib.backends.backend_pdf import PdfPages
+  import matplotlib.pyplot as mpl
+  from matplotlib import rc
+  rc('text',usetex=1)
+
   pp = PdfPages(args.output)
   fig = mpl.figure()
   
-  mpl.plot(omega, 100. * numpy.array(hter), color='red', label = "AND", linewidth=4)
-  mpl.plot(omega, 100. * numpy.array(test_sfar), color='blue', label = "AND", linewidth=4)
+  mpl.plot(omega, 100. * numpy.array(hter), color='red', label = rule, linewidth=4)
+  mpl.plot(omega, 100. * numpy.array(test_sfar), color='blue', label = rule, linewidth=4)
       
   mpl.xlabel("Weight $\omega$")
   mpl.ylabel(r"HTER$_{\omega}$ (\%)")
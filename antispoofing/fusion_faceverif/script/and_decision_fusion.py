@@ -3,9 +3,9 @@
 #Mon Mar 25 18:32:57 CET 2013
 
 """
-This script performs AND decision level fusion of face verification and anti-spoofing system. It determines the decision boundaries of the two systems and reports the error rate (FAR, FRR, HTER, SFAR).
+This script performs decision level fusion of face verification and anti-spoofing systems. It applies the decision thresholds of each of the systems and reports the error rate (FAR, FRR, HTER, SFAR) of the fused decision. Several face verification and anti-spoofing systems can be fused, with one threshold given for each of them. The fused decision accepts a sample if all the systems accept it (AND), if any of them accepts it (OR), if most of them accept it (MAJORITY) or if at least k of them accept it (k-of-n). The error rates are reported for each of the given rules.
 
-NOTE: While the script can receive more face verification and anti-spoofing systems as arguments (this is true also for the thresholds), the functionality to fuse more then one face verificaiton and one anti-spooing system is not supported yet.
+With --cascade, the systems are also simulated as a cascade, which runs them one after the other and stops as soon as the fused decision is known (eg. at the first reject for the AND rule). The cascade has the same error rates as the fused decision, but it does not run all the systems on all the samples. With --margin, the cascade also stops after a system whose score is clearly above (or below) its threshold, as if the systems not run yet accepted (or rejected) the sample as well: it runs fewer systems, but its error rates depend on the order. The error rates, the expected number of systems run and the expected cost (with one cost weight for each system) of a sample are reported for all the orders of the systems, from the cheapest on the development set.
 
 """
 
@@ -15,15 +15,11 @@ import numpy
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import *
-
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
-
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
+from antispoofing.fusion_faceverif.helpers.video_scores import REDUCTIONS, video_thresholds
+from antispoofing.fusion_faceverif.helpers.decision_fusion import required_votes, rule_name, split_fused_scores, fused_decision_rates
+from antispoofing.fusion_faceverif.helpers.cascade import CascadeSimulator
 
 
 def main():
@@ -38,59 +34,98 @@ def main():
 
   parser.add_argument('--at', '--as-threshold', type=float, dest='as_threshold', default=None, help='The anti-spoofing threshold', nargs='+') #nargs='+'
 
+  parser.add_argument('-r', '--rule', type=str, dest='rules', default=['AND'], help='The decision fusion rule(s): AND, OR, MAJORITY or the number k of systems which need to accept a sample (defaults to AND)', nargs='+')
+
+  parser.add_argument('--video', type=str, dest='video', default=None, choices=REDUCTIONS, help='Also report the error rates at the video level, where the scores of the frames of each video are reduced into one score per system: mean, median, max, trimmed (trimmed mean) or vote (fraction of the frames above the threshold of the system; a system accepts a video if it accepts more than half of its frames)')
+
+  parser.add_argument('--trim', type=float, dest='trim', default=0.1, help='The fraction of the scores cut off at each end of each video for the trimmed mean (defaults to %(default)s)')
+
+  parser.add_argument('--cascade', action='store_true', dest='cascade', default=False, help='Also report the expected number of systems run and the expected cost of a sample for the cascades of the systems in all the orders')
+
+  parser.add_argument('-c', '--costs', type=float, dest='costs', default=None, help='The cost weight of each system for the cascades, face verification systems first (defaults to 1 for all the systems)', nargs='+')
+
+  parser.add_argument('-m', '--margin', type=float, dest='margins', default=None, help='The margin of each system (or one margin for all of them), face verification systems first: the cascades also stop after a score at least this far above or below the threshold of the system (defaults to stopping only when the fused decision is known)', nargs='+')
+
   parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
  
+  add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
  
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
   
   if len(args.as_threshold) != len(args.as_scoresdir) or len(args.fv_threshold) != len(args.fv_scoresdir): 
     raise ValueError("Thresholds must be specified for all the input score sets\n")
-  else:
-    as_thr = args.as_threshold[0] # multiple thresholds are still not supported
-    fv_thr = args.fv_threshold[0]
+  # the thresholds of the face verification systems come first, as their scores
+  thresholds = numpy.array(args.fv_threshold + args.as_threshold, 'float64')
+  for rule in args.rules: required_votes(rule, len(thresholds)) # checks the rules before reading the scores
+  if args.costs != None and len(args.costs) != len(thresholds):
+    raise ValueError("Cost weights must be specified for all the input score sets\n")
+  if args.margins != None and len(args.margins) not in (1, len(thresholds)):
+    raise ValueError("Margins must be specified for all the input score sets, or one margin for all of them\n")
 
   # read faceverif and antispoofing scores for all samples
-  devel_scores, devel_labels = gather_fvas_scores(database, 'devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
-  test_scores, test_labels = gather_fvas_scores(database, 'test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
+  # the anti-spoofing scores of the real accesses are shared by all the clients, and not copied for each of them
+  # the scores are read once, for the frame-level and for the video-level scores
+  query = ScoreQuery(database, workers=args.jobs)
+  devel_scores = query.broadcast('devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
+  test_scores = query.broadcast('test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
   
   # separate the scores of valid users, impostors and spoofing attacks
-  valid_devel_fv_scores = devel_scores[devel_labels == 1,0];   valid_devel_as_scores = devel_scores[devel_labels == 1,1]
-  valid_test_fv_scores = test_scores[test_labels == 1,0];   valid_test_as_scores = test_scores[test_labels == 1,1]
-  
-  impostors_devel_fv_scores = devel_scores[devel_labels == 0,0];   impostors_devel_as_scores = devel_scores[devel_labels == 0,1]
-  impostors_test_fv_scores = test_scores[test_labels == 0,0];   impostors_test_as_scores = test_scores[test_labels == 0,1]
-  
-  spoof_devel_fv_scores = devel_scores[devel_labels == -1,0];   spoof_devel_as_scores = devel_scores[devel_labels == -1,1]
-  spoof_test_fv_scores = test_scores[test_labels == -1,0];   spoof_test_as_scores = test_scores[test_labels == -1,1]
-  
-  # determine the wrongly classified samples by AND fusion system
-  devel_far_ind = [ind for ind in range(len(impostors_devel_fv_scores)) if impostors_devel_fv_scores[ind] > fv_thr and impostors_devel_as_scores[ind] > as_thr];
-  devel_frr_ind = [ind for ind in range(len(valid_devel_fv_scores)) if (valid_devel_fv_scores[ind] < fv_thr or valid_devel_as_scores[ind] < as_thr)];
-  devel_sfar_ind = [ind for ind in range(len(spoof_devel_fv_scores)) if spoof_devel_fv_scores[ind] > fv_thr and spoof_devel_as_scores[ind] > as_thr];
-    
-  test_far_ind = [ind for ind in range(len(impostors_test_fv_scores)) if impostors_test_fv_scores[ind] > fv_thr and impostors_test_as_scores[ind] > as_thr];
-  test_frr_ind = [ind for ind in range(len(valid_test_fv_scores)) if (valid_test_fv_scores[ind] < fv_thr or valid_test_as_scores[ind] < as_thr)];
-  test_sfar_ind = [ind for ind in range(len(spoof_test_fv_scores)) if spoof_test_fv_scores[ind] > fv_thr and spoof_test_as_scores[ind] > as_thr];  
-  
-  # calculate performance of AND fusion system
-  devel_far = len(devel_far_ind) / float(len(impostors_devel_fv_scores)); devel_frr = len(devel_frr_ind) / float(len(valid_devel_fv_scores)); devel_sfar = len(devel_sfar_ind) / float(len(spoof_devel_fv_scores)); 
-  test_far = len(test_far_ind) / float(len(impostors_test_fv_scores)); test_frr = len(test_frr_ind) / float(len(valid_test_fv_scores)); test_sfar = len(test_sfar_ind) / float(len(spoof_test_fv_scores)); 
-
-  # print results
-  sys.stdout.write("FV threshold: %f, AS threshold: %f\n" % (fv_thr, as_thr))
-  sys.stdout.write("----------------------------------------------------------\n")
-  sys.stdout.write("AND fused system results:\n")
-  sys.stdout.write("Devel: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (devel_far*100, devel_frr*100, devel_far*50 + devel_frr*50, devel_sfar*100))
-  sys.stdout.write("Test: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (test_far*100, test_frr*100, test_far*50 + test_frr*50, test_sfar*100))
+  valid_devel, impostors_devel, spoof_devel = split_fused_scores(devel_scores)
+  valid_test, impostors_test, spoof_test = split_fused_scores(test_scores)
+
+  if args.video != None:
+    # the scores of the frames of each video are reduced into one score per system
+    devel_video, devel_video_labels = query.videos('devel', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False, reduction=args.video, trim=args.trim, thresholds=thresholds)
+    test_video, test_video_labels = query.videos('test', args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False, reduction=args.video, trim=args.trim, thresholds=thresholds)
+    valid_devel_video, impostors_devel_video, spoof_devel_video = split_fused_scores(devel_video, devel_video_labels)
+    valid_test_video, impostors_test_video, spoof_test_video = split_fused_scores(test_video, test_video_labels)
+    video_thr = video_thresholds(thresholds, args.video)
+
+  # the names of the systems, in the order of their scores
+  names = [('FV%d' % (i+1) if len(args.fv_scoresdir) > 1 else 'FV') for i in range(len(args.fv_scoresdir))] + [('AS%d' % (i+1) if len(args.as_scoresdir) > 1 else 'AS') for i in range(len(args.as_scoresdir))]
+
+  sys.stdout.write("FV threshold: %s, AS threshold: %s\n" % (', '.join('%f' % t for t in args.fv_threshold), ', '.join('%f' % t for t in args.as_threshold)))
+
+  for rule in args.rules:
+    # calculate performance of the fused system
+    devel_far, devel_frr, devel_sfar = fused_decision_rates(valid_devel, impostors_devel, spoof_devel, thresholds, rule)
+    test_far, test_frr, test_sfar = fused_decision_rates(valid_test, impostors_test, spoof_test, thresholds, rule)
+
+    # print results
+    sys.stdout.write("----------------------------------------------------------\n")
+    sys.stdout.write("%s fused system results:\n" % rule_name(rule, len(thresholds)))
+    sys.stdout.write("Devel: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (devel_far*100, devel_frr*100, devel_far*50 + devel_frr*50, devel_sfar*100))
+    sys.stdout.write("Test: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (test_far*100, test_frr*100, test_far*50 + test_frr*50, test_sfar*100))
+
+    if args.cascade:
+      # the cost of the cascades depends on the order of the systems, and so do their error rates with margins
+      devel_cascade = CascadeSimulator(valid_devel, impostors_devel, spoof_devel, thresholds, rule, args.costs, args.margins)
+      test_cascade = CascadeSimulator(valid_test, impostors_test, spoof_test, thresholds, rule, args.costs, args.margins)
+      sys.stdout.write("%s cascades, from the cheapest on the development set:\n" % rule_name(rule, len(thresholds)))
+      for order, devel_eval in devel_cascade.ranking():
+        test_eval = test_cascade.evaluate(order)
+        sys.stdout.write("%s\n" % ' -> '.join(names[i] for i in order))
+        for name, cascade, evaluation in (('Devel', devel_cascade, devel_eval), ('Test', test_cascade, test_eval)):
+          far, frr, sfar = cascade.error_rates(order)
+          (real_runs, real_cost), (impostor_runs, impostor_cost), (attack_runs, attack_cost), (runs, cost) = evaluation
+          sys.stdout.write("  %s: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f, runs per sample=%.3f (real=%.3f, impostors=%.3f, attacks=%.3f), cost per sample=%.3f (real=%.3f, impostors=%.3f, attacks=%.3f)\n" % (name, far*100, frr*100, far*50 + frr*50, sfar*100, runs, real_runs, impostor_runs, attack_runs, cost, real_cost, impostor_cost, attack_cost))
+
+    if args.video != None:
+      devel_far, devel_frr, devel_sfar = fused_decision_rates(valid_devel_video, impostors_devel_video, spoof_devel_video, video_thr, rule)
+      test_far, test_frr, test_sfar = fused_decision_rates(valid_test_video, impostors_test_video, spoof_test_video, video_thr, rule)
+      sys.stdout.write("%s fused system results, video level (%s):\n" % (rule_name(rule, len(thresholds)), args.video))
+      sys.stdout.write("Devel: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (devel_far*100, devel_frr*100, devel_far*50 + devel_frr*50, devel_sfar*100))
+      sys.stdout.write("Test: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (test_far*100, test_frr*100, test_far*50 + test_frr*50, test_sfar*100))
   
 if __name__ == "__main__":
   main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+This script computes the error rates (FAR, FRR, SFAR) of the AND decision level fusion of a face verification and an anti-spoofing system for all the pairs of candidate thresholds of the two systems on the development set (all the unique development scores of each system, unless they are subsampled with --points). The pair of thresholds is then selected jointly, by minimizing a criterion on the development set (EER, HTER or weighted error rate), instead of determining the threshold of each system separately. The error rates for the selected pair of thresholds are reported on the development and test set.
+
+The criteria use the weighted FAR between the impostors and the spoofing attacks: FAR_w = (1-w) * FAR + w * SFAR. The EER criterion minimizes |FAR_w - FRR|, the HTER criterion minimizes (FAR_w + FRR) / 2 and the WER criterion minimizes beta * FAR_w + (1-beta) * FRR.
+
+NOTE: Only one face verification and one anti-spoofing system are supported.
+
+"""
+
+import os, sys
+import argparse
+import bob.io.base
+import numpy
+
+import antispoofing
+
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
+from antispoofing.fusion_faceverif.helpers.decision_fusion import split_decision_scores, decision_rates
+from antispoofing.fusion_faceverif.helpers.threshold_surface import CRITERIA, candidate_thresholds, ThresholdSurface
+
+
+def main():
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+  parser.add_argument('-s', '--fv-scores-dir', type=str, dest='fv_scoresdir', default='', help='Base directory containing the scores of the face verification algorithm (without the protocol dir)')
+
+  parser.add_argument('-a', '--as-scores-dir', type=str, dest='as_scoresdir', default='', help='Base directory containing the scores of the antispoofing algorithm')
+
+  parser.add_argument('-c', '--criterion', type=str, dest='criterion', default='eer', choices=CRITERIA, help='The criterion minimized on the development set to select the pair of thresholds (defaults to "%(default)s")')
+
+  parser.add_argument('-w', '--omega', type=float, dest='omega', default=0., help='The weight of the SFAR in the weighted FAR used by the criterion (defaults to %(default)s)')
+
+  parser.add_argument('-b', '--beta', type=float, dest='beta', default=0.5, help='The weight of the weighted FAR in the WER criterion (defaults to %(default)s)')
+
+  parser.add_argument('-p', '--points', type=int, dest='points', default=None, help='Subsample the candidate thresholds of each system to at most this number of development scores, evenly spaced in rank, so that the pair of thresholds is only optimal among the subsampled ones. Each surface holds one value per pair of thresholds, so this bounds its memory for very large sets (defaults to all the unique development scores, ie. the full grid)')
+
+  parser.add_argument('-o', '--output', type=str, dest='output', metavar='FILE', default=None, help='Save the thresholds and the error rates of the development and test set for all the pairs of thresholds into this HDF5 file')
+
+  parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
+
+  add_jobs_argument(parser)
+
+  #######
+  # Database especific configuration
+  #######
+  script_parser = add_database_arguments(parser)
+
+  args = parser.parse_args()
+
+  #######################
+  # Loading the database objects
+  #######################
+  database = open_database(args, script_parser)
+
+  # read faceverif and antispoofing scores for all samples
+  # the scores of the LICIT protocol of all the models of each subset are read once, and sliced for each client
+  query = ScoreQuery(database, workers=args.jobs)
+  devel_scores = query.broadcast('devel', [args.fv_scoresdir,], [args.as_scoresdir,], binary_labels=False, fv_protocol='both', normalize=False)
+  test_scores = query.broadcast('test', [args.fv_scoresdir,], [args.as_scoresdir,], binary_labels=False, fv_protocol='both', normalize=False)
+
+  # separate the scores of valid users, impostors and spoofing attacks
+  valid_devel, impostors_devel, spoof_devel = split_decision_scores(devel_scores)
+  valid_test, impostors_test, spoof_test = split_decision_scores(test_scores)
+
+  # error rates for all the pairs of candidate thresholds
+  fv_thresholds = candidate_thresholds([s[0] for s in (valid_devel, impostors_devel, spoof_devel)], args.points)
+  as_thresholds = candidate_thresholds([s[1] for s in (valid_devel, impostors_devel, spoof_devel)], args.points)
+  if args.verbose:
+    sys.stdout.write("Computing the error rates for %d x %d pairs of thresholds\n" % (len(fv_thresholds), len(as_thresholds)))
+  devel_surface = ThresholdSurface(valid_devel, impostors_devel, spoof_devel, fv_thresholds, as_thresholds)
+  fv_thr, as_thr = devel_surface.select(args.criterion, args.omega, args.beta)
+
+  # calculate performance of AND fusion system at the selected pair of thresholds
+  devel_far, devel_frr, devel_sfar = decision_rates(valid_devel, impostors_devel, spoof_devel, fv_thr, as_thr, rule='AND')
+  test_far, test_frr, test_sfar = decision_rates(valid_test, impostors_test, spoof_test, fv_thr, as_thr, rule='AND')
+
+  if args.output != None:
+    test_surface = ThresholdSurface(valid_test, impostors_test, spoof_test, fv_thresholds, as_thresholds)
+    f = bob.io.base.HDF5File(args.output, 'w')
+    devel_surface.save(f, 'devel_')
+    test_surface.save(f, 'test_', thresholds=False)
+    f.set('fv_threshold', fv_thr)
+    f.set('as_threshold', as_thr)
+    del f
+
+  # print results
+  sys.stdout.write("Criterion: %s (omega=%.2f, beta=%.2f)\n" % (args.criterion.upper(), args.omega, args.beta))
+  sys.stdout.write("FV threshold: %f, AS threshold: %f\n" % (fv_thr, as_thr))
+  sys.stdout.write("----------------------------------------------------------\n")
+  sys.stdout.write("AND fused system results:\n")
+  sys.stdout.write("Devel: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (devel_far*100, devel_frr*100, devel_far*50 + devel_frr*50, devel_sfar*100))
+  sys.stdout.write("Test: FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (test_far*100, test_frr*100, test_far*50 + test_frr*50, test_sfar*100))
+
+if __name__ == "__main__":
+  main()
@@ -14,13 +14,9 @@ import numpy
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import *
-
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.error_rates import ErrorRateIndex
+from antispoofing.utils.helpers import score_reader
 
 
 def read_as_data(real_files, attack_files, as_scoresdir):
@@ -39,14 +35,14 @@ def main():
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
  
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
 
   # read spoofing scores to determine anti-spoofing threshold
   real_devel, attack_devel = database.get_devel_data()
@@ -58,8 +54,8 @@ def main():
   as_thr = bob.measure.eer_threshold(attack_devel_as.flatten(), real_devel_as.flatten())
   
   # calculate antispoofing system performance
-  devel_far_as, devel_frr_as = bob.measure.farfrr(attack_devel_as.flatten(), real_devel_as.flatten(), as_thr)
-  test_far_as, test_frr_as = bob.measure.farfrr(attack_test_as.flatten(), real_test_as.flatten(), as_thr)
+  devel_far_as, devel_frr_as = ErrorRateIndex(attack_devel_as, real_devel_as).farfrr(as_thr)
+  test_far_as, test_frr_as = ErrorRateIndex(attack_test_as, real_test_as).farfrr(as_thr)
 
   sys.stdout.write("AS system results:\n")
   sys.stdout.write("AS threshold: %f\n" % (as_thr))
@@ -3,7 +3,7 @@
 #Sun 11 Oct 21:22:02 CEST 2015
 
 """
-This script converts scores which are saved as per Replay-Attack directory structure, into 4-column score files. Note that the input scores need to be separated by three classes: real accesses, zero-effort impostors and spoofing attacks. Can be used for face verification or anti-spoofing scores alike.
+This script converts scores which are saved as per Replay-Attack directory structure, into 4-column score files, with the claimed and the real identity of each sample. Note that the input scores need to be separated by three classes: real accesses, zero-effort impostors and spoofing attacks. Can be used for face verification or anti-spoofing scores alike.
 """
 
 import os, sys
@@ -13,15 +13,9 @@ import numpy
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import *
-
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
-
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers import fusion_utils
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
 
 
 def main():
@@ -31,28 +25,36 @@ def main():
   parser.add_argument('scoresdir', type=str, help='Base directory containing the scores of an antispoofing system (without the protocol dir)')
   parser.add_argument('outputdir', type=str, help='Output directory to save the 4-columns score files)')
  
+  add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
  
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
   
   #import ipdb; ipdb.set_trace()
   # read faceverif and antispoofing scores for all samples
 
+  # the scores of the LICIT protocol of all the models of each subset are read once, and sliced for each client
+  query = ScoreQuery(database, workers=args.jobs)
   subset_dict = {'devel':'dev', 'test':'eval'}
   for subset in ('devel', 'test'):
-    licit_scores, licit_labels, _ = gather_fvas_clsp_scores(database, subset, fv_dirs=[], as_dirs = (args.scoresdir,), binary_labels=False, fv_protocol='licit', normalize=False)
-    spoof_scores, spoof_labels, _ = gather_fvas_clsp_scores(database, subset, fv_dirs=[], as_dirs = (args.scoresdir,), binary_labels=False, fv_protocol='spoof', normalize=False)
+    licit_scores, licit_labels, _ = query.fvas(subset, fv_dirs=[], as_dirs = (args.scoresdir,), binary_labels=False, fv_protocol='licit', normalize=False, client_specific=True)
+    spoof_scores, spoof_labels, _ = query.fvas(subset, fv_dirs=[], as_dirs = (args.scoresdir,), binary_labels=False, fv_protocol='spoof', normalize=False, client_specific=True)
+
+    # the rows are saved with the claimed and the real identities and the test label of each sample, instead of dummy ones
+    licit_identities = query.identities(subset, fv_dirs=[], as_dirs = (args.scoresdir,), fv_protocol='licit', client_specific=True)
+    spoof_identities = query.identities(subset, fv_dirs=[], as_dirs = (args.scoresdir,), fv_protocol='spoof', client_specific=True)
 
-    fusion_utils.save_fused_scores(licit_scores, licit_labels, args.outputdir, protocol = 'licit', subset = subset_dict[subset])
-    fusion_utils.save_fused_scores(spoof_scores, spoof_labels, args.outputdir, protocol = 'spoof', subset = subset_dict[subset])
+    fusion_utils.save_fused_scores(licit_scores, licit_labels, args.outputdir, protocol = 'licit', subset = subset_dict[subset], identities = licit_identities)
+    fusion_utils.save_fused_scores(spoof_scores, spoof_labels, args.outputdir, protocol = 'spoof', subset = subset_dict[subset], identities = spoof_identities)
 
 if __name__ == "__main__":
   main()
@@ -14,17 +14,9 @@ import numpy
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import *
-
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
-
-
-
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
+from antispoofing.fusion_faceverif.helpers.error_rates import ErrorRateIndex
 
 
 def main():
@@ -33,21 +25,25 @@ def main():
 
   parser.add_argument('fv_scoresdir', type=str, help='Base directory containing the scores of a face verification algorithms (without the protocol dir)')
  
+  add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
  
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
   
   # read faceverif and antispoofing scores for all samples
-  devel_scores, devel_labels = gather_fvas_scores(database, 'devel', [args.fv_scoresdir,], as_dirs = None, binary_labels=False, fv_protocol='both', normalize=False)
-  test_scores, test_labels = gather_fvas_scores(database, 'test', [args.fv_scoresdir,], as_dirs = None, binary_labels=False, fv_protocol='both', normalize=False)
+  # the scores of the LICIT protocol of all the models of each subset are read once, and sliced for each client
+  query = ScoreQuery(database, workers=args.jobs)
+  devel_scores, devel_labels, _ = query.fvas('devel', [args.fv_scoresdir,], as_dirs = None, binary_labels=False, fv_protocol='both', normalize=False)
+  test_scores, test_labels, _ = query.fvas('test', [args.fv_scoresdir,], as_dirs = None, binary_labels=False, fv_protocol='both', normalize=False)
   
   # separate the scores of valid users, impostors and spoofing attacks
   valid_devel_fv_scores = devel_scores[devel_labels == 1,0];  
@@ -64,11 +60,8 @@ def main():
   #as_thr = bob.measure.eer_threshold(spoof_devel_as_scores, valid_devel_as_scores)   
   
   # calculate faceverif baseline performance
-  devel_far_fv, devel_frr_fv = bob.measure.farfrr(impostors_devel_fv_scores, valid_devel_fv_scores, fv_thr)
-  devel_sfar_fv, devel_frr_fv = bob.measure.farfrr(spoof_devel_fv_scores, valid_devel_fv_scores, fv_thr)
-  
-  test_far_fv, test_frr_fv = bob.measure.farfrr(impostors_test_fv_scores, valid_test_fv_scores, fv_thr)
-  test_sfar_fv, test_frr_fv = bob.measure.farfrr(spoof_test_fv_scores, valid_test_fv_scores, fv_thr)
+  devel_far_fv, devel_frr_fv, devel_sfar_fv = ErrorRateIndex(impostors_devel_fv_scores, valid_devel_fv_scores, spoof_devel_fv_scores).rates(fv_thr)
+  test_far_fv, test_frr_fv, test_sfar_fv = ErrorRateIndex(impostors_test_fv_scores, valid_test_fv_scores, spoof_test_fv_scores).rates(fv_thr)
   
   # print results
   sys.stdout.write("FV threshold: %f\n" % fv_thr)
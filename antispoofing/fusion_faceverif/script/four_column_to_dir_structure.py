@@ -4,37 +4,96 @@
 
 '''This script takes score files in 4-column format (which are output of FaceRecLib) and arranges the scores as in the directory structure of Replay-Attack'''
 
-import bob.io.video
 import numpy, os
 import sys
 
 import antispoofing
 
-from antispoofing.utils.db import *
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.frame_manifest import FrameCountManifest
+from antispoofing.fusion_faceverif.helpers.score_parser import load_score_file
 
 class Score:
+  """The scores of one model for a list of videos. Only the (frame_index, score) pairs given in the score file are kept, as the scores are usually computed only for some of the frames. The dense per-frame scores (nan for the frames without a score) are created only when saving"""
 
   def __init__(self, model):
     self.model = model
     self.total_keys = 0
     self.fileobjs = []
+    self.num_frames = {}
     self.scores_dict = {}
 
   def add_scorelist(self, fileobj, num_frames):
     self.fileobjs.append(fileobj)
-    scores = numpy.ndarray((num_frames, 1), dtype='float64') 
-    scores[:] = numpy.NAN
-    self.scores_dict[str(fileobj.make_path())] = scores
+    self.num_frames[str(fileobj.make_path())] = num_frames
+    self.scores_dict[str(fileobj.make_path())] = (numpy.ndarray((0,), 'int32'), numpy.ndarray((0,), 'float64'))
 
   def update_scorelist(self, fname, frame_index, score):
-    self.scores_dict[fname][frame_index-1] = score
+    """Sets the scores of the given frame(s) (starting from 1). frame_index and score can be single values or arrays"""
+    frames, scores = self.scores_dict[fname]
+    frame_index = numpy.asarray(frame_index, 'int32').ravel() - 1
+    if len(frame_index) and (frame_index.min() < 0 or frame_index.max() >= self.num_frames[fname]):
+      raise IndexError("Frame index out of range for file %s with %d frames" % (fname, self.num_frames[fname]))
+    self.scores_dict[fname] = (numpy.append(frames, frame_index), numpy.append(scores, numpy.broadcast_to(numpy.asarray(score, 'float64').ravel(), frame_index.shape)))
+
+  def dense_scores(self, fname):
+    """Returns the per-frame scores of a file as a (num_frames, 1) numpy.ndarray, with nan for the frames without a score"""
+    frames, scores = self.scores_dict[fname]
+    dense = numpy.ndarray((self.num_frames[fname], 1), dtype='float64')
+    dense[:] = numpy.nan
+    dense[frames, 0] = scores
+    return dense
 
   def save_score_files(self, output_dir, fv_protocol):
     for obj in self.fileobjs:
       if fv_protocol == 'licit': # licit face verification protocol, scores need to be saved in subdirectories with model ids
-        obj.save(self.scores_dict[str(obj.make_path())], os.path.join(output_dir, fv_protocol, 'client%03d' % int(self.model)))
+        obj.save(self.dense_scores(str(obj.make_path())), os.path.join(output_dir, fv_protocol, 'client%03d' % int(self.model)))
       else: # spoof face verification protocol
-        obj.save(self.scores_dict[str(obj.make_path())], os.path.join(output_dir, fv_protocol))
+        obj.save(self.dense_scores(str(obj.make_path())), os.path.join(output_dir, fv_protocol))
+
+
+def index_objects(objects):
+  """Returns a dictionary mapping the path (as returned by make_path()) of each database File object to the object itself"""
+
+  return dict((str(obj.make_path()), obj) for obj in objects)
+
+
+def ingest_four_column(parsed, index, frame_counts):
+  """Groups the scores of a FaceRecLib 4-column score file by model and video. The rows are grouped with a single sort over the parsed columns and the scores of each group are written at once. Returns a dictionary of Score objects indexed by the model ids.
+
+  @param parsed The ParsedScores object of the score file, as returned by load_score_file()
+  @param index Dictionary mapping the file paths to the database File objects, as returned by index_objects()
+  @param frame_counts FrameCountManifest giving the number of frames of each video
+  """
+
+  unknown = [stem for stem in parsed.stems if stem not in index]
+  if unknown: raise Exception("File " + unknown[0] + " not found in the database (%d unknown files in total)\n" % len(unknown))
+  if len(parsed) and parsed.frames.min() < 1: raise Exception("The test labels of the score file need to be in the format frame_index/file_stem\n")
+
+  # sort by (model, video) and find the boundaries of each group
+  order = numpy.lexsort((parsed.stem, parsed.claimed))
+  claimed = parsed.claimed[order]
+  stem = parsed.stem[order]
+  bounds = numpy.flatnonzero((claimed[1:] != claimed[:-1]) | (stem[1:] != stem[:-1])) + 1
+  starts = numpy.concatenate(([0], bounds))
+  ends = numpy.concatenate((bounds, [len(order)]))
+
+  models_dict = {}
+  for start, end in zip(starts, ends):
+    if start == end: continue
+    model = str(parsed.ids[claimed[start]]) # the claimed ID # was words[1] for UBMGMM, EBGM, LGBPHS
+    filestem = str(parsed.stems[stem[start]])
+    obj = index[filestem]
+
+    if model not in models_dict:
+      models_dict[model] = Score(model)
+
+    rows = order[start:end]
+    models_dict[model].add_scorelist(obj, frame_counts.number_of_frames(obj))
+    models_dict[model].update_scorelist(filestem, parsed.frames[rows], parsed.scores[rows])
+
+  sys.stdout.write("Processed %d lines for %d models\n" % (len(parsed), len(models_dict)))
+  return models_dict
 
 
 def main():
@@ -55,73 +114,46 @@ def main():
   
   parser.add_argument('-t', '--fv_protocol', metavar='fv_protocol', type=str, dest="fv_protocol", default='licit', help='Specifies whether the score file contains scores for the licit protocol or for spoofing attacks (defaults to "%(default)s")', choices=('licit','spoof'))
 
+  parser.add_argument('-m', '--frame-manifest', metavar='FILE', type=str, dest='frame_manifest', default=None, help='File caching the number of frames of each video, so that the videos are not opened on every conversion (defaults to "frame_counts.json" in the output directory)')
+
   parser.add_argument('-s', '--scoresubset', metavar='scoresubset', type=str, dest="scoresubset", default='devel', help='Specifies whether the score file contains scores for development (devel), test (eval) or train (train) set (defaults to "%(default)s")', choices=('devel','test', 'train'))
 
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
 
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
 
   name_conv_dict = {'licit':'real', 'spoof':'attack'}
 
+  if args.scoresubset == 'train':
+    real, attack = database.get_train_data()
+  elif args.scoresubset == 'devel':
+    real, attack = database.get_devel_data()
+  else:
+    real, attack = database.get_test_data()
+
   if args.fv_protocol == 'licit': # licit protocol, only real accesses are in play
-    if args.scoresubset == 'train':
-      objects = database.get_train_data()[0]
-    elif args.scoresubset == 'devel':
-      objects = database.get_devel_data()[0] 
-    else:
-      objects = database.get_test_data()[0]  
-      
+    objects = real
     #objects = db.objects(cls=name_conv_dict[args.fv_protocol], protocol=args.protocol, groups=args.scoresubset)
   else: # spoof protocol, we need real accesses + attacks
-    if args.scoresubset == 'train':
-      objects = database.get_train_data()[0] + database.get_train_data()[1]
-    elif args.scoresubset == 'devel':
-      objects = database.get_devel_data()[0] + database.get_devel_data()[1]
-    else:
-      objects = database.get_test_data()[0] + database.get_test_data()[1]
+    objects = real + attack
     #objects = db.objects(protocol=args.protocol, groups=args.scoresubset)
 
-  def find_object(fname, objects_list):
-    for obj in objects_list:
-      if str(obj.make_path()) == fname:
-        return obj
-    return None
-
-  models_dict = {} 
-
-  # load the 4 column file 
-  lines = file(args.infile).readlines()
-  line_counter = 0
-
-  for line in lines:
-    line_counter += 1
-    sys.stdout.write("Processing line [%d/%d] \n" % (line_counter, len(lines)))
-    words = line.split()
-    model = words[0] # the claimed ID # was words[1] for UBMGMM, EBGM, LGBPHS
-    sepind = words[2].find('/')
-    frame_index = int(words[2].split('/')[0])
-    filestem = words[2][sepind+1:len(words[2])]   
-  
-    obj = find_object(filestem, objects)
-    if obj == -1: raise Exception("File " + filestem + " not found in the database\n")
-
-    if models_dict.has_key(model) == False:
-      models_dict[model] = Score(model)
+  # build the path->File index once and group the parsed scores by model and video
+  index = index_objects(objects)
+  if args.frame_manifest is None:
+    args.frame_manifest = os.path.join(args.outputdir, 'frame_counts.json')
+  frame_counts = FrameCountManifest(args.frame_manifest, args.inputdir)
+  models_dict = ingest_four_column(load_score_file(args.infile), index, frame_counts)
+  frame_counts.save()
 
-    if models_dict[model].scores_dict.has_key(str(obj.make_path())) == False:
-      input = bob.io.video.reader(obj.videofile(args.inputdir)) # read the video to see the total number of frames it contains
-      models_dict[model].add_scorelist(obj, input.number_of_frames) 
-     
-    models_dict[model].update_scorelist(str(obj.make_path()), frame_index, words[3])  
-  
   for key, item in models_dict.items():
     item.save_score_files(os.path.join(args.outputdir), args.fv_protocol)
     
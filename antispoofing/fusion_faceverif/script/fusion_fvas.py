@@ -14,11 +14,12 @@ import string
 
 import antispoofing
 
-from antispoofing.fusion_faceverif.helpers import *
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion.score_fusion import *
+from antispoofing.fusion_faceverif.helpers import fusion_utils
+from antispoofing.fusion_faceverif.helpers.broadcast_scores import BroadcastScores
+from antispoofing.fusion_faceverif.helpers.fusion_cache import CACHEABLE_FUSIONS, fusion_cache_key, load_cached_fusion, save_cached_fusion
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.utils.ml import ScoreNormalization
+from antispoofing.fusion.score_fusion import LLRFusion, SVMFusion, GMMFusion, SUMFusion
 
 
 
@@ -44,19 +45,25 @@ def main():
   
   parser.add_argument('--sp', '--save_params', action='store_true', dest='save_params', default=False, help='Save the LLR machine and normalization parameters in the outputdir for future use')
 
+  parser.add_argument('--npz', action='store_true', dest='npz', default=False, help='Also save the fused scores in binary .npz files, which can be read by plot_on_demand.py without parsing the 4-column files')
+
+  parser.add_argument('--cache-dir', type=str, dest='cache_dir', default=None, help='Directory of the cache of the trained fusion machines. If set, a LLR, LLR_P or SVM machine trained on the same training scores with the same options is loaded from the cache instead of being trained again. The GMM fusion is always trained again, as its trained GMMs can not be saved and restored, and the SUM fusion has nothing to train')
+
   parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
  
+  fusion_utils.add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
 
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
 
   sys.stdout.write(args.fusionalg + " FUSION of ANTISPOOFING and FACEVERIFICATION systems!!! " + args.faceverif_protocol + " protocol\n")
   sys.stdout.write('---------------------------------------------------------\n')    
@@ -66,16 +73,41 @@ def main():
   else:
     pol_augment=False
 
-  # read the training data for LLR training and normalization purposes
+  # all the scores are read through the same query, so that each score file is read only once
+  query = fusion_utils.ScoreQuery(database, workers=args.jobs)
+
+  # read the raw training data once: the normalization parameters are computed on it, and the normalized data are used for training the fusion
   sys.stdout.write("Reading training scores...\n")
-  if args.clientspec == True:
-    all_train_pos, all_train_neg, score_norm = fusion_utils.organize_llrtraining_clsp_scores(database, args.fv_scoresdir, args.as_scoresdir, normalize=True, pol_augment=pol_augment)
+  all_train_scores, all_train_labels, _ = query.fvas('train', args.fv_scoresdir, args.as_scoresdir, binary_labels=True, fv_protocol='both', normalize=False, pol_augment=pol_augment, client_specific=args.clientspec)
+  score_norm = ScoreNormalization(all_train_scores) # shared by the training, devel and test data
+  all_train_scores = score_norm.calculateZNorm(all_train_scores)
+  all_train_pos = all_train_scores[all_train_labels == 1,:]
+  all_train_neg = all_train_scores[all_train_labels == 0,:]
+
+  # the fusion is trained once and applied to both devel and test data
+  if args.fusionalg == "LLR" or args.fusionalg == "LLR_P":
+    score_fusion = LLRFusion()
+  elif args.fusionalg == "SVM":
+    score_fusion = SVMFusion()
+  elif args.fusionalg == "GMM":
+    score_fusion = GMMFusion()
+  else: #SUM
+    score_fusion = SUMFusion() 
+
+  cached_fusion = None
+  if args.cache_dir != None and args.fusionalg in CACHEABLE_FUSIONS:
+    cache_key = fusion_cache_key(all_train_pos, all_train_neg, args.fusionalg, client_specific=args.clientspec)
+    cached_fusion = load_cached_fusion(args.cache_dir, cache_key, args.fusionalg, score_fusion)
+
+  if cached_fusion != None:
+    score_fusion = cached_fusion
+    sys.stdout.write("Loaded the trained fusion machine from the cache\n")
   else:
-    # this part needs to be edited, so that we have the same function for train, as well as for devel and test.
-    all_train_pos, all_train_neg = fusion_utils.organize_llrtraining_scores(database, args.fv_scoresdir, args.as_scoresdir, normalize=True, pol_augment=pol_augment)
-    all_train_scores_nonorm, all_train_labels_nonorm = fusion_utils.gather_fvas_scores(database, 'train', args.fv_scoresdir, args.as_scoresdir, normalize=False, pol_augment=pol_augment)
-    score_norm = ScoreNormalization(all_train_scores_nonorm)
-    sys.stdout.write("-------------------------------------\n")
+    sys.stdout.write("Training the fusion...\n")
+    score_fusion.train(trainer_scores = (all_train_pos, all_train_neg))
+    if args.cache_dir != None and args.fusionalg in CACHEABLE_FUSIONS:
+      save_cached_fusion(score_fusion.get_machine(), args.cache_dir, cache_key, args.fusionalg)
+  sys.stdout.write("-------------------------------------\n")
 
   # Process both devel and test data
   
@@ -83,31 +115,25 @@ def main():
   for subset in ('devel', 'test'):  
     sys.stdout.write("Processing " + string.upper(subset) + " scores, " +  args.faceverif_protocol + " protocol...\n")
     if args.clientspec == True:
-      all_scores, all_labels, _ = fusion_utils.gather_fvas_clsp_scores(database, subset, args.fv_scoresdir, args.as_scoresdir, binary_labels=True, fv_protocol=args.faceverif_protocol, normalize=True, score_norm = score_norm, pol_augment=pol_augment)
+      all_scores, all_labels, _ = query.fvas(subset, args.fv_scoresdir, args.as_scoresdir, binary_labels=True, fv_protocol=args.faceverif_protocol, normalize=True, score_norm = score_norm, pol_augment=pol_augment, client_specific=True)
+    elif pol_augment == True: # the polinomial augmentation mixes the face verification and anti-spoofing columns, so the full score matrix is needed
+      all_scores, all_labels, _ = query.fvas(subset, args.fv_scoresdir, args.as_scoresdir, binary_labels=True, fv_protocol=args.faceverif_protocol, normalize=True, score_norm = score_norm, pol_augment=pol_augment)
+    else: # the anti-spoofing scores of the real accesses are shared by all the clients, and the fusion is done client by client
+      all_scores = query.broadcast(subset, args.fv_scoresdir, args.as_scoresdir, binary_labels=True, fv_protocol=args.faceverif_protocol, normalize=True, score_norm = score_norm)
+      all_labels = all_scores.labels()
+
+    if isinstance(all_scores, BroadcastScores):
+      fused = all_scores.apply(score_fusion)
     else:
-      all_scores, all_labels = fusion_utils.gather_fvas_scores(database, subset, args.fv_scoresdir, args.as_scoresdir, binary_labels=True, fv_protocol=args.faceverif_protocol, normalize=True, score_norm = score_norm, pol_augment=pol_augment)
-
-    if args.fusionalg == "LLR" or args.fusionalg == "LLR_P":
-      score_fusion = LLRFusion()
-    elif args.fusionalg == "SVM":
-      score_fusion = SVMFusion()
-    elif args.fusionalg == "GMM":
-      score_fusion = GMMFusion()
-    else: #SUM
-      score_fusion = SUMFusion() 
-
-    score_fusion.train(trainer_scores = (all_train_pos, all_train_neg))
-    fused = score_fusion(all_scores)
+      fused = score_fusion(all_scores)
   
     if args.save_params == True:
       if args.fusionalg == "LLR" or args.fusionalg == "LLR_P" or args.fusionalg == "SVM":
         fusion_utils.save_fusion_machine(score_fusion.get_machine(), args.outputdir, protocol = args.faceverif_protocol, subset = subset_alias[subset])
-        fusion_utils.save_norm_params(ScoreNormalization(all_train_scores_nonorm), args.outputdir, protocol = args.faceverif_protocol, subset = subset_alias[subset])
-      else:
-        score_fusion = SUMFusion() 
-        fusion_utils.save_norm_params(score_norm, args.outputdir, protocol = args.faceverif_protocol, subset = subset_alias[subset])    
+      fusion_utils.save_norm_params(score_norm, args.outputdir, protocol = args.faceverif_protocol, subset = subset_alias[subset])
 
-    fusion_utils.save_fused_scores(fused, all_labels, args.outputdir, protocol = args.faceverif_protocol, subset = subset_alias[subset]) # save the scores in 4-column format
+    identities = query.identities(subset, args.fv_scoresdir, args.as_scoresdir, fv_protocol=args.faceverif_protocol, client_specific=args.clientspec)
+    fusion_utils.save_fused_scores(fused, all_labels, args.outputdir, protocol = args.faceverif_protocol, subset = subset_alias[subset], identities = identities, binary = args.npz) # save the scores in 4-column format
     sys.stdout.write('---------------------------------------------------------\n')    
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+This script measures the cold-start import time of the scripts of this package. Each script module is imported several times, each time in a new Python interpreter, and the minimum and the median import time are reported, together with the number of modules loaded by the import and whether matplotlib was loaded. The results can be appended to a CSV file, so that the start-up latency of the scripts can be tracked over time.
+
+"""
+
+import os, sys
+import argparse
+import subprocess
+import time
+import numpy
+
+# imports the module in a new interpreter and prints the import time, the number of loaded modules and whether matplotlib is loaded
+CHILD = "import sys, time, importlib; n = len(sys.modules); t = time.time(); importlib.import_module(%r); sys.stdout.write('%%f %%d %%d' %% (time.time() - t, len(sys.modules) - n, 'matplotlib' in sys.modules))"
+
+
+def script_modules():
+  """Returns the names of the modules of all the scripts of this package"""
+
+  scriptdir = os.path.dirname(os.path.realpath(__file__))
+  names = sorted(os.path.splitext(f)[0] for f in os.listdir(scriptdir) if f.endswith('.py') and f != '__init__.py')
+  return ['antispoofing.fusion_faceverif.script.' + n for n in names]
+
+
+def time_import(module, repeat):
+  """Imports a module repeat times, each time in a new interpreter. Returns the list of the import times in seconds, the number of loaded modules and whether matplotlib was loaded, or None and the error message if the import fails"""
+
+  times = []
+  for i in range(repeat):
+    p = subprocess.Popen([sys.executable, '-c', CHILD % module], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0:
+      return None, err.decode('utf-8', 'replace').strip().split('\n')[-1]
+    seconds, modules, matplotlib = out.decode('utf-8').split()
+    times.append(float(seconds))
+  return times, (int(modules), bool(int(matplotlib)))
+
+
+def main():
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+  parser.add_argument('modules', type=str, nargs='*', help='The modules to import (defaults to all the scripts of this package)')
+
+  parser.add_argument('-r', '--repeat', type=int, dest='repeat', default=5, help='The number of times each module is imported (defaults to %(default)s)')
+
+  parser.add_argument('-o', '--output', type=str, dest='output', metavar='FILE', default=None, help='Append the results to this CSV file')
+
+  args = parser.parse_args()
+
+  modules = args.modules or script_modules()
+  rows = []
+  sys.stdout.write("%-60s %10s %10s %8s %10s\n" % ('module', 'min (ms)', 'median (ms)', 'modules', 'matplotlib'))
+  for module in modules:
+    times, info = time_import(module, args.repeat)
+    if times is None:
+      sys.stdout.write("%-60s failed: %s\n" % (module, info))
+      continue
+    rows.append((module, min(times), numpy.median(times), info[0], info[1]))
+    sys.stdout.write("%-60s %10.1f %10.1f %8d %10s\n" % (module, min(times) * 1000, numpy.median(times) * 1000, info[0], 'yes' if info[1] else 'no'))
+
+  if args.output != None:
+    new_file = not os.path.exists(args.output)
+    f = open(args.output, 'a')
+    if new_file:
+      f.write("date,python,module,min_ms,median_ms,modules,matplotlib\n")
+    date = time.strftime('%Y-%m-%d %H:%M:%S')
+    python = '%d.%d.%d' % sys.version_info[:3]
+    for module, tmin, tmedian, num_modules, matplotlib in rows:
+      f.write("%s,%s,%s,%.3f,%.3f,%d,%d\n" % (date, python, module, tmin * 1000, tmedian * 1000, num_modules, matplotlib))
+    f.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+This script consolidates the per-video .hdf5 score files of a system, organized as in the directory structure of Replay-Attack, into one packed score file per protocol and subset. The packed files are saved in the score directory of the system and are used automatically by all the scripts reading scores from that directory, so that a whole subset is loaded with a single read instead of thousands of file opens.
+
+For face verification systems (and client-specific anti-spoofing systems), the scores of the LICIT protocol are packed into <scoresdir>/licit/<subset>.pack.npz and the ones of the SPOOF protocol into <scoresdir>/spoof/<subset>.pack.npz. For anti-spoofing systems, the scores are packed into <scoresdir>/<subset>.pack.npz.
+
+"""
+
+import os, sys
+import argparse
+
+import antispoofing
+
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.score_store import pack_scores
+
+
+def main():
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+  parser.add_argument('scoresdir', type=str, help='Base directory containing the scores of the system (without the protocol dir)')
+
+  parser.add_argument('-t', '--type', type=str, dest='systype', default='fv', choices=('fv', 'as'), help='Whether the scores are organized as for a face verification system, with "licit" and "spoof" subdirectories (fv), or as for an anti-spoofing system (as) (defaults to "%(default)s")')
+
+  parser.add_argument('-s', '--subsets', type=str, dest='subsets', default=('train', 'devel', 'test'), choices=('train', 'devel', 'test'), help='The subsets whose scores will be packed (defaults to all of them)', nargs='+')
+
+  #######
+  # Database especific configuration
+  #######
+  script_parser = add_database_arguments(parser)
+
+  args = parser.parse_args()
+
+  #######################
+  # Loading the database objects
+  #######################
+  database = open_database(args, script_parser)
+
+  for subset in args.subsets:
+    if subset == 'devel':
+      real, attack = database.get_devel_data()
+    elif subset == 'test':
+      real, attack = database.get_test_data()
+    else:
+      real, attack = database.get_train_data()
+
+    if args.systype == 'as':
+      filename = pack_scores(args.scoresdir, list(real) + list(attack), subset)
+      sys.stdout.write("Packed %s set: %s\n" % (subset, filename))
+    else:
+      clients = sorted(set(["client%03d" % x.get_client_id() for x in real]))
+      filename = pack_scores(args.scoresdir, real, subset, protocol='licit', clients=clients)
+      sys.stdout.write("Packed %s set, LICIT protocol: %s\n" % (subset, filename))
+      filename = pack_scores(args.scoresdir, list(real) + list(attack), subset, protocol='spoof')
+      sys.stdout.write("Packed %s set, SPOOF protocol: %s\n" % (subset, filename))
+
+if __name__ == "__main__":
+  main()
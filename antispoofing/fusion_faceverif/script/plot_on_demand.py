@@ -8,19 +8,17 @@
 
 import os
 import sys
-from matplotlib import rc
-rc('text',usetex=1)
-import matplotlib.pyplot as mpl
 import bob.measure
 import numpy as np
 import argparse
 
-import matplotlib.font_manager as fm
+from antispoofing.fusion_faceverif.helpers.score_parser import split_four_column
+from antispoofing.fusion_faceverif.helpers.error_rates import ErrorRateIndex
 
 def calc_pass_rate(threshold, attacks):
   """Calculates the rate of attacks that are after a certain threshold"""
 
-  return sum(1 for i in attacks if i >= threshold)/float(attacks.size)
+  return ErrorRateIndex(attacks=attacks).sfar(threshold)
 
 def main():
 
@@ -50,11 +48,15 @@ def main():
   else:
     report_text = "Min.HTER"
 
-  [base_neg, base_pos] = bob.measure.load.split_four_column(args.baseline_test)
-  [over_neg, over_pos] = bob.measure.load.split_four_column(args.overlay_test)
-  [base_neg_dev, base_pos_dev] = bob.measure.load.split_four_column(args.baseline_dev)
-  [over_neg_dev, over_pos_dev] = bob.measure.load.split_four_column(args.overlay_dev)
+  [base_neg, base_pos] = split_four_column(args.baseline_test)
+  [over_neg, over_pos] = split_four_column(args.overlay_test)
+  [base_neg_dev, base_pos_dev] = split_four_column(args.baseline_dev)
+  [over_neg_dev, over_pos_dev] = split_four_column(args.overlay_dev)
 
+  from matplotlib import rc
+  rc('text',usetex=1)
+  import matplotlib.pyplot as mpl
+  import matplotlib.font_manager as fm
   from matplotlib.backends.backend_pdf import PdfPages
 
   outdir = os.path.dirname(args.output)
@@ -267,7 +269,8 @@ def main():
       thres_baseline = bob.measure.eer_threshold(base_neg_dev, base_pos_dev)
     else:
       thres_baseline = bob.measure.min_hter_threshold(base_neg_dev, base_pos_dev)
-    pass_rate = calc_pass_rate(thres_baseline, over_neg)
+    attacks_index = ErrorRateIndex(attacks=over_neg) # the scores of the attacks are sorted once for all the thresholds
+    pass_rate = attacks_index.sfar(thres_baseline)
     #print "Attack Success Rate on %s: %.2f%%" % (report_text, 100.*pass_rate)
     
     threscolor = "green"
@@ -283,8 +286,7 @@ def main():
     ntick = 100
     step = (axlim[1] - axlim[0])/float(ntick)
     thres = [(k*step)+axlim[0] for k in range(ntick)]
-    mix_prob_y = []
-    for k in thres: mix_prob_y.append(100.*calc_pass_rate(k, over_neg))
+    mix_prob_y = 100. * attacks_index.sfar(thres)
 
     prob_ax = ax1.twinx() 
     mpl.plot(thres, mix_prob_y, color='green', label="SFAR", linewidth=3)
@@ -16,18 +16,11 @@ import string
 
 import antispoofing
 
-from antispoofing.utils.db import *
-from antispoofing.utils.ml import *
-from antispoofing.utils.helpers import *
-from antispoofing.fusion_faceverif.helpers import * 
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.utils.ml import ScoreNormalization
+from antispoofing.fusion_faceverif.helpers import fusion_utils
+from antispoofing.fusion_faceverif.helpers.augmentation import PolinomialAugmentation
 
-import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as mpl
-
-
-from matplotlib.lines import Line2D                
-import matplotlib.font_manager as fm
 
 def main():
 
@@ -55,20 +48,29 @@ def main():
 
   parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
 
+  fusion_utils.add_jobs_argument(parser)
+
   #######
   # Database especific configuration
   #######
-  Database.create_parser(parser, implements_any_of='video')
+  script_parser = add_database_arguments(parser)
 
   args = parser.parse_args()
   
   #ensure_dir(os.path.dirname(args.output))
 
+  # matplotlib is loaded only once the arguments are parsed
+  import matplotlib; matplotlib.use('pdf') #avoids TkInter threaded start
+  from matplotlib.backends.backend_pdf import PdfPages
+  import matplotlib.pyplot as mpl
+  from matplotlib.lines import Line2D                
+  import matplotlib.font_manager as fm
+
   pp = PdfPages(args.output) 
   #######################
   # Loading the database objects
   #######################
-  database = args.cls(args)
+  database = open_database(args, script_parser)
   
   # read normalization parameters
   
@@ -85,17 +87,19 @@ def main():
     normalize = False
 
   if args.fusion_alg == "LLR_P":
-    pol_augment=True
+    # the same feature map is applied to the scores and to the grid of the decision boundary
+    pol_augment=PolinomialAugmentation(len(args.fv_scoresdir) + len(args.as_scoresdir))
   else:
     pol_augment=False
 
-  import ipdb; ipdb.set_trace()
+  # all the scores are read through the same query, so that each score file is read only once
+  query = fusion_utils.ScoreQuery(database, workers=args.jobs)
   if normalize == True and score_norm == None:
     sys.stdout.write('Reading training data to compute normalization parameters')
     if args.clientspec == True:
-      all_train_scores_nonorm, all_train_labels_nonorm, _ = fusion_utils.gather_fvas_clsp_scores(database, 'train', args.fv_scoresdir, args.as_scoresdir, normalize=False, pol_augment=pol_augment)
+      all_train_scores_nonorm, all_train_labels_nonorm, _ = query.fvas('train', args.fv_scoresdir, args.as_scoresdir, normalize=False, pol_augment=pol_augment, client_specific=True)
     else:
-      all_train_scores_nonorm, all_train_labels_nonorm = fusion_utils.gather_fvas_scores(database, 'train', args.fv_scoresdir, args.as_scoresdir, normalize=False, pol_augment=pol_augment)
+      all_train_scores_nonorm, all_train_labels_nonorm, _ = query.fvas('train', args.fv_scoresdir, args.as_scoresdir, normalize=False, pol_augment=pol_augment)
     score_norm = ScoreNormalization(all_train_scores_nonorm)  
 
   groups_to_plot = ['devel',]# 'test']
@@ -103,10 +107,10 @@ def main():
     
     if args.clientspec == True:
       #all_scores, all_labels, score_norm = fusion_utils.gather_fvas_clsp_scores(database, group, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, normalize = normalize, score_norm = score_norm, pol_augment = pol_augment) 
-      all_scores, all_labels, _ = fusion_utils.gather_fvas_clsp_scores(database, group, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, normalize = False, pol_augment = pol_augment) 
+      all_scores, all_labels, _ = query.fvas(group, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, normalize = False, pol_augment = pol_augment, client_specific=True) 
     else:
       #all_scores, all_labels = fusion_utils.gather_fvas_scores(database, group, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, normalize = normalize, score_norm = score_norm, pol_augment = pol_augment) 
-      all_scores, all_labels = fusion_utils.gather_fvas_scores(database, group, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, normalize = False, pol_augment = pol_augment) 
+      all_scores, all_labels, _ = query.fvas(group, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, normalize = False, pol_augment = pol_augment) 
 
     all_scores = score_norm.calculateMinMaxNorm(all_scores)
 
@@ -176,7 +180,7 @@ def main():
 
         # Then, you pass your "fake" input set by the polynomial making function
         xy = score_norm.inverseZNorm(xy, (0,1)) ####!!! Why was I doing this step anyway???
-        xy = fusion_utils.polinomial_augmentation(xy)
+        xy = pol_augment(xy)
         xy = score_norm.calculateZNorm(xy)
         xy_res = llr_machine(xy)
 
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""
+This script evaluates how many frames the decision level fusion of face verification and anti-spoofing systems needs to see before it accepts or rejects an access. Each video is replayed frame by frame: after each frame, the fused decision (AND, OR, MAJORITY or k-of-n rule, with one threshold for each system) is taken on the average of the scores of the frames seen so far, or of the last frames with the option --window.
+
+By default, an access is granted as soon as the fused system accepts it, so that the FAR and the SFAR after t frames are the rates of the impostors and the spoofing attacks accepted at any of the first t frames, and the FRR is the rate of the real accesses not accepted yet. With --current-decision, the current decision after t frames is used instead. The frames to the first correct accept of the real accesses and the error rates as a function of the number of frames seen are reported on the development and test set.
+
+"""
+
+import os, sys
+import argparse
+import bob.io.base
+import numpy
+
+import antispoofing
+
+from antispoofing.fusion_faceverif.helpers.db_manifest import add_database_arguments, open_database
+from antispoofing.fusion_faceverif.helpers.fusion_utils import ScoreQuery, add_jobs_argument
+from antispoofing.fusion_faceverif.helpers.decision_fusion import required_votes, rule_name
+from antispoofing.fusion_faceverif.helpers.streaming import StreamingDecision, checkpoints
+
+
+def main():
+
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+  parser.add_argument('-s', '--fv-scores-dir', type=str, dest='fv_scoresdir', default='', help='Base directory containing the scores of one or more face verification algorithms (without the protocol dir)', nargs='+')
+
+  parser.add_argument('-a', '--as-scores-dir', type=str, dest='as_scoresdir', default='', help='Base directory containing the scores of one or more antispoofing algorithms', nargs='+')
+
+  parser.add_argument('--ft', '--fv-threshold', type=float, dest='fv_threshold', default=None, help='The face verification threshold', nargs='+')
+
+  parser.add_argument('--at', '--as-threshold', type=float, dest='as_threshold', default=None, help='The anti-spoofing threshold', nargs='+')
+
+  parser.add_argument('-r', '--rule', type=str, dest='rule', default='AND', help='The decision fusion rule: AND, OR, MAJORITY or the number k of systems which need to accept a sample (defaults to %(default)s)')
+
+  parser.add_argument('-w', '--window', type=int, dest='window', default=None, help='The number of the last valid frames whose scores are averaged for the decision (defaults to all the frames seen so far)')
+
+  parser.add_argument('--current-decision', action='store_true', dest='current_decision', default=False, help='Use the current decision after each number of frames seen, instead of accepting an access at its first accept')
+
+  parser.add_argument('-m', '--max-frames', type=int, dest='max_frames', default=None, help='The maximum number of frames seen (defaults to the length of the longest video)')
+
+  parser.add_argument('-o', '--output', type=str, dest='output', metavar='FILE', default=None, help='Save the error rates for each number of frames seen and the frames to the first accept of each video into this HDF5 file')
+
+  parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Increases this script verbosity')
+
+  add_jobs_argument(parser)
+
+  #######
+  # Database especific configuration
+  #######
+  script_parser = add_database_arguments(parser)
+
+  args = parser.parse_args()
+
+  #######################
+  # Loading the database objects
+  #######################
+  database = open_database(args, script_parser)
+
+  if len(args.as_threshold) != len(args.as_scoresdir) or len(args.fv_threshold) != len(args.fv_scoresdir):
+    raise ValueError("Thresholds must be specified for all the input score sets\n")
+  # the thresholds of the face verification systems come first, as their scores
+  thresholds = numpy.array(args.fv_threshold + args.as_threshold, 'float64')
+  required_votes(args.rule, len(thresholds)) # checks the rule
+  rule = rule_name(args.rule, len(thresholds))
+
+  # read the scores of the valid frames of each video, in order
+  query = ScoreQuery(database, workers=args.jobs)
+  streams = {}
+  for subset in ('devel', 'test'):
+    scores, labels = query.streams(subset, args.fv_scoresdir, args.as_scoresdir, binary_labels=False, fv_protocol='both', normalize=False)
+    streams[subset] = StreamingDecision(scores, labels, thresholds, args.rule, args.window)
+
+  max_frames = args.max_frames if args.max_frames != None else max(s.num_frames() for s in streams.values())
+  frames_seen = numpy.arange(1, max_frames + 1)
+  if args.verbose:
+    sys.stdout.write("Replaying the videos for up to %d frames\n" % max_frames)
+
+  curves = dict((subset, streams[subset].curves(frames_seen, early_accept=not args.current_decision)) for subset in streams)
+
+  if args.output != None:
+    f = bob.io.base.HDF5File(args.output, 'w')
+    f.set('frames', frames_seen)
+    for subset in ('devel', 'test'):
+      far, frr, sfar = curves[subset]
+      f.set('%s_far' % subset, far)
+      f.set('%s_frr' % subset, frr)
+      f.set('%s_sfar' % subset, sfar)
+      f.set('%s_first_accept' % subset, streams[subset].first_accept())
+      f.set('%s_labels' % subset, numpy.asarray(streams[subset].labels, 'int64'))
+    del f
+
+  # print results
+  sys.stdout.write("FV threshold: %s, AS threshold: %s\n" % (', '.join('%f' % t for t in args.fv_threshold), ', '.join('%f' % t for t in args.as_threshold)))
+  sys.stdout.write("%s fused system, %s, %s\n" % (rule, 'average of the last %d frames' % args.window if args.window != None else 'average of all the frames seen', 'current decision' if args.current_decision else 'accept at the first accept'))
+  for subset, name in (('devel', 'Devel'), ('test', 'Test')):
+    sys.stdout.write("----------------------------------------------------------\n")
+    latency, never = streams[subset].latency(label=1)
+    if len(latency):
+      sys.stdout.write("%s: frames to the first correct accept: mean=%.1f, median=%.1f, max=%d (never accepted: %.3f)\n" % (name, latency.mean(), numpy.median(latency), latency.max(), never*100))
+    else:
+      sys.stdout.write("%s: no real access is ever accepted\n" % name)
+    far, frr, sfar = curves[subset]
+    for t in checkpoints(max_frames):
+      sys.stdout.write("%s: frames=%d, FAR=%.3f, FRR=%.3f, HTER=%.3f, SFAR=%.3f\n" % (name, t, far[t-1]*100, frr[t-1]*100, far[t-1]*50 + frr[t-1]*50, sfar[t-1]*100))
+
+if __name__ == "__main__":
+  main()
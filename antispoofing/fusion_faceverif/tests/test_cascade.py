@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+'''Tests of the cascade simulation against a cascade run sample by sample'''
+
+import itertools
+import unittest
+import numpy
+
+from antispoofing.fusion_faceverif.helpers.decision_fusion import required_votes, fused_decisions, fused_decision_rates
+from antispoofing.fusion_faceverif.helpers.cascade import cascade_decisions, cascade_cost, CascadeSimulator
+
+
+def _cascade(row, thresholds, order, k, margins=None):
+  """Runs the systems on one sample in the given order, until the fused decision is known or, with margins, until a clear accept or reject. Returns the number of systems run and whether the sample was accepted and rejected"""
+
+  num_systems = len(row)
+  votes_for = votes_against = 0
+  for run, j in enumerate(order):
+    remaining = num_systems - run - 1
+    if row[j] > thresholds[j]: votes_for += 1
+    elif row[j] < thresholds[j]: votes_against += 1
+    if votes_for >= k: return run + 1, True, False
+    if votes_against > num_systems - k: return run + 1, False, True
+    if margins is not None:
+      if row[j] > thresholds[j] and row[j] - thresholds[j] >= margins[j] and votes_for + remaining >= k: return run + 1, True, False
+      if row[j] < thresholds[j] and thresholds[j] - row[j] >= margins[j] and votes_against + remaining > num_systems - k: return run + 1, False, True
+  return num_systems, False, False
+
+
+class CascadeTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = numpy.random.RandomState(0)
+
+  def scores(self, n, num_systems):
+    scores = numpy.round(self.rng.randn(n, num_systems), 1)
+    scores[self.rng.rand(n, num_systems) < 0.1] = numpy.nan
+    return scores
+
+  def test_decisions(self):
+    for num_systems in (1, 2, 3):
+      scores = self.scores(150, num_systems)
+      thresholds = numpy.round(self.rng.randn(num_systems) * 0.3, 1)
+      margins = numpy.round(self.rng.rand(num_systems), 1)
+      for rule in ['AND', 'OR', 'MAJORITY'] + list(range(1, num_systems + 1)):
+        k = required_votes(rule, num_systems)
+        fused = fused_decisions(scores, thresholds, rule)
+        for order in itertools.permutations(range(num_systems)):
+          for m in (None, margins):
+            expected = numpy.array([_cascade(row, thresholds, order, k, m) for row in scores])
+            invocations, accepted, rejected = cascade_decisions(scores, thresholds, order, rule, m)
+            numpy.testing.assert_array_equal(invocations, expected[:,0])
+            numpy.testing.assert_array_equal(accepted, expected[:,1].astype('bool'))
+            numpy.testing.assert_array_equal(rejected, expected[:,2].astype('bool'))
+          # without margins, the cascade is lossless: its decisions are the fused ones, whatever the order
+          lossless = cascade_decisions(scores, thresholds, order, rule)
+          numpy.testing.assert_array_equal(lossless[1], fused[0])
+          numpy.testing.assert_array_equal(lossless[2], fused[1])
+          # infinite margins never give a clear decision, and the margins only save runs
+          numpy.testing.assert_array_equal(cascade_decisions(scores, thresholds, order, rule, numpy.inf)[0], lossless[0])
+          self.assertTrue((cascade_decisions(scores, thresholds, order, rule, margins)[0] <= lossless[0]).all())
+
+  def test_cost(self):
+    scores = self.scores(100, 3)
+    thresholds = numpy.array([0., 0.2, -0.1]); costs = numpy.array([1., 5., 2.])
+    for order in itertools.permutations(range(3)):
+      invocations = numpy.array([_cascade(row, thresholds, order, 3)[0] for row in scores])
+      expected = numpy.mean([costs[list(order[:i])].sum() for i in invocations])
+      mean_invocations, mean_cost = cascade_cost(scores, thresholds, order, 'AND', costs)
+      self.assertAlmostEqual(mean_invocations, invocations.mean())
+      self.assertAlmostEqual(mean_cost, expected)
+    self.assertTrue(numpy.isnan(cascade_cost(numpy.ndarray((0, 3)), thresholds, (0, 1, 2))[0]))
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, cascade_decisions, numpy.zeros((2, 3)), [0., 0., 0.], (0, 1, 1))
+    self.assertRaises(ValueError, cascade_decisions, numpy.zeros((2, 2)), [0., 0.], (0, 1), 'AND', -1.)
+
+
+class CascadeSimulatorTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(1)
+    self.sets = [numpy.round(rng.randn(n, 3) + mean, 1) for n, mean in ((100, 1), (120, -1), (80, 0.5))]
+    self.thresholds = numpy.array([0., 0.1, -0.2])
+
+  def test_error_rates(self):
+    valid, impostors, attacks = self.sets
+    for rule in ('AND', 'OR', 'MAJORITY'):
+      lossless = CascadeSimulator(valid, impostors, attacks, self.thresholds, rule)
+      fused = fused_decision_rates(valid, impostors, attacks, self.thresholds, rule)
+      self.assertEqual(lossless.error_rates(), fused)
+      with_margins = CascadeSimulator(valid, impostors, attacks, self.thresholds, rule, margins=0.5)
+      self.assertRaises(ValueError, with_margins.error_rates)
+      k = required_votes(rule, 3)
+      for order in with_margins.orders():
+        self.assertEqual(lossless.error_rates(order), fused)
+        expected = [numpy.array([_cascade(row, self.thresholds, order, k, [0.5] * 3) for row in s]) for s in self.sets]
+        self.assertEqual(with_margins.error_rates(order), (expected[1][:,1].mean(), expected[0][:,2].mean(), expected[2][:,1].mean()))
+
+  def test_ranking(self):
+    simulator = CascadeSimulator(self.sets[0], self.sets[1], self.sets[2], self.thresholds, 'AND', costs=[1., 5., 2.])
+    self.assertEqual(len(simulator.orders()), 6)
+    ranking = simulator.ranking()
+    self.assertEqual(sorted(order for order, _ in ranking), simulator.orders())
+    costs = [evaluation[-1][1] for _, evaluation in ranking]
+    self.assertEqual(costs, sorted(costs))
+    for order, evaluation in ranking:
+      num_samples = sum(len(s) for s in self.sets)
+      expected = sum(cascade_cost(s, self.thresholds, order, 'AND', [1., 5., 2.])[1] * len(s) for s in self.sets) / num_samples
+      self.assertAlmostEqual(evaluation[-1][1], expected)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, CascadeSimulator, self.sets[0], self.sets[1], self.sets[2], self.thresholds, 'AND', costs=[1., 2.])
+    self.assertRaises(ValueError, CascadeSimulator, self.sets[0], self.sets[1], self.sets[2], self.thresholds, 'AND', margins=[1., 2.])
+    self.assertRaises(ValueError, CascadeSimulator, self.sets[0], self.sets[1], self.sets[2], self.thresholds, 4)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+'''Tests of the vectorized decision fusion against the per-sample decisions'''
+
+import unittest
+import numpy
+
+from antispoofing.fusion_faceverif.helpers.decision_fusion import decision_rates, accept_rate, reject_rate, required_votes, rule_name, fused_accept_rate, fused_reject_rate, fused_decisions, fused_decision_rates
+
+
+def _pairs(rng, n, mean, nan_rate=0.05):
+  """Returns (face verification, anti-spoofing) scores of n samples, rounded so that some of them are equal to the thresholds"""
+
+  fv_scores = numpy.round(rng.randn(n) + mean, 1)
+  as_scores = numpy.round(rng.randn(n) + mean, 1)
+  fv_scores[rng.rand(n) < nan_rate] = numpy.nan
+  as_scores[rng.rand(n) < nan_rate] = numpy.nan
+  return fv_scores, as_scores
+
+
+def _and_rates(valid, impostors, attacks, fv_thr, as_thr):
+  """The error rates of the AND decision, as and_decision_fusion.py computed them sample by sample"""
+
+  far = [i for i in range(len(impostors[0])) if impostors[0][i] > fv_thr and impostors[1][i] > as_thr]
+  frr = [i for i in range(len(valid[0])) if (valid[0][i] < fv_thr or valid[1][i] < as_thr)]
+  sfar = [i for i in range(len(attacks[0])) if attacks[0][i] > fv_thr and attacks[1][i] > as_thr]
+  return len(far) / float(len(impostors[0])), len(frr) / float(len(valid[0])), len(sfar) / float(len(attacks[0]))
+
+
+def _decision(row, thresholds, k, inclusive=False):
+  """The fused decision of one sample: accepted if at least k systems accept it, rejected if more than n-k systems reject it"""
+
+  votes_for = votes_against = 0
+  for score, threshold in zip(row, thresholds):
+    if score > threshold or (inclusive and score == threshold): votes_for += 1
+    elif score < threshold: votes_against += 1
+  return votes_for >= k, votes_against > len(row) - k
+
+
+class AndDecisionTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(0)
+    self.valid = _pairs(rng, 300, 1)
+    self.impostors = _pairs(rng, 400, -1)
+    self.attacks = _pairs(rng, 200, 0.5)
+    self.fv_thr = numpy.round(numpy.linspace(-2, 2, 21), 1)
+    self.as_thr = numpy.round(numpy.linspace(-1.5, 1.5, 16), 1)
+
+  def test_single_thresholds(self):
+    for fv_thr, as_thr in ((0, 0), (0.5, -0.3), (-0.1, 1.2), (numpy.inf, 0)):
+      self.assertEqual(decision_rates(self.valid, self.impostors, self.attacks, fv_thr, as_thr), _and_rates(self.valid, self.impostors, self.attacks, fv_thr, as_thr))
+
+  def test_threshold_grid(self):
+    far, frr, sfar = decision_rates(self.valid, self.impostors, self.attacks, self.fv_thr[:,None], self.as_thr[None,:])
+    self.assertEqual(far.shape, (len(self.fv_thr), len(self.as_thr)))
+    for i, fv_thr in enumerate(self.fv_thr):
+      for j, as_thr in enumerate(self.as_thr):
+        self.assertEqual((far[i,j], frr[i,j], sfar[i,j]), _and_rates(self.valid, self.impostors, self.attacks, fv_thr, as_thr))
+
+  def test_strict_accept(self):
+    # a score equal to the threshold neither accepts nor rejects the sample
+    fv_scores = numpy.array([0., 1., 1., 2.]); as_scores = numpy.array([1., 0., 1., 2.])
+    self.assertEqual(accept_rate(fv_scores, as_scores, 1., 1.), 0.25)
+    self.assertEqual(reject_rate(fv_scores, as_scores, 1., 1.), 0.5)
+    self.assertEqual(accept_rate(fv_scores, as_scores, 1., 1., rule='OR'), 0.25)
+    self.assertEqual(reject_rate(fv_scores, as_scores, 1., 1., rule='OR'), 0.)
+
+  def test_nan(self):
+    # a sample with a nan score is counted, but can only be rejected by the other system
+    fv_scores = numpy.array([numpy.nan, numpy.nan, 2., 2.]); as_scores = numpy.array([2., 0., numpy.nan, 2.])
+    self.assertEqual(accept_rate(fv_scores, as_scores, 1., 1.), 0.25)
+    self.assertEqual(reject_rate(fv_scores, as_scores, 1., 1.), 0.25)
+
+  def test_mismatch(self):
+    self.assertRaises(ValueError, accept_rate, numpy.zeros(3), numpy.zeros(4), 0., 0.)
+
+
+class FusedDecisionTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = numpy.random.RandomState(1)
+
+  def scores(self, n, num_systems):
+    scores = numpy.round(self.rng.randn(n, num_systems), 1)
+    scores[self.rng.rand(n, num_systems) < 0.1] = numpy.nan
+    return scores
+
+  def test_required_votes(self):
+    self.assertEqual([required_votes(r, 4) for r in ('AND', 'or', 'Majority', 2, '3')], [4, 1, 3, 2, 3])
+    self.assertEqual(required_votes('MAJORITY', 3), 2)
+    self.assertEqual((rule_name('and', 3), rule_name('2', 3)), ('AND', '2-of-3'))
+    for rule in ('XOR', 0, 5):
+      self.assertRaises(ValueError, required_votes, rule, 4)
+
+  def test_decisions(self):
+    for num_systems in (1, 2, 3, 4):
+      scores = self.scores(200, num_systems)
+      thresholds = numpy.round(self.rng.randn(num_systems) * 0.3, 1)
+      for rule in ['AND', 'OR', 'MAJORITY'] + list(range(1, num_systems + 1)):
+        k = required_votes(rule, num_systems)
+        for inclusive in (False, True):
+          expected = numpy.array([_decision(row, thresholds, k, inclusive) for row in scores])
+          accepted, rejected = fused_decisions(scores, thresholds, rule, inclusive)
+          numpy.testing.assert_array_equal(accepted, expected[:,0])
+          numpy.testing.assert_array_equal(rejected, expected[:,1])
+          self.assertEqual(fused_accept_rate(scores, thresholds, rule, inclusive), expected[:,0].mean())
+          self.assertEqual(fused_reject_rate(scores, thresholds, rule), expected[:,1].mean())
+          # a sample can not be both accepted and rejected
+          self.assertFalse((accepted & rejected).any())
+
+  def test_inclusive(self):
+    scores = numpy.array([[1., 2.], [1., 0.], [2., 2.]])
+    self.assertEqual(fused_accept_rate(scores, [1., 1.]), 1. / 3)
+    self.assertEqual(fused_accept_rate(scores, [1., 1.], inclusive=True), 2. / 3)
+    # the scores equal to the threshold are not rejected
+    self.assertEqual(fused_reject_rate(scores, [1., 1.]), 1. / 3)
+
+  def test_batch(self):
+    valid, impostors, attacks = self.scores(100, 3), self.scores(150, 3), self.scores(80, 3)
+    thresholds = numpy.round(self.rng.randn(4, 5, 3) * 0.5, 1)
+    for rule in ('AND', 'OR', 'MAJORITY'):
+      far, frr, sfar = fused_decision_rates(valid, impostors, attacks, thresholds, rule, inclusive=True)
+      self.assertEqual(far.shape, (4, 5))
+      for i in range(4):
+        for j in range(5):
+          self.assertEqual((far[i,j], frr[i,j], sfar[i,j]), fused_decision_rates(valid, impostors, attacks, thresholds[i,j], rule, inclusive=True))
+          accepted, _ = fused_decisions(attacks, thresholds[i,j], rule, inclusive=True)
+          self.assertEqual(sfar[i,j], accepted.mean())
+
+  def test_two_systems(self):
+    # the fusion of any number of systems gives the error rates of the face verification and anti-spoofing pair
+    rng = numpy.random.RandomState(2)
+    valid, impostors, attacks = _pairs(rng, 100, 1), _pairs(rng, 100, -1), _pairs(rng, 100, 0.5)
+    for rule in ('AND', 'OR'):
+      self.assertEqual(fused_decision_rates(numpy.column_stack(valid), numpy.column_stack(impostors), numpy.column_stack(attacks), [0.2, -0.1], rule), decision_rates(valid, impostors, attacks, 0.2, -0.1, rule))
+
+  def test_empty(self):
+    self.assertTrue(numpy.isnan(fused_accept_rate(numpy.ndarray((0, 2)), [0., 0.])))
+    self.assertRaises(ValueError, fused_accept_rate, numpy.zeros((3, 2)), [0., 0., 0.])
+
+
+if __name__ == '__main__':
+  unittest.main()
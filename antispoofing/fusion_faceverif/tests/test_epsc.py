@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+'''Tests of the batched EPSC evaluation against the per-threshold decisions'''
+
+import unittest
+import numpy
+
+from antispoofing.fusion_faceverif.helpers import epsc
+from antispoofing.fusion_faceverif.helpers.epsc import AndEPSC, fused_epsc_rates, epsc_error_rates
+from antispoofing.fusion_faceverif.helpers.decision_fusion import fused_decision_rates
+
+
+def _pairs(rng, n, mean, nan_rate=0.05):
+  """Returns (face verification, anti-spoofing) scores of n samples, rounded so that some of them are equal to the thresholds"""
+
+  fv_scores = numpy.round(rng.randn(n) + mean, 1)
+  as_scores = numpy.round(rng.randn(n) + mean, 1)
+  fv_scores[rng.rand(n) < nan_rate] = numpy.nan
+  as_scores[rng.rand(n) < nan_rate] = numpy.nan
+  return fv_scores, as_scores
+
+
+def _and_rates(valid, impostors, attacks, fv_thr, as_thr):
+  """The error rates of the AND decision for each pair of thresholds, as and_decision_epsc_cs.py computed them one pair at a time"""
+
+  far = []; frr = []; sfar = []
+  for i in range(len(fv_thr)):
+    fa = numpy.logical_and(impostors[0] >= fv_thr[i], impostors[1] >= as_thr[i])
+    sfa = numpy.logical_and(attacks[0] >= fv_thr[i], attacks[1] >= as_thr[i])
+    fr = numpy.logical_or(valid[0] < fv_thr[i], valid[1] < as_thr[i])
+    far.append(sum(fa) / float(len(fa))); frr.append(sum(fr) / float(len(fr))); sfar.append(sum(sfa) / float(len(sfa)))
+  return numpy.array(far), numpy.array(frr), numpy.array(sfar)
+
+
+class AndEPSCTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(0)
+    self.valid = _pairs(rng, 300, 1)
+    self.impostors = _pairs(rng, 400, -1)
+    self.attacks = _pairs(rng, 200, 0.5)
+    self.fv_thr = numpy.round(rng.randn(51), 1)
+    self.as_thr = numpy.round(rng.randn(51), 1)
+
+  def tearDown(self):
+    epsc.CHUNK_SIZE = 2**22
+
+  def test_rates(self):
+    expected = _and_rates(self.valid, self.impostors, self.attacks, self.fv_thr, self.as_thr)
+    rates = AndEPSC(self.valid, self.impostors, self.attacks)
+    # the thresholds are processed in chunks of any size
+    for chunk_size in (2**22, 1000, 1):
+      epsc.CHUNK_SIZE = chunk_size
+      for result, reference in zip(rates.rates(self.fv_thr, self.as_thr), expected):
+        numpy.testing.assert_array_equal(result, reference)
+    self.assertEqual(rates.rates(self.fv_thr[3], self.as_thr[3]), tuple(e[3] for e in expected))
+
+  def test_inclusive(self):
+    # unlike and_decision_fusion.py, a score equal to the threshold is accepted along the EPSC
+    rates = AndEPSC((numpy.array([1., 2.]), numpy.array([1., 0.])), (numpy.array([1.]), numpy.array([1.])), (numpy.array([2.]), numpy.array([0.5])))
+    self.assertEqual(rates.rates(1., 1.), (1., 0.5, 0.))
+
+  def test_broadcast(self):
+    rates = AndEPSC(self.valid, self.impostors, self.attacks)
+    far, frr, sfar = rates.rates(self.fv_thr[:5,None], self.as_thr[None,:7])
+    self.assertEqual(far.shape, (5, 7))
+    for i in range(5):
+      expected = _and_rates(self.valid, self.impostors, self.attacks, numpy.repeat(self.fv_thr[i], 7), self.as_thr[:7])
+      numpy.testing.assert_array_equal(far[i], expected[0])
+      numpy.testing.assert_array_equal(frr[i], expected[1])
+      numpy.testing.assert_array_equal(sfar[i], expected[2])
+
+  def test_system_rates(self):
+    rates = AndEPSC(self.valid, self.impostors, self.attacks)
+    for column, thresholds in ((0, self.fv_thr), (1, self.as_thr)):
+      far, frr, sfar = rates.system_rates(thresholds, column)
+      numpy.testing.assert_array_equal(far, (self.impostors[column][None,:] >= thresholds[:,None]).sum(axis=1) / float(len(self.impostors[column])))
+      numpy.testing.assert_array_equal(frr, (self.valid[column][None,:] < thresholds[:,None]).sum(axis=1) / float(len(self.valid[column])))
+      numpy.testing.assert_array_equal(sfar, (self.attacks[column][None,:] >= thresholds[:,None]).sum(axis=1) / float(len(self.attacks[column])))
+
+  def test_fused_epsc_rates(self):
+    valid, impostors, attacks = [numpy.column_stack(s) for s in (self.valid, self.impostors, self.attacks)]
+    thresholds = numpy.column_stack((self.fv_thr, self.as_thr))
+    expected = _and_rates(self.valid, self.impostors, self.attacks, self.fv_thr, self.as_thr)
+    for rule in ('AND', 2, '2'):
+      for result, reference in zip(fused_epsc_rates(valid, impostors, attacks, thresholds, rule), expected):
+        numpy.testing.assert_array_equal(result, reference)
+    # the other rules accept the scores equal to the thresholds too
+    for rule in ('OR', 1):
+      for result, reference in zip(fused_epsc_rates(valid, impostors, attacks, thresholds, rule), fused_decision_rates(valid, impostors, attacks, thresholds, rule, inclusive=True)):
+        numpy.testing.assert_array_equal(result, reference)
+    far = fused_epsc_rates(valid, impostors, attacks, thresholds, 'OR')[0]
+    numpy.testing.assert_array_equal(far, [numpy.logical_or(self.impostors[0] >= f, self.impostors[1] >= a).mean() for f, a in thresholds])
+
+  def test_empty(self):
+    rates = AndEPSC((numpy.ndarray((0,)), numpy.ndarray((0,))), self.impostors, self.attacks)
+    self.assertTrue(numpy.isnan(rates.rates(self.fv_thr, self.as_thr)[1]).all())
+    self.assertRaises(ValueError, AndEPSC, (numpy.zeros(3), numpy.zeros(2)), self.impostors, self.attacks)
+
+
+class EPSCErrorRatesTest(unittest.TestCase):
+
+  def test_weighted_rates(self):
+    far = numpy.array([0.1, 0.2, 0.3]); frr = numpy.array([0.05, 0.1, 0.2]); sfar = numpy.array([0.5, 0.4, 0.3])
+    omega = numpy.array([0., 0.5, 1.])
+    far_w, hter_w = epsc_error_rates(far, frr, sfar, omega)
+    numpy.testing.assert_allclose(far_w, [0.1, 0.3, 0.3])
+    numpy.testing.assert_allclose(hter_w, [0.075, 0.2, 0.25])
+    _, wer_w = epsc_error_rates(far, frr, sfar, omega, beta=0.2)
+    numpy.testing.assert_allclose(wer_w, 0.2 * far_w + 0.8 * frr)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+'''Tests of the score gathering of ScoreQuery on a manifest database, against the per-file loops of the original gather_* functions'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+try:
+  import bob.io.base
+  from antispoofing.fusion_faceverif.helpers import fusion_utils
+except ImportError: # the score files are read and written with bob
+  fusion_utils = None
+
+from antispoofing.fusion_faceverif.helpers.db_manifest import ManifestFile, ManifestDatabase
+
+PROTOCOLS = ('licit', 'spoof', 'both')
+
+
+def _client(f):
+  return "client%03d" % f.get_client_id()
+
+
+def _make_database(num_clients=3, num_real=2, num_attack=2):
+  """Returns a ManifestDatabase with the same organization of the files as Replay-Attack"""
+
+  subsets = {}
+  for subset in ('train', 'devel', 'test'):
+    real = [ManifestFile('%s/real/client%03d_session%d' % (subset, c, i), c, True) for c in range(1, num_clients+1) for i in range(num_real)]
+    attack = [ManifestFile('%s/attack/fixed/attack_client%03d_%d' % (subset, c, i), c, False) for c in range(1, num_clients+1) for i in range(num_attack)]
+    subsets[subset] = (real, attack)
+  return ManifestDatabase(subsets)
+
+
+def _make_scores(database, root, rng):
+  """Saves random per-frame scores with nan (invalid) frames for all the files of the database: two systems organized as face verification systems ('fv' and 'fv2', which can also be used as a client-specific anti-spoofing system) and one anti-spoofing system ('as'). The scores are saved as rows, columns or flat arrays, as the different systems do"""
+
+  def frames(n):
+    scores = rng.randn(n)
+    scores[rng.rand(n) < 0.3] = numpy.nan
+    return scores
+
+  for subset in ('train', 'devel', 'test'):
+    real, attack = getattr(database, 'get_%s_data' % subset)()
+    clients = sorted(set([_client(f) for f in real]))
+    for i, f in enumerate(real + attack):
+      n = 12 + i % 4
+      f.save(frames(n).reshape(n, 1), os.path.join(root, 'as'))
+      if i == len(real): # an attack without any valid frame
+        f.save(numpy.full(n, numpy.nan), os.path.join(root, 'fv', 'spoof'))
+      else:
+        f.save(frames(n), os.path.join(root, 'fv', 'spoof'))
+      f.save(frames(n), os.path.join(root, 'fv2', 'spoof'))
+      if f.is_real():
+        for cl in clients:
+          f.save(frames(n).reshape(1, n), os.path.join(root, 'fv', 'licit', cl))
+          f.save(frames(n).reshape(1, n), os.path.join(root, 'fv2', 'licit', cl))
+
+
+def _load(directory, f):
+  return numpy.asarray(bob.io.base.load(f.make_path(directory, '.hdf5')), 'float64').ravel()
+
+
+def _rows(files, dirs, label, claimed):
+  """Returns the scores of all the frames of the files (one column per directory), their labels and their identities (claimed, real, "frame_index/file_stem"), as the original score readers did"""
+
+  scores = []; labels = []; ids = []
+  for f in files:
+    file_scores = numpy.column_stack([_load(d, f) for d in dirs])
+    scores.append(file_scores)
+    labels += [label(f)] * len(file_scores)
+    real_id = _client(f) if f.is_real() else 'attack'
+    ids += [(claimed(f), real_id, '%d/%s' % (i, f.make_path())) for i in range(len(file_scores))]
+  return numpy.vstack(scores), numpy.array(labels, 'int'), numpy.array(ids)
+
+
+def _dirs(fv_dirs, as_dirs, client_specific, protocol, cl=None):
+  """Returns the score directories of the columns of a protocol, face verification first"""
+
+  protocol_dirs = list(fv_dirs) + (list(as_dirs or []) if client_specific else [])
+  protocol_dirs = [os.path.join(d, protocol, cl) if cl else os.path.join(d, protocol) for d in protocol_dirs]
+  return protocol_dirs + ([] if client_specific else list(as_dirs or []))
+
+
+def _reference_fvas(database, subset, fv_dirs, as_dirs=None, binary_labels=True, fv_protocol='both', client_specific=False):
+  """The rows of gather_fvas_scores() (gather_fvas_clsp_scores() if client_specific), with their identities, gathered file by file"""
+
+  real, attack = getattr(database, 'get_%s_data' % subset)()
+  attack_label = 0 if binary_labels else -1
+
+  blocks = []
+  if fv_protocol == 'licit' or fv_protocol == 'both':
+    for cl in list(set([_client(f) for f in real])):
+      blocks.append(_rows(real, _dirs(fv_dirs, as_dirs, client_specific, 'licit', cl), lambda f: int(_client(f) == cl), lambda f: cl))
+  if fv_protocol == 'spoof' or fv_protocol == 'both':
+    spoof_dirs = _dirs(fv_dirs, as_dirs, client_specific, 'spoof')
+    if fv_protocol == 'spoof' or not client_specific:
+      blocks.append(_rows(real, spoof_dirs, lambda f: 1, _client))
+    blocks.append(_rows(attack, spoof_dirs, lambda f: attack_label, _client))
+
+  scores = numpy.vstack([b[0] for b in blocks])
+  labels = numpy.concatenate([b[1] for b in blocks])
+  ids = numpy.vstack([b[2] for b in blocks])
+  valid = ~numpy.isnan(scores).any(axis=1)
+  return scores[valid], labels[valid], ids[valid]
+
+
+def _reference_perclient(database, subset, fv_dirs, as_dirs=None, client_specific=False):
+  """The scores of gather_fvas_scores_perclient() (gather_fvas_clsp_scores_perclient() if client_specific), gathered file by file"""
+
+  real, _ = getattr(database, 'get_%s_data' % subset)()
+  result = {}
+  for cl in set([_client(f) for f in real]):
+    scores, labels, _ = _rows(real, _dirs(fv_dirs, as_dirs, client_specific, 'licit', cl), lambda f: int(_client(f) == cl), lambda f: cl)
+    scores = scores[labels == 1]
+    result[cl] = scores[~numpy.isnan(scores).any(axis=1)]
+  return result
+
+
+@unittest.skipIf(fusion_utils is None, 'bob.io.base is needed to read the score files')
+class ScoreQueryTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.root = tempfile.mkdtemp()
+    cls.database = _make_database()
+    _make_scores(cls.database, cls.root, numpy.random.RandomState(0))
+    cls.fv = [os.path.join(cls.root, 'fv')]
+    cls.fv2 = [os.path.join(cls.root, 'fv2')]
+    cls.as_dirs = [os.path.join(cls.root, 'as')]
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.root)
+
+  def assertRows(self, result, expected):
+    numpy.testing.assert_array_equal(result[0], expected[0])
+    numpy.testing.assert_array_equal(result[1], expected[1])
+
+  def test_fvas(self):
+    query = fusion_utils.ScoreQuery(self.database)
+    for fv_dirs in (self.fv, self.fv + self.fv2):
+      for protocol in PROTOCOLS:
+        for binary_labels in (True, False):
+          expected = _reference_fvas(self.database, 'devel', fv_dirs, self.as_dirs, binary_labels, protocol)
+          self.assertRows(query.fvas('devel', fv_dirs, self.as_dirs, binary_labels, protocol, normalize=False), expected)
+          self.assertRows(fusion_utils.gather_fvas_scores(self.database, 'devel', fv_dirs, self.as_dirs, binary_labels, protocol, normalize=False, workers=2), expected)
+    # face verification scores only
+    self.assertRows(query.fvas('test', self.fv, None, normalize=False), _reference_fvas(self.database, 'test', self.fv))
+
+  def test_fvas_client_specific(self):
+    query = fusion_utils.ScoreQuery(self.database)
+    for protocol in PROTOCOLS:
+      expected = _reference_fvas(self.database, 'devel', self.fv, self.fv2, False, protocol, client_specific=True)
+      self.assertRows(query.fvas('devel', self.fv, self.fv2, False, protocol, normalize=False, client_specific=True), expected)
+      self.assertRows(fusion_utils.gather_fvas_clsp_scores(self.database, 'devel', self.fv, self.fv2, False, protocol, normalize=False), expected)
+
+  def test_train(self):
+    expected = _reference_fvas(self.database, 'train', self.fv, self.as_dirs)
+    self.assertRows(fusion_utils.gather_train_fvas_scores(self.database, self.fv, self.as_dirs, normalize=False), expected)
+    positives, negatives, _ = fusion_utils.ScoreQuery(self.database).llr_training(self.fv, self.as_dirs, normalize=False)
+    numpy.testing.assert_array_equal(positives, expected[0][expected[1] == 1])
+    numpy.testing.assert_array_equal(negatives, expected[0][expected[1] == 0])
+
+  def test_broadcast(self):
+    query = fusion_utils.ScoreQuery(self.database)
+    for protocol in PROTOCOLS:
+      for binary_labels in (True, False):
+        expected = _reference_fvas(self.database, 'devel', self.fv + self.fv2, self.as_dirs, binary_labels, protocol)
+        scores = query.broadcast('devel', self.fv + self.fv2, self.as_dirs, binary_labels, protocol, normalize=False)
+        self.assertEqual(len(scores), len(expected[0]))
+        self.assertRows(scores.materialize(), expected)
+        numpy.testing.assert_array_equal(scores.column(2, label=1), expected[0][expected[1] == 1, 2])
+
+  def test_identities(self):
+    query = fusion_utils.ScoreQuery(self.database)
+    for protocol in PROTOCOLS:
+      for client_specific in (False, True):
+        as_dirs = self.fv2 if client_specific else self.as_dirs
+        _, labels, ids = _reference_fvas(self.database, 'devel', self.fv, as_dirs, False, protocol, client_specific)
+        claimed, real, tests = query.identities('devel', self.fv, as_dirs, protocol, client_specific)
+        numpy.testing.assert_array_equal(numpy.column_stack((claimed, real, tests)), ids)
+        # the positives of the 4-column format are the real accesses
+        numpy.testing.assert_array_equal(claimed == real, labels == 1)
+        numpy.testing.assert_array_equal(real == 'attack', labels == -1)
+
+  def test_perclient(self):
+    for client_specific, as_dirs in ((False, self.as_dirs), (True, self.fv2)):
+      expected = _reference_perclient(self.database, 'devel', self.fv, as_dirs, client_specific)
+      if client_specific:
+        result, _ = fusion_utils.gather_fvas_clsp_scores_perclient(self.database, 'devel', self.fv, as_dirs, normalize=False)
+      else:
+        result, _ = fusion_utils.gather_fvas_scores_perclient(self.database, 'devel', self.fv, as_dirs, normalize=False, workers=2)
+      self.assertEqual(sorted(result), sorted(expected))
+      for cl in expected:
+        numpy.testing.assert_array_equal(result[cl], expected[cl])
+
+    # a subset of the clients
+    result, _ = fusion_utils.ScoreQuery(self.database).perclient('devel', self.fv, self.as_dirs, normalize=False, clients=['client002'])
+    self.assertEqual(list(result), ['client002'])
+    numpy.testing.assert_array_equal(result['client002'], _reference_perclient(self.database, 'devel', self.fv, self.as_dirs)['client002'])
+
+  def test_manifest(self):
+    filename = os.path.join(self.root, 'manifest.npz')
+    self.database.save(filename, 'replay-test')
+    loaded = ManifestDatabase.load(filename)
+    self.assertEqual(loaded.key, 'replay-test')
+    for subset in ('train', 'devel', 'test'):
+      for files, loaded_files in zip(getattr(self.database, 'get_%s_data' % subset)(), getattr(loaded, 'get_%s_data' % subset)()):
+        self.assertEqual([(f.make_path(), f.get_client_id(), f.is_real()) for f in files], [(f.make_path(), f.get_client_id(), f.is_real()) for f in loaded_files])
+    self.assertRows(fusion_utils.ScoreQuery(loaded).fvas('devel', self.fv, self.as_dirs, normalize=False), _reference_fvas(self.database, 'devel', self.fv, self.as_dirs))
+
+  def test_pack_scores(self):
+    from antispoofing.fusion_faceverif.helpers.score_store import pack_scores, PackedScores, find_packed
+
+    # the packed files are saved next to the scores, so the scores are packed in a copy
+    root = os.path.join(self.root, 'packed')
+    shutil.copytree(self.root, root, ignore=shutil.ignore_patterns('packed', '*.npz'))
+    fv = os.path.join(root, 'fv'); as_dir = os.path.join(root, 'as')
+    real, attack = self.database.get_devel_data()
+    clients = sorted(set([_client(f) for f in real]))
+
+    pack = PackedScores(pack_scores(fv, real, 'devel', protocol='licit', clients=clients))
+    self.assertEqual(len(pack), len(clients) * len(real))
+    for cl in clients:
+      scores, lengths = pack.get(real, int(cl[len('client'):]))
+      numpy.testing.assert_array_equal(scores, numpy.concatenate([_load(os.path.join(fv, 'licit', cl), f) for f in real]))
+      numpy.testing.assert_array_equal(lengths, [len(_load(as_dir, f)) for f in real])
+    pack = PackedScores(pack_scores(fv, real + attack, 'devel', protocol='spoof'))
+    scores, _ = pack.get(attack[::-1])
+    numpy.testing.assert_array_equal(scores, numpy.concatenate([_load(os.path.join(fv, 'spoof'), f) for f in attack[::-1]]))
+    pack_scores(as_dir, real + attack, 'devel')
+    self.assertEqual(find_packed(os.path.join(fv, 'licit', 'client003'), 'devel')[1], 3)
+
+    # the packed scores are read instead of the score files
+    for f in real + attack:
+      os.remove(f.make_path(as_dir, '.hdf5'))
+    for protocol in PROTOCOLS:
+      expected = _reference_fvas(self.database, 'devel', self.fv, self.as_dirs, False, protocol)
+      self.assertRows(fusion_utils.ScoreQuery(self.database).fvas('devel', [fv], [as_dir], False, protocol, normalize=False), expected)
+
+
+if __name__ == '__main__':
+  unittest.main()
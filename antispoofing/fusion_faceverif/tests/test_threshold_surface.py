@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+'''Tests of the error rates of the AND decision fusion over the grid of pairs of thresholds'''
+
+import unittest
+import numpy
+
+from antispoofing.fusion_faceverif.helpers.threshold_surface import candidate_thresholds, ThresholdSurface
+from antispoofing.fusion_faceverif.helpers.decision_fusion import decision_rates
+
+
+def _scores(rng, n, nan_rate=0.1):
+  """Returns the (face verification, anti-spoofing) scores of n samples, rounded so that some of them are equal to the thresholds, with a fraction nan_rate of nan scores"""
+
+  scores = numpy.round(rng.randn(2, n), 1)
+  scores[rng.rand(2, n) < nan_rate] = numpy.nan
+  return scores[0], scores[1]
+
+
+class ThresholdSurfaceTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(0)
+    self.valid = _scores(rng, 300)
+    self.impostors = _scores(rng, 200)
+    self.attacks = _scores(rng, 250)
+    self.fv_thresholds = candidate_thresholds([s[0] for s in (self.valid, self.impostors, self.attacks)])
+    self.as_thresholds = candidate_thresholds([s[1] for s in (self.valid, self.impostors, self.attacks)])
+
+  def test_candidate_thresholds(self):
+    self.assertFalse(numpy.isnan(self.fv_thresholds).any())
+    self.assertTrue((numpy.diff(self.fv_thresholds) > 0).all())
+    self.assertEqual(len(candidate_thresholds(self.valid[0], points=10)), 10)
+
+  def test_decision_rates(self):
+    # the surface has the error rates of decision_rates() for each pair of thresholds, with the nan scores
+    surface = ThresholdSurface(self.valid, self.impostors, self.attacks, self.fv_thresholds, self.as_thresholds)
+    far, frr, sfar = decision_rates(self.valid, self.impostors, self.attacks, self.fv_thresholds[:,None], self.as_thresholds[None,:], rule='AND')
+    self.assertTrue(numpy.allclose(surface.far, far))
+    self.assertTrue(numpy.allclose(surface.frr, frr))
+    self.assertTrue(numpy.allclose(surface.sfar, sfar))
+
+  def test_select(self):
+    surface = ThresholdSurface(self.valid, self.impostors, self.attacks, self.fv_thresholds, self.as_thresholds)
+    fv_thr, as_thr = surface.select('hter')
+    far, frr, sfar = decision_rates(self.valid, self.impostors, self.attacks, fv_thr, as_thr, rule='AND')
+    self.assertAlmostEqual((far + frr) / 2., surface.criterion('hter').min())
+
+
+if __name__ == '__main__':
+  unittest.main()
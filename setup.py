@@ -37,6 +37,8 @@ setup(
     entry_points={
       'console_scripts': [
         'and_decision_fusion.py = antispoofing.fusion_faceverif.script.and_decision_fusion:main',
+        'and_threshold_surface.py = antispoofing.fusion_faceverif.script.and_threshold_surface:main',
+        'streaming_decision.py = antispoofing.fusion_faceverif.script.streaming_decision:main',
         'fusion_fvas.py = antispoofing.fusion_faceverif.script.fusion_fvas:main',
         'antispoof_threshold.py = antispoofing.fusion_faceverif.script.antispoof_threshold:main',
         'faceverif_threshold.py = antispoofing.fusion_faceverif.script.faceverif_threshold:main',
@@ -44,6 +46,8 @@ setup(
         'four_column_to_dir_structure.py = antispoofing.fusion_faceverif.script.four_column_to_dir_structure:main',
         'scatter_plot.py = antispoofing.fusion_faceverif.script.scatter_plot:main',
         'plot_on_demand.py = antispoofing.fusion_faceverif.script.plot_on_demand:main', 
+        'pack_scores.py = antispoofing.fusion_faceverif.script.pack_scores:main',
+        'import_time.py = antispoofing.fusion_faceverif.script.import_time:main',
         'apply_threshold.py = bob.measure.script.apply_threshold:main',
         'eval_threshold.py = bob.measure.script.eval_threshold:main',
         ],